@@ -0,0 +1,17 @@
+"""
+Offline benchmarks for the emergency screening pipeline.
+
+Run from the backend directory, e.g.:
+    python -m benchmarks                   # full suite, see __main__.py
+    python -m benchmarks.normalize_bench   # _normalize vs the original loop
+    python -m benchmarks.ids_bench         # message id collisions under burst load
+    python -m benchmarks.load_bench        # async routes under injected Firestore latency
+"""
+
+import sys
+from pathlib import Path
+
+# The database package lives at the repository root (main.py does the same)
+ROOT_DIR = Path(__file__).resolve().parents[2]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
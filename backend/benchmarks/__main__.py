@@ -0,0 +1,170 @@
+"""
+Benchmark the emergency screening pipeline offline.
+
+Measures assess_emergency, check_symptom, check_context and _normalize on
+a seeded synthetic corpus and reports throughput, p50/p99 latency and
+allocated bytes per call. Signals come from DEFAULT_SIGNALS /
+SYMPTOM_SIGNALS only; Firestore is never contacted.
+
+Usage (from the backend directory):
+    python -m benchmarks                    # print results
+    python -m benchmarks --compare          # diff against baselines/default.json
+    python -m benchmarks --save             # (re)write the baseline
+    python -m benchmarks --size 200 --lengths short
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.corpus import LANGS, LENGTHS, generate_corpus
+from utils import emergency_message, signals
+from utils.signals import DEFAULT_SIGNALS, LocalSignalSource, SignalCache
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# Compared metrics and whether a larger value is better
+METRICS = {"throughput": True, "p50_us": False, "p99_us": False, "alloc_bytes": False}
+
+
+def _offline():
+    """Pin the signal cache to the built-in definitions."""
+    signals.signal_cache = SignalCache(LocalSignalSource(DEFAULT_SIGNALS), listen=False)
+
+
+def _targets() -> Dict[str, Callable[[str], object]]:
+    return {
+        "assess_emergency": emergency_message.assess_emergency,
+        "check_symptom": signals.check_symptom,
+        "check_context": signals.check_context,
+        "normalize": emergency_message._normalize_text,
+    }
+
+
+def _percentile(sorted_values: List[int], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _clear_caches():
+    # Measure the uncached path; memoization would otherwise turn every
+    # round after the first into cache hits
+    emergency_message._normalize_cached.cache_clear()
+    emergency_message.assessment_cache.clear()
+
+
+def measure(fn: Callable[[str], object], texts: List[str], rounds: int) -> Dict[str, float]:
+    """Time every call individually, then sample allocations in a separate pass."""
+    for text in texts[:50]:
+        fn(text)  # warm-up: compile matchers, fill lazy tables
+
+    samples: List[int] = []
+    wall_start = time.perf_counter()
+    for _ in range(rounds):
+        _clear_caches()
+        for text in texts:
+            started = time.perf_counter_ns()
+            fn(text)
+            samples.append(time.perf_counter_ns() - started)
+    wall = time.perf_counter() - wall_start
+    samples.sort()
+
+    _clear_caches()
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for text in texts:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(text)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": len(samples),
+        "throughput": round(len(samples) / wall, 1),
+        "p50_us": round(_percentile(samples, 50) / 1000, 2),
+        "p99_us": round(_percentile(samples, 99) / 1000, 2),
+        "alloc_bytes": round(allocated / len(texts), 1),
+    }
+
+
+def run(seed: int, size: int, rounds: int, lengths: List[str], langs: List[str]) -> Dict[str, object]:
+    _offline()
+    results: Dict[str, Dict[str, float]] = {}
+    for length in lengths:
+        texts = generate_corpus(seed=seed, size=size, langs=langs, length=length)
+        for name, fn in _targets().items():
+            key = f"{name}/{length}"
+            results[key] = measure(fn, texts, rounds)
+            print(f"  {key:<28} {_format(results[key])}", flush=True)
+    return {
+        "config": {"seed": seed, "size": size, "rounds": rounds, "lengths": lengths, "langs": langs},
+        "environment": {"python": platform.python_version(), "machine": platform.machine()},
+        "results": results,
+    }
+
+
+def _format(metrics: Dict[str, float]) -> str:
+    return (
+        f"{metrics['throughput']:>10.0f}/s  p50 {metrics['p50_us']:>8.2f}us  "
+        f"p99 {metrics['p99_us']:>8.2f}us  alloc {metrics['alloc_bytes']:>8.0f}B"
+    )
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object]) -> None:
+    print(f"\nChange vs baseline ({baseline['environment']['python']} on {baseline['environment']['machine']}):")
+    for key, metrics in current["results"].items():
+        old = baseline["results"].get(key)
+        if not old:
+            print(f"  {key:<28} (new)")
+            continue
+        parts = []
+        for metric, higher_is_better in METRICS.items():
+            if not old.get(metric):
+                continue
+            delta = (metrics[metric] - old[metric]) / old[metric] * 100
+            worse = delta < 0 if higher_is_better else delta > 0
+            flag = "!" if worse and abs(delta) >= 10 else " "
+            parts.append(f"{metric} {delta:+6.1f}%{flag}")
+        print(f"  {key:<28} " + "  ".join(parts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the emergency screening pipeline offline.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--size", type=int, default=400, help="texts per corpus")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over each corpus")
+    parser.add_argument("--lengths", nargs="+", default=list(LENGTHS), choices=list(LENGTHS))
+    parser.add_argument("--langs", nargs="+", default=LANGS, choices=LANGS)
+    parser.add_argument("--baseline", default="default", help="baseline name under benchmarks/baselines/")
+    parser.add_argument("--save", action="store_true", help="write results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="diff results against the baseline")
+    args = parser.parse_args(argv)
+
+    print(f"Benchmarking (seed={args.seed}, size={args.size}, rounds={args.rounds})")
+    current = run(args.seed, args.size, args.rounds, args.lengths, args.langs)
+
+    path = BASELINE_DIR / f"{args.baseline}.json"
+    if args.compare:
+        if not path.exists():
+            print(f"No baseline at {path}; run with --save first")
+            return 1
+        compare(current, json.loads(path.read_text(encoding="utf-8")))
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path.write_text(json.dumps(current, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\nBaseline written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Seeded synthetic patient-text corpus for benchmarks.
+
+Texts mix everyday filler sentences with signal phrases taken from
+DEFAULT_SIGNALS / SYMPTOM_SIGNALS, in English, Hindi, Telugu and
+code-mixed (Hinglish / Tenglish) registers. The same seed always yields
+the same corpus, so benchmark runs are comparable.
+
+Usage:
+    from benchmarks.corpus import generate_corpus
+
+    texts = generate_corpus(seed=7, size=500, langs=["en", "hi"], length="medium")
+"""
+
+import random
+from typing import Dict, List, Optional
+
+from utils.emergency_message import CONTEXT_SIGNALS, SYMPTOM_SIGNALS
+from utils.signals import DEFAULT_SIGNALS
+
+LANGS = ["en", "hi", "te", "mixed"]
+
+# Number of filler sentences per text for each length bucket
+LENGTHS: Dict[str, tuple] = {
+    "short": (1, 2),
+    "medium": (3, 6),
+    "long": (10, 20),
+}
+
+FILLER: Dict[str, List[str]] = {
+    "en": [
+        "I have been feeling unwell since yesterday.",
+        "My mother is 67 and has diabetes.",
+        "I took a paracetamol in the morning but it did not help much.",
+        "There is no fever right now.",
+        "I am not sure if I should come to the clinic today.",
+        "The pain started after lunch.",
+        "I also feel a little dizzy when I stand up.",
+        "Please tell me what to do, thank you.",
+        "I had a similar problem last year.",
+        "My BP was 150/95 this morning.",
+    ],
+    "hi": [
+        "कल से तबीयत ठीक नहीं लग रही है।",
+        "मेरी माँ की उम्र 67 है और उन्हें शुगर है।",
+        "सुबह पैरासिटामोल ली थी लेकिन आराम नहीं मिला।",
+        "अभी बुखार नहीं है।",
+        "समझ नहीं आ रहा कि आज क्लिनिक आऊँ या नहीं।",
+        "खाना खाने के बाद दर्द शुरू हुआ।",
+        "खड़े होने पर थोड़ा चक्कर भी आता है।",
+        "कृपया बताइए क्या करूँ, धन्यवाद।",
+    ],
+    "te": [
+        "నిన్నటి నుండి ఆరోగ్యం బాగాలేదు.",
+        "మా అమ్మకు 67 సంవత్సరాలు, షుగర్ ఉంది.",
+        "ఉదయం పారాసిటమాల్ వేసుకున్నాను కానీ తగ్గలేదు.",
+        "ఇప్పుడు జ్వరం లేదు.",
+        "ఈరోజు క్లినిక్‌కి రావాలా వద్దా తెలియడం లేదు.",
+        "భోజనం తర్వాత నొప్పి మొదలైంది.",
+        "నిలబడితే కొంచెం తల తిరుగుతోంది.",
+        "దయచేసి ఏమి చేయాలో చెప్పండి.",
+    ],
+    # Transliterated / code-mixed sentences as patients actually type them
+    "mixed": [
+        "kal se tabiyat theek nahi hai, feeling very weak.",
+        "mummy ko sugar hai aur BP bhi high rehta hai.",
+        "morning mein paracetamol li thi but no relief.",
+        "ninna nundi body pains undi, fever ledu.",
+        "doctor sahab please batao kya karna hai.",
+        "office mein kaam karte waqt chakkar aaya.",
+        "naaku rendu rojulu ga headache undi.",
+    ],
+}
+
+
+def _signal_phrases(lang: str) -> List[str]:
+    """Signal phrases written in the script of ``lang``."""
+    phrases = []
+    for table in (SYMPTOM_SIGNALS, CONTEXT_SIGNALS, DEFAULT_SIGNALS["symptomSignals"], DEFAULT_SIGNALS["contextSignals"]):
+        for signals in table.values():
+            phrases.extend(signals)
+    phrases = sorted(set(phrases))
+
+    def script(phrase: str) -> str:
+        for ch in phrase:
+            if "ऀ" <= ch <= "ॿ":
+                return "hi"
+            if "ఀ" <= ch <= "౿":
+                return "te"
+        return "en"
+
+    if lang == "mixed":
+        return phrases
+    return [p for p in phrases if script(p) == lang]
+
+
+def generate_text(rng: random.Random, lang: str, length: str = "medium", signal_rate: float = 0.5) -> str:
+    """Build one patient message; ``signal_rate`` is the chance a sentence carries a signal phrase."""
+    lo, hi = LENGTHS[length]
+    sentences = []
+    signals = _signal_phrases(lang)
+    for _ in range(rng.randint(lo, hi)):
+        source = rng.choice(list(FILLER)) if lang == "mixed" else lang
+        sentence = rng.choice(FILLER[source])
+        if signals and rng.random() < signal_rate:
+            sentence = f"{sentence} {rng.choice(signals)}"
+        sentences.append(sentence)
+    return " ".join(sentences)
+
+
+def generate_corpus(
+    seed: int = 7,
+    size: int = 500,
+    langs: Optional[List[str]] = None,
+    length: str = "medium",
+    signal_rate: float = 0.5,
+) -> List[str]:
+    """Deterministic list of ``size`` texts, round-robin across ``langs``."""
+    rng = random.Random(seed)
+    langs = langs or LANGS
+    return [generate_text(rng, langs[i % len(langs)], length, signal_rate) for i in range(size)]
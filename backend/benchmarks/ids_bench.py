@@ -0,0 +1,81 @@
+"""
+Microbenchmark: message id generation under multi-threaded burst load.
+
+Compares the legacy MSG{epoch millis} scheme with database.ids: ids per
+second, collisions, and how evenly the leading key characters spread
+(Firestore hot-spots on monotonically increasing document ids).
+
+Usage:
+    python -m benchmarks.ids_bench [--threads N] [--per-thread N]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from database.ids import IdGenerator
+
+
+def _legacy_id():
+    return f"MSG{int(datetime.now().timestamp() * 1000)}"
+
+
+def _burst(fn, threads, per_thread):
+    """Generate ids from ``threads`` threads released at once; returns (ids, seconds)."""
+    results = [None] * threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(slot):
+        barrier.wait()
+        results[slot] = [fn() for _ in range(per_thread)]
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return [i for chunk in results for i in chunk], elapsed
+
+
+def _report(name, ids, elapsed, prefix_len):
+    unique = len(set(ids))
+    heads = Counter(i[3:3 + prefix_len] for i in ids)
+    print(
+        f"{name:<10}{len(ids) / elapsed:>12.0f}{len(ids) - unique:>12}"
+        f"{len(heads):>10}{max(heads.values()) / len(ids) * 100:>10.1f}%"
+    )
+    return len(ids) - unique
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--per-thread", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4, help="simulated processes, one generator each")
+    args = parser.parse_args()
+
+    print(f"{'scheme':<10}{'ids/s':>12}{'collisions':>12}{'key heads':>10}{'hottest':>11}")
+    _report("legacy", *_burst(_legacy_id, args.threads, args.per_thread), prefix_len=2)
+
+    # Several workers (one generator each, distinct worker ids) sharing the burst
+    generators = [IdGenerator(worker_id=w) for w in range(args.workers)]
+    counter = iter(range(1 << 62))
+    lock = threading.Lock()
+
+    def snowflake():
+        with lock:
+            n = next(counter)
+        return generators[n % len(generators)].next_id()
+
+    collisions = _report("snowflake", *_burst(snowflake, args.threads, args.per_thread), prefix_len=2)
+    return 1 if collisions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
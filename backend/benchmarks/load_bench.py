@@ -0,0 +1,95 @@
+"""
+Load test: async routes under injected Firestore latency, one worker.
+
+Serves a GET /api/auth/doctors handler in-process against a users
+repository whose queries sleep --latency ms, and compares calling the
+blocking data function directly (the old behaviour) with the executor-
+backed find_all_doctors. Effective concurrency = requests x latency /
+wall time; with the event loop blocked it stays at 1 regardless of
+connections.
+
+Usage:
+    python -m benchmarks.load_bench [--latency 50] [--connections 1 8 32 64]
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from database import users
+from database.executor import DB_EXECUTOR_WORKERS
+from database.sqlite_store import SQLiteStore
+from database.storage import set_repository
+
+
+class _SlowStore(SQLiteStore):
+    """Throwaway SQLite repository whose role queries sleep like a remote round trip."""
+
+    def __init__(self, latency):
+        super().__init__(":memory:")
+        self.latency = latency
+        for i in range(20):
+            self.create_user({"id": f"doc{i}", "name": f"Dr {i}", "email": f"dr{i}@bench", "role": "doctor"})
+
+    def find_users_by_role(self, role, fields=None):
+        time.sleep(self.latency)
+        return super().find_users_by_role(role, fields)
+
+
+def _app(blocking):
+    # The real /doctors route serves a cached directory, so both modes query
+    # the data layer directly to measure the executor rather than the cache
+    app = FastAPI()
+    if blocking:
+        @app.get("/api/auth/doctors")
+        async def get_doctors_blocking():
+            return {"success": True, "doctors": users._find_users_by_role("doctor")}
+    else:
+        @app.get("/api/auth/doctors")
+        async def get_doctors_executor():
+            return {"success": True, "doctors": await users.find_all_doctors()}
+    return app
+
+
+async def _run(app, connections, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = asyncio.Queue()
+        for _ in range(requests):
+            queue.put_nowait(None)
+
+        async def connection():
+            while not queue.empty():
+                queue.get_nowait()
+                response = await client.get("/api/auth/doctors")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(connections)))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=50, help="injected Firestore latency, ms")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests-per-connection", type=int, default=4)
+    args = parser.parse_args()
+
+    latency = args.latency / 1000
+    set_repository(_SlowStore(latency))
+    print(f"latency {args.latency:.0f}ms, executor workers {DB_EXECUTOR_WORKERS}")
+    print(f"{'mode':<10}{'conns':>7}{'req/s':>10}{'concurrency':>13}")
+    for mode, blocking in (("blocking", True), ("executor", False)):
+        app = _app(blocking)
+        for connections in args.connections:
+            requests = connections * args.requests_per_connection
+            wall = asyncio.run(_run(app, connections, requests))
+            print(f"{mode:<10}{connections:>7}{requests / wall:>10.1f}{requests * latency / wall:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
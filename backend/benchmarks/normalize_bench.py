@@ -0,0 +1,53 @@
+"""
+Microbenchmark: table-driven _normalize vs the original char-by-char loop.
+
+Usage:
+    python -m benchmarks.normalize_bench [--iterations N]
+"""
+
+import argparse
+import timeit
+
+from benchmarks.corpus import generate_corpus
+from utils import emergency_message
+from utils.emergency_message import _normalize_text
+
+CORPORA = {lang: generate_corpus(seed=11, size=30, langs=[lang], length="short") for lang in ("en", "hi", "te")}
+
+
+def _normalize_legacy(text: str) -> str:
+    """The original implementation, kept here as the comparison baseline."""
+    if not text:
+        return ""
+    lower = text.lower()
+    cleaned = []
+    for ch in lower:
+        if ch.isspace():
+            cleaned.append(" ")
+            continue
+        if ch.isalnum() or ch.isalpha():
+            cleaned.append(ch)
+            continue
+        cleaned.append(" ")
+    return " ".join("".join(cleaned).split())
+
+
+def _bench(fn, texts, iterations):
+    return min(timeit.repeat(lambda: [fn(t) for t in texts], number=iterations, repeat=3)) / (iterations * len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'lang':<5}{'legacy us':>12}{'table us':>12}{'cached us':>12}{'speedup':>10}")
+    for lang, texts in CORPORA.items():
+        legacy = _bench(_normalize_legacy, texts, args.iterations)
+        table = _bench(_normalize_text, texts, args.iterations)
+        cached = _bench(emergency_message._normalize, texts, args.iterations)
+        print(f"{lang:<5}{legacy * 1e6:>12.2f}{table * 1e6:>12.2f}{cached * 1e6:>12.2f}{legacy / table:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Backfill conversation summaries from existing messages.
+Run this once after deploying inbox summaries; it is safe to re-run.
+
+Usage:
+    python backend/init_conversations.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Make both backend modules and the shared database package importable
+backend_path = Path(__file__).parent
+for path in (backend_path, backend_path.parent):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+# Set Firebase credentials
+firebase_creds = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+if not firebase_creds:
+    print("⚠️  GOOGLE_APPLICATION_CREDENTIALS not set. Using bundled credentials.")
+
+try:
+    from config.firebase import db, firebase_connected
+    
+    if not firebase_connected or not db:
+        print("❌ Firebase not connected. Aborting.")
+        exit(1)
+    
+    from database.messages import rebuild_conversation_summaries
+    
+    print("📝 Rebuilding conversation summaries from messages...")
+    count = rebuild_conversation_summaries()
+    print(f"✅ Conversation summaries written: {count}")
+    
+except Exception as e:
+    print(f"❌ Error rebuilding conversation summaries: {e}")
+    exit(1)
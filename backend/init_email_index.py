@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Backfill the email index (user_emails) from existing users.
+Run this once after deploying the index, then set
+USER_EMAIL_INDEX_FALLBACK=0; it is safe to re-run.
+
+Usage:
+    python backend/init_email_index.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Make both backend modules and the shared database package importable
+backend_path = Path(__file__).parent
+for path in (backend_path, backend_path.parent):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+# Set Firebase credentials
+firebase_creds = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+if not firebase_creds:
+    print("⚠️  GOOGLE_APPLICATION_CREDENTIALS not set. Using bundled credentials.")
+
+try:
+    from database.storage import STORAGE_BACKEND, get_repository
+
+    if STORAGE_BACKEND == "firestore":
+        from config.firebase import firebase_connected
+
+        if not firebase_connected:
+            print("❌ Firebase not connected. Aborting.")
+            exit(1)
+    if get_repository() is None:
+        print("❌ No storage backend configured. Aborting.")
+        exit(1)
+
+    from database.users import rebuild_email_index
+
+    print("📝 Indexing user emails...")
+    count, conflicts = rebuild_email_index()
+    print(f"✅ Emails indexed: {count}")
+    for email, user_id in conflicts:
+        print(f"⚠️  {email} is already registered to another user; not indexed for {user_id}")
+
+except Exception as e:
+    print(f"❌ Error indexing user emails: {e}")
+    exit(1)
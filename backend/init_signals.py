@@ -10,10 +10,11 @@ Usage:
 import os
 from pathlib import Path
 
-# Add database to path
+# Make both backend modules and the shared database package importable
 backend_path = Path(__file__).parent
-if str(backend_path) not in __import__('sys').path:
-    __import__('sys').path.append(str(backend_path))
+for path in (backend_path, backend_path.parent):
+    if str(path) not in __import__('sys').path:
+        __import__('sys').path.append(str(path))
 
 # Set Firebase credentials
 firebase_creds = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
@@ -22,15 +23,15 @@ if not firebase_creds:
 
 try:
     from config.firebase import db, firebase_connected
-    from utils.signals import DEFAULT_SIGNALS
+    from utils.signals import DEFAULT_SIGNALS, publish_signals
     
     if not firebase_connected or not db:
         print("❌ Firebase not connected. Aborting.")
         exit(1)
     
     print("📝 Initializing signal definitions in Firestore...")
-    db.collection("config").document("signals").set(DEFAULT_SIGNALS)
-    print("✅ Signal definitions initialized successfully!")
+    snapshot = publish_signals(DEFAULT_SIGNALS)
+    print(f"✅ Signal definitions initialized successfully! (version {snapshot.version})")
     print(f"   - Symptom categories: {list(DEFAULT_SIGNALS['symptomSignals'].keys())}")
     print(f"   - Context types: {list(DEFAULT_SIGNALS['contextSignals'].keys())}")
     
@@ -1,4 +1,6 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
@@ -20,7 +22,24 @@ except Exception:
     # Continue without Firebase; modules will fallback to in-memory
     pass
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load signals and start the change listener before the first request
+    from utils.signals import signal_cache
+    await run_in_threadpool(signal_cache.get)
+    yield
+    await run_in_threadpool(shutdown_workers)
+
+def shutdown_workers():
+    from utils.emergency_message import shutdown_assess_pool
+    from utils.write_behind import drain_write_queue
+    from database.executor import shutdown_executor
+    shutdown_assess_pool()
+    # Flush queued symptom/emergency records before the worker exits
+    drain_write_queue()
+    shutdown_executor()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -29,6 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Import routes
@@ -1,6 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from database.users import find_user_by_email, find_all_doctors, find_all_patients, create_user
+from database.executor import run_blocking
+from database.users import EmailAlreadyRegistered, find_user_by_email, create_user
+from utils.directory import decode_cursor, directories, invalidate_directory
+from utils.etags import if_none_match
+from utils.auth_tokens import get_current_user, get_verifier, profile_cache, resolve_profile, verify_token
 
 # Optional Firebase Auth
 try:
@@ -62,11 +67,16 @@ async def signup(request: SignupRequest):
         elif request.role == "doctor":
             user_data["specialization"] = request.specialization or "General Physician"
         
-        # Save to Firestore
-        created_user = await create_user(user_data)
+        # Save to Firestore; the email index rejects a concurrent signup for the same email
+        try:
+            created_user = await create_user(user_data)
+        except EmailAlreadyRegistered:
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         if not created_user:
             raise HTTPException(status_code=500, detail="Failed to create user")
+        profile_cache.invalidate(request.id)
+        invalidate_directory(request.role)
         
         # Remove sensitive data before returning
         user_response = {k: v for k, v in created_user.items() if k != "password"}
@@ -94,20 +104,25 @@ async def login(request: LoginRequest):
 
 @router.post("/login/firebase")
 async def login_with_firebase(request: FirebaseLoginRequest):
-    """Login using Firebase ID token. Returns matched user profile by email if available."""
+    """Login using Firebase ID token. Returns the user's stored profile if available."""
     if not request.idToken:
         raise HTTPException(status_code=400, detail="idToken is required")
 
-    if not firebase_auth:
+    verifier = get_verifier()
+    if not verifier and not firebase_auth:
         raise HTTPException(status_code=503, detail="Firebase Auth not available")
 
     try:
-        decoded = firebase_auth.verify_id_token(request.idToken)
+        if verifier:
+            # Cached certificates and decoded tokens (utils/auth_tokens.py)
+            decoded = await verify_token(request.idToken)
+        else:
+            # May fetch Google's signing certificates; keep it off the event loop
+            decoded = await run_blocking(firebase_auth.verify_id_token, request.idToken)
+        user = await resolve_profile(decoded)
         email = decoded.get("email")
         uid = decoded.get("uid")
         name = decoded.get("name") or ""
-
-        user = await find_user_by_email(email) if email else None
         if user:
             user_copy = {k: v for k, v in user.items() if k != "password"}
             return {
@@ -135,30 +150,77 @@ async def login_with_firebase(request: FirebaseLoginRequest):
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid or expired Firebase ID token")
 
+@router.get("/me")
+async def get_me(user: dict = Depends(get_current_user)):
+    """Profile of the caller identified by the Authorization: Bearer ID token."""
+    return {
+        "success": True,
+        "user": user,
+        "userType": user.get("role", "user"),
+    }
+
+async def _directory_page(role, key, request, response, specialization, q, limit, cursor):
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    directory = directories[role]
+    # Cache hits are answered on the event loop; reloads go to the executor
+    snapshot = directory.fresh() or await run_blocking(directory.get)
+    etag = snapshot.page_etag(specialization=specialization, q=q, limit=limit, cursor=cursor)
+    if if_none_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    page = snapshot.query(specialization=specialization, q=q, limit=limit, cursor=cursor)
+    response.headers["ETag"] = etag
+    return {
+        "success": True,
+        key: page["users"],
+        "nextCursor": page["nextCursor"],
+        "hasMore": page["hasMore"]
+    }
+
 @router.get("/doctors")
-async def get_doctors():
-    """Get all doctors from Firestore."""
+async def get_doctors(
+    request: Request,
+    response: Response,
+    specialization: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    """List doctors (public fields) from the cached directory.
+
+    Filters by `specialization` and name prefix `q`; `limit`/`cursor`
+    page through the name-sorted list. Honors If-None-Match.
+    """
     try:
-        doctors = await find_all_doctors()
-        # Remove passwords
-        doctors_clean = [{k: v for k, v in d.items() if k != "password"} for d in doctors]
-        return {
-            "success": True,
-            "doctors": doctors_clean
-        }
+        return await _directory_page("doctor", "doctors", request, response, specialization, q, limit, cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/patients")
-async def get_patients():
-    """Get all patients from Firestore."""
+async def get_patients(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    """List patients (public fields) from the cached directory; same paging as /doctors."""
     try:
-        patients = await find_all_patients()
-        # Remove passwords
-        patients_clean = [{k: v for k, v in p.items() if k != "password"} for p in patients]
-        return {
-            "success": True,
-            "patients": patients_clean
-        }
+        return await _directory_page("patient", "patients", request, response, None, q, limit, cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/directory/stats")
+async def get_directory_stats():
+    """Size, ETag and load count of each cached directory."""
+    return {
+        "success": True,
+        "directories": [d.stats() for d in directories.values()]
+    }
@@ -1,16 +1,44 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
+import json
+import os
 from database.messages import (
     send_message,
-    get_conversation,
+    send_messages,
+    get_conversation_page,
+    get_conversation_etag,
     get_conversations_for_doctor,
     get_conversations_for_patient,
     mark_conversation_as_read,
     delete_message
 )
+from utils.auth_tokens import get_stream_user
+from utils.etags import if_none_match
+from utils.pubsub import conversation_channels, hub
 
 router = APIRouter()
 
+# Seconds between keep-alive comments on idle event streams
+STREAM_KEEPALIVE = float(os.getenv("MESSAGE_STREAM_KEEPALIVE", "15"))
+
+# Upper bound on messages accepted by one bulk send request
+BULK_SEND_MAX = int(os.getenv("BULK_SEND_MAX", "5000"))
+
+def _publish(patient_id, doctor_id, event):
+    for channel in conversation_channels(patient_id, doctor_id):
+        hub.publish(channel, event)
+
+def _publish_batch(msgs):
+    """One `messages` event per subscribed channel for a whole batch"""
+    by_channel = {}
+    for msg in msgs:
+        for channel in conversation_channels(msg["patientId"], msg["doctorId"]):
+            by_channel.setdefault(channel, []).append(msg)
+    for channel, channel_msgs in by_channel.items():
+        hub.publish(channel, {"type": "messages", "data": channel_msgs})
+
 class SendMessageRequest(BaseModel):
     patientId: str
     doctorId: str
@@ -19,9 +47,24 @@ class SendMessageRequest(BaseModel):
     message: str
     sender: str
 
+class BulkRecipient(BaseModel):
+    patientId: str
+    patientName: str = ""
+
+class BulkSendRequest(BaseModel):
+    # Either individual messages...
+    messages: Optional[List[SendMessageRequest]] = None
+    # ...or one message broadcast from a doctor to a recipient list
+    doctorId: Optional[str] = None
+    doctorName: str = ""
+    message: Optional[str] = None
+    sender: str = "doctor"
+    recipients: Optional[List[BulkRecipient]] = None
+
 class MarkReadRequest(BaseModel):
     patientId: str
     doctorId: str
+    reader: Optional[str] = None
 
 @router.post("/send")
 def send_new_message(request: SendMessageRequest):
@@ -38,6 +81,7 @@ def send_new_message(request: SendMessageRequest):
             request.message,
             request.sender
         )
+        _publish(request.patientId, request.doctorId, {"type": "message", "data": msg})
         return {
             "success": True,
             "message": "Message sent successfully",
@@ -46,26 +90,95 @@ def send_new_message(request: SendMessageRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/send/bulk")
+def send_bulk_messages(request: BulkSendRequest):
+    """Send many messages, or broadcast one message to many patients"""
+    if request.messages:
+        entries = [{
+            "patient_id": m.patientId,
+            "doctor_id": m.doctorId,
+            "patient_name": m.patientName,
+            "doctor_name": m.doctorName,
+            "message": m.message,
+            "sender": m.sender
+        } for m in request.messages]
+    elif request.recipients and request.doctorId and request.message:
+        entries = [{
+            "patient_id": r.patientId,
+            "doctor_id": request.doctorId,
+            "patient_name": r.patientName,
+            "doctor_name": request.doctorName,
+            "message": request.message,
+            "sender": request.sender
+        } for r in request.recipients]
+    else:
+        raise HTTPException(status_code=400, detail="Provide messages, or doctorId, message and recipients")
+    
+    if len(entries) > BULK_SEND_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_SEND_MAX} messages per request")
+    if not all(e["patient_id"] and e["doctor_id"] and e["message"] and e["sender"] for e in entries):
+        raise HTTPException(status_code=400, detail="Missing required fields")
+    
+    try:
+        results = send_messages(entries)
+        _publish_batch([r["data"] for r in results if r["success"]])
+        sent = sum(1 for r in results if r["success"])
+        return {
+            "success": sent == len(results),
+            "sent": sent,
+            "failed": len(results) - sent,
+            "results": [{
+                "patientId": r["data"]["patientId"],
+                "doctorId": r["data"]["doctorId"],
+                "success": r["success"],
+                **({"id": r["data"]["id"]} if r["success"] else {"error": r["error"]})
+            } for r in results]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/conversation")
-def get_message_conversation(patientId: str, doctorId: str):
-    """Get messages for a conversation"""
+def get_message_conversation(
+    request: Request,
+    response: Response,
+    patientId: str,
+    doctorId: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """Get messages for a conversation, optionally one cursor page at a time.
+
+    Pollers send `since` (the newest `updatedAt` they hold) and get every
+    message sent or read after it, to merge by id, plus If-None-Match; an
+    unchanged conversation is answered with 304.
+    """
     if not patientId or not doctorId:
         raise HTTPException(status_code=400, detail="Patient ID and Doctor ID are required")
     
     try:
-        conversation = get_conversation(patientId, doctorId)
+        etag = get_conversation_etag(patientId, doctorId, limit=limit, before=before, after=after, since=since)
+        if if_none_match(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        page = get_conversation_page(patientId, doctorId, limit=limit, before=before, after=after, since=since)
+        response.headers["ETag"] = etag
         return {
             "success": True,
-            "messages": conversation
+            "messages": page["messages"],
+            "nextCursor": page["nextCursor"],
+            "hasMore": page["hasMore"]
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/doctor/{doctorId}")
-def get_doctor_conversations(doctorId: str):
-    """Get all conversations for a doctor"""
+def get_doctor_conversations(doctorId: str, includeMessages: bool = False):
+    """Get conversation summaries for a doctor's inbox"""
     try:
-        conversations = get_conversations_for_doctor(doctorId)
+        conversations = get_conversations_for_doctor(doctorId, include_messages=includeMessages)
         return {
             "success": True,
             "conversations": conversations
@@ -74,10 +187,10 @@ def get_doctor_conversations(doctorId: str):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/patient/{patientId}")
-def get_patient_conversations(patientId: str):
-    """Get all conversations for a patient"""
+def get_patient_conversations(patientId: str, includeMessages: bool = False):
+    """Get conversation summaries for a patient's inbox"""
     try:
-        conversations = get_conversations_for_patient(patientId)
+        conversations = get_conversations_for_patient(patientId, include_messages=includeMessages)
         return {
             "success": True,
             "conversations": conversations
@@ -92,10 +205,60 @@ def mark_read(request: MarkReadRequest):
         raise HTTPException(status_code=400, detail="Patient ID and Doctor ID are required")
     
     try:
-        mark_conversation_as_read(request.patientId, request.doctorId)
+        updated = mark_conversation_as_read(request.patientId, request.doctorId, reader=request.reader)
+        if updated:
+            _publish(request.patientId, request.doctorId, {
+                "type": "read",
+                "data": {"patientId": request.patientId, "doctorId": request.doctorId, "reader": request.reader}
+            })
         return {
             "success": True,
-            "message": "Messages marked as read"
+            "message": "Messages marked as read",
+            "updated": updated
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/stream")
+async def stream_messages(request: Request, userId: str, role: str, user: dict = Depends(get_stream_user)):
+    """Server-sent events for a patient or doctor session.
+
+    Emits `message` events for new messages and `read` events for read
+    receipts in any of the user's conversations. Requires the caller's
+    Firebase ID token (Authorization header or `token` query param) and
+    only streams the caller's own channel.
+    """
+    if role not in ("patient", "doctor"):
+        raise HTTPException(status_code=400, detail="role must be patient or doctor")
+    if user.get("id") != userId or user.get("role") != role:
+        raise HTTPException(status_code=403, detail="Not allowed to stream this user's messages")
+    
+    subscription = hub.subscribe([f"{role}:{userId}"])
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=STREAM_KEEPALIVE)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stream/stats")
+def stream_stats():
+    """Connection counts and fan-out latency of this worker's hub"""
+    return {
+        "success": True,
+        **hub.stats()
+    }
@@ -2,11 +2,9 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict, List
 
-try:
-    from firebase_admin import firestore  # type: ignore
-    db = firestore.client()
-except Exception:
-    db = None
+from database.storage import get_repository
+from database.executor import run_blocking
+from utils.signals import DEFAULT_SIGNALS, publish_signals, signal_cache, worker_status
 
 router = APIRouter()
 
@@ -14,109 +12,65 @@ class SignalDefinition(BaseModel):
     symptomSignals: Dict[str, List[str]]
     contextSignals: Dict[str, List[str]]
 
-# Default signal definitions
-DEFAULT_SIGNALS = {
-    "symptomSignals": {
-        "cardiac": [
-            "chest pain",
-            "crushing chest",
-            "pain in left arm",
-            "jaw pain",
-            "heart attack",
-            "tightness in chest"
-        ],
-        "neurological": [
-            "slurred speech",
-            "facial droop",
-            "numbness on one side",
-            "arm weakness",
-            "stroke",
-            "seizure",
-            "loss of vision",
-            "confused",
-            "worst headache of my life"
-        ],
-        "respiratory": [
-            "cannot breathe",
-            "shortness of breath",
-            "gasping for air",
-            "turning blue",
-            "choking"
-        ],
-        "bleeding": [
-            "heavy bleeding",
-            "vomiting blood",
-            "coughing up blood",
-            "deep wound",
-            "stab wound",
-            "gunshot"
-        ],
-        "trauma": [
-            "fall from height",
-            "car accident",
-            "head injury",
-            "broken bone"
-        ]
-    },
-    "contextSignals": {
-        "sudden": ["sudden", "abrupt", "instantly"],
-        "worsening": ["getting worse", "rapidly", "unbearable"],
-        "exertion": ["while running", "during exercise", "walking up stairs"],
-        "duration": ["for hours", "persisting", "constant"]
-    }
-}
-
 @router.post("/init")
 async def initialize_signals():
     """Initialize signal definitions in Firestore."""
-    if not db:
+    if get_repository() is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        db.collection("config").document("signals").set(DEFAULT_SIGNALS)
+        snapshot = await run_blocking(publish_signals, DEFAULT_SIGNALS)
         return {
             "success": True,
             "message": "Signal definitions initialized in Firestore",
-            "data": DEFAULT_SIGNALS
+            "version": snapshot.version,
+            "data": snapshot.signals
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to initialize signals: {str(e)}")
 
 @router.get("/")
 async def get_signals():
-    """Retrieve signal definitions from Firestore."""
-    if not db:
-        raise HTTPException(status_code=503, detail="Database not available")
-    
+    """Retrieve signal definitions from the in-process signal cache."""
     try:
-        doc = db.collection("config").document("signals").get()
-        if doc.exists:
-            return {
-                "success": True,
-                "data": doc.to_dict()
-            }
-        else:
-            # Return default if not found
-            return {
-                "success": True,
-                "data": DEFAULT_SIGNALS
-            }
+        snapshot = await run_blocking(signal_cache.get)
+        return {
+            "success": True,
+            "version": snapshot.version,
+            "data": snapshot.signals
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve signals: {str(e)}")
 
+@router.get("/version")
+async def get_signals_version():
+    """Report the signal version served by this worker and its siblings on this host.
+
+    Workers record their status in files under SIGNALS_WORKER_STATUS_DIR
+    (a temp directory by default), so `workers` only lists processes on the
+    host that answered; query each host to check a multi-host deployment.
+    """
+    try:
+        return {
+            "success": True,
+            **(await run_blocking(worker_status))
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read signal version: {str(e)}")
+
 @router.put("/")
 async def update_signals(signals: SignalDefinition):
-    """Update signal definitions in Firestore."""
-    if not db:
+    """Publish new signal definitions; every worker hot-swaps to the new version."""
+    if get_repository() is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        data = signals.dict()
-        db.collection("config").document("signals").set(data)
+        snapshot = await run_blocking(publish_signals, signals.dict())
         return {
             "success": True,
             "message": "Signal definitions updated",
-            "data": data
+            "version": snapshot.version,
+            "data": snapshot.signals
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update signals: {str(e)}")
@@ -124,26 +78,16 @@ async def update_signals(signals: SignalDefinition):
 @router.get("/symptom/{category}")
 async def get_symptom_category(category: str):
     """Get symptoms for a specific category."""
-    if not db:
-        raise HTTPException(status_code=503, detail="Database not available")
-    
     try:
-        doc = db.collection("config").document("signals").get()
-        if doc.exists:
-            data = doc.to_dict()
-            symptoms = data.get("symptomSignals", {}).get(category, [])
-            if symptoms:
-                return {
-                    "success": True,
-                    "category": category,
-                    "symptoms": symptoms
-                }
-        
-        # Fallback to default
-        symptoms = DEFAULT_SIGNALS["symptomSignals"].get(category, [])
+        snapshot = await run_blocking(signal_cache.get)
+        symptoms = snapshot.signals.get("symptomSignals", {}).get(category, [])
+        if not symptoms:
+            # Fallback to default
+            symptoms = DEFAULT_SIGNALS["symptomSignals"].get(category, [])
         return {
             "success": True,
             "category": category,
+            "version": snapshot.version,
             "symptoms": symptoms
         }
     except Exception as e:
@@ -152,26 +96,16 @@ async def get_symptom_category(category: str):
 @router.get("/context/{category}")
 async def get_context_category(category: str):
     """Get context signals for a specific category."""
-    if not db:
-        raise HTTPException(status_code=503, detail="Database not available")
-    
     try:
-        doc = db.collection("config").document("signals").get()
-        if doc.exists:
-            data = doc.to_dict()
-            contexts = data.get("contextSignals", {}).get(category, [])
-            if contexts:
-                return {
-                    "success": True,
-                    "category": category,
-                    "contexts": contexts
-                }
-        
-        # Fallback to default
-        contexts = DEFAULT_SIGNALS["contextSignals"].get(category, [])
+        snapshot = await run_blocking(signal_cache.get)
+        contexts = snapshot.signals.get("contextSignals", {}).get(category, [])
+        if not contexts:
+            # Fallback to default
+            contexts = DEFAULT_SIGNALS["contextSignals"].get(category, [])
         return {
             "success": True,
             "category": category,
+            "version": snapshot.version,
             "contexts": contexts
         }
     except Exception as e:
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
+import json
+import os
+import time
 
-try:
-    from firebase_admin import firestore  # type: ignore
-    db = firestore.client()
-except Exception:
-    db = None
+from database.storage import get_repository
+from database.executor import run_blocking
+from utils.emergency_message import StreamingAssessor, assess_emergency_many, assessment_cache
+from utils.write_behind import write_behind
 
 router = APIRouter()
 
+# Upper bound on texts accepted by one batch assessment request
+ASSESS_BATCH_MAX = int(os.getenv("ASSESS_BATCH_MAX", "10000"))
+
+# Upper bound on the transcript one assess stream accumulates before a reset
+ASSESS_STREAM_MAX_CHARS = int(os.getenv("ASSESS_STREAM_MAX_CHARS", "20000"))
+
 class SymptomRecord(BaseModel):
     userId: str
     symptoms: List[str]
@@ -26,10 +35,18 @@ class EmergencyRecord(BaseModel):
     contactNumber: Optional[str] = None
     timestamp: Optional[str] = None
 
+class AssessBatchRequest(BaseModel):
+    texts: List[str]
+    threshold: int = 70
+    fuzzy: bool = False
+
+def _find_records(collection, user_id):
+    return get_repository().find_records(collection, user_id)
+
 @router.post("/symptoms")
 async def record_symptoms(record: SymptomRecord):
     """Record patient symptoms to Firestore."""
-    if not db:
+    if get_repository() is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     if not record.userId:
@@ -39,14 +56,13 @@ async def record_symptoms(record: SymptomRecord):
         record_data = record.dict()
         record_data["timestamp"] = record_data.get("timestamp") or datetime.now().isoformat()
         
-        # Create document in symptoms collection
-        doc_ref = db.collection("symptoms").document()
-        doc_ref.set(record_data)
+        # Queued for a batched write; the id is assigned up front
+        doc_id = await run_blocking(write_behind, "symptoms", record_data, priority=False)
         
         return {
             "success": True,
             "message": "Symptoms recorded successfully",
-            "id": doc_ref.id,
+            "id": doc_id,
             "data": record_data
         }
     except Exception as e:
@@ -55,12 +71,11 @@ async def record_symptoms(record: SymptomRecord):
 @router.get("/symptoms/{user_id}")
 async def get_user_symptoms(user_id: str):
     """Get all symptom records for a user."""
-    if not db:
+    if get_repository() is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        docs = db.collection("symptoms").where("userId", "==", user_id).stream()
-        records = [d.to_dict() for d in docs]
+        records = await run_blocking(_find_records, "symptoms", user_id)
         return {
             "success": True,
             "records": records
@@ -71,7 +86,7 @@ async def get_user_symptoms(user_id: str):
 @router.post("/emergency")
 async def record_emergency(record: EmergencyRecord):
     """Record emergency incident to Firestore."""
-    if not db:
+    if get_repository() is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     if not record.userId or not record.emergencyType:
@@ -81,14 +96,13 @@ async def record_emergency(record: EmergencyRecord):
         record_data = record.dict()
         record_data["timestamp"] = record_data.get("timestamp") or datetime.now().isoformat()
         
-        # Create document in emergency collection
-        doc_ref = db.collection("emergency").document()
-        doc_ref.set(record_data)
+        # Emergency records take the priority lane of the write queue
+        doc_id = await run_blocking(write_behind, "emergency", record_data, priority=True)
         
         return {
             "success": True,
             "message": "Emergency recorded successfully",
-            "id": doc_ref.id,
+            "id": doc_id,
             "data": record_data
         }
     except Exception as e:
@@ -97,15 +111,89 @@ async def record_emergency(record: EmergencyRecord):
 @router.get("/emergency/{user_id}")
 async def get_user_emergency(user_id: str):
     """Get all emergency records for a user."""
-    if not db:
+    if get_repository() is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        docs = db.collection("emergency").where("userId", "==", user_id).stream()
-        records = [d.to_dict() for d in docs]
+        records = await run_blocking(_find_records, "emergency", user_id)
         return {
             "success": True,
             "records": records
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve emergency records: {str(e)}")
+
+@router.post("/assess/batch")
+async def assess_batch(request: AssessBatchRequest):
+    """Screen a batch of free-text intake for emergency signals."""
+    if len(request.texts) > ASSESS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {ASSESS_BATCH_MAX} texts per batch")
+    
+    try:
+        started = time.perf_counter()
+        # Chunks run on the process pool; waiting for them happens off the event loop
+        results = await run_in_threadpool(
+            assess_emergency_many, request.texts, request.threshold, fuzzy=request.fuzzy
+        )
+        return {
+            "success": True,
+            "count": len(results),
+            "elapsedMs": round((time.perf_counter() - started) * 1000, 3),
+            "results": results
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to assess batch: {str(e)}")
+
+@router.get("/assess/cache")
+async def assess_cache_stats():
+    """Hit/miss counters of the memoized assessment cache (this worker)."""
+    return {"success": True, **assessment_cache.stats()}
+
+@router.websocket("/assess/stream")
+async def assess_stream(websocket: WebSocket, threshold: int = 70):
+    """Assess a live transcript as it grows.
+
+    Client messages are JSON: {"text": "..."} carries the full transcript so
+    far, {"chunk": "..."} appends to it, and {"reset": true} starts a new
+    utterance. Each message is answered with the current assessment; the
+    first one over the threshold has type "emergency". A message that is not
+    a JSON object, or that would grow the transcript past
+    ASSESS_STREAM_MAX_CHARS, gets an "error" frame and is ignored; the
+    socket stays open.
+    """
+    await websocket.accept()
+    assessor = StreamingAssessor(threshold=threshold)
+    try:
+        while True:
+            try:
+                payload = await websocket.receive_json()
+                if not isinstance(payload, dict):
+                    raise TypeError("message must be a JSON object")
+            except (json.JSONDecodeError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": f"Invalid message: {e}"})
+                continue
+            except KeyError:
+                # receive_json reads the text of the frame; binary frames have none
+                await websocket.send_json({"type": "error", "detail": "Invalid message: expected a text frame"})
+                continue
+            started = time.perf_counter()
+            if payload.get("reset"):
+                assessor.reset()
+            if "chunk" in payload:
+                chunk = str(payload.get("chunk") or "")
+                length = len(assessor.transcript) + len(chunk)
+            else:
+                text = str(payload.get("text") or "")
+                length = len(text)
+            if length > ASSESS_STREAM_MAX_CHARS:
+                await websocket.send_json({
+                    "type": "error",
+                    "detail": f"Transcript exceeds {ASSESS_STREAM_MAX_CHARS} characters; send reset to start over"
+                })
+                continue
+            report = assessor.feed(chunk) if "chunk" in payload else assessor.update(text)
+            report["type"] = "emergency" if report.pop("newEmergency") else "assessment"
+            report["elapsedMs"] = round((time.perf_counter() - started) * 1000, 3)
+            await websocket.send_json(report)
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,43 @@
+import os
+import sys
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+# Make both backend modules and the shared database package importable
+backend_path = Path(__file__).resolve().parent.parent
+for path in (backend_path, backend_path.parent):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from database import storage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _restore_repository():
+    """Tests install engines with set_repository(); put the original back after each."""
+    saved = storage._repository, storage._resolved
+    yield
+    storage._repository, storage._resolved = saved
+
+
+def _clear_emulator(host, project):
+    url = f"http://{host}/emulator/v1/projects/{project}/databases/(default)/documents"
+    urllib.request.urlopen(urllib.request.Request(url, method="DELETE")).close()
+
+
+@pytest.fixture
+def firestore_repository():
+    """FirestoreRepository on an empty Firestore emulator database; skipped
+    unless FIRESTORE_EMULATOR_HOST points at a running emulator."""
+    host = os.getenv("FIRESTORE_EMULATOR_HOST")
+    if not host:
+        pytest.skip("FIRESTORE_EMULATOR_HOST is not set")
+    firestore = pytest.importorskip("firebase_admin.firestore")
+    from database.firestore_store import FirestoreRepository
+
+    project = os.getenv("GCLOUD_PROJECT", "docai-test")
+    _clear_emulator(host, project)
+    yield FirestoreRepository(firestore.Client(project=project))
+    _clear_emulator(host, project)
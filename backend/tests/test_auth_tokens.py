@@ -0,0 +1,251 @@
+import asyncio
+import datetime
+import time
+
+import pytest
+
+jwt = pytest.importorskip("jwt")
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+
+from utils import auth_tokens  # noqa: E402
+from utils.auth_tokens import (  # noqa: E402
+    PROFILE_MISS_TTL,
+    GoogleCertKeySet,
+    InvalidTokenError,
+    ProfileCache,
+    StaticKeySet,
+    TokenVerifier,
+    _max_age,
+)
+
+PROJECT = "docai-test"
+KID = "key-1"
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+@pytest.fixture
+def verifier(signing_key):
+    return TokenVerifier(StaticKeySet({KID: signing_key[1]}), PROJECT, maxsize=2)
+
+
+@pytest.fixture
+def sign(signing_key):
+    def sign(kid=KID, **overrides):
+        now = int(time.time())
+        claims = {
+            "iss": f"https://securetoken.google.com/{PROJECT}",
+            "aud": PROJECT,
+            "sub": "uid-1",
+            "iat": now,
+            "exp": now + 3600,
+            "email": "ada@example.com",
+            "email_verified": True,
+        }
+        claims.update(overrides)
+        return jwt.encode(claims, signing_key[0], algorithm="RS256", headers={"kid": kid})
+
+    return sign
+
+
+class Clock:
+    """Stands in for the time module inside auth_tokens."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+def test_valid_token(verifier, sign):
+    claims = verifier.verify(sign())
+    assert claims["uid"] == "uid-1"
+    assert claims["email"] == "ada@example.com"
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"exp": int(time.time()) - 3600, "iat": int(time.time()) - 7200},
+        {"aud": "other-project"},
+        {"iss": "https://securetoken.google.com/other-project"},
+        {"sub": ""},
+    ],
+    ids=["expired", "wrong-aud", "wrong-iss", "empty-sub"],
+)
+def test_rejected_claims(verifier, sign, overrides):
+    with pytest.raises(InvalidTokenError):
+        verifier.verify(sign(**overrides))
+
+
+def test_unknown_kid(verifier, sign):
+    with pytest.raises(InvalidTokenError, match="Unknown signing key"):
+        verifier.verify(sign(kid="rotated-away"))
+
+
+def test_garbage_token(verifier):
+    with pytest.raises(InvalidTokenError):
+        verifier.verify("not.a.jwt")
+
+
+def test_cache_hits_and_lru_eviction(verifier, sign):
+    a, b, c = (sign(sub=f"uid-{i}") for i in range(3))
+    verifier.verify(a)
+    verifier.verify(b)
+    assert verifier.cached(a)["uid"] == "uid-0"  # a is now most recent
+    verifier.verify(c)  # evicts b
+    assert verifier.cached(b) is None
+    assert verifier.cached(a) is not None
+    assert verifier.stats()["size"] == 2
+
+
+def test_cached_claims_expire_at_exp(verifier, sign, monkeypatch):
+    exp = int(time.time()) + 60
+    token = sign(exp=exp)
+    verifier.verify(token)
+    clock = Clock()
+    monkeypatch.setattr(auth_tokens, "time", clock)
+    clock.now = exp - 1
+    assert verifier.cached(token) is not None
+    clock.now = exp
+    assert verifier.cached(token) is None
+    assert verifier.stats()["size"] == 0
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"Cache-Control": "public, max-age=19845, must-revalidate", "Age": "45"}, 19800.0),
+        ({"Cache-Control": "max-age=100"}, 100.0),
+        ({"Cache-Control": "max-age=100", "Age": "500"}, 0.0),
+        ({"Cache-Control": "max-age=100", "Age": "soon"}, 100.0),
+        ({"Cache-Control": "no-cache"}, 0.0),
+        ({"Cache-Control": "no-store, max-age=100"}, 0.0),
+        ({"Cache-Control": "public"}, None),
+        ({}, None),
+    ],
+)
+def test_max_age(headers, expected):
+    assert _max_age(headers) == expected
+
+
+def test_cert_key_set_honours_max_age(signing_key, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth_tokens, "time", clock)
+    keys = GoogleCertKeySet()
+    monkeypatch.setattr(keys, "_fetch", lambda: ({KID: signing_key[1]}, 120.0))
+    assert keys.get(KID) is not None
+    clock.now += 119
+    keys.get(KID)
+    assert keys.fetches == 1
+    clock.now += 1
+    keys.get(KID)
+    assert keys.fetches == 2
+
+
+def test_cert_key_set_refetches_unknown_kid_at_most_once_a_minute(signing_key, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth_tokens, "time", clock)
+    keys = GoogleCertKeySet()
+    monkeypatch.setattr(keys, "_fetch", lambda: ({KID: signing_key[1]}, 3600.0))
+    keys.get(KID)
+    assert keys.get("new-kid") is None
+    assert keys.fetches == 1
+    clock.now += auth_tokens.UNKNOWN_KID_REFETCH
+    keys.get("new-kid")
+    assert keys.fetches == 2
+
+
+@pytest.fixture
+def users(monkeypatch):
+    """Profile lookups served from a dict, counting calls."""
+    by_id = {"uid-1": {"id": "uid-1", "email": "ada@example.com", "role": "doctor", "password": "x"}}
+    legacy = {"old@example.com": {"id": "legacy-1", "email": "old@example.com", "role": "patient"}}
+    calls = {"id": 0, "email": 0}
+
+    async def find_user_by_id(uid):
+        calls["id"] += 1
+        return by_id.get(uid)
+
+    async def find_user_by_email(email):
+        calls["email"] += 1
+        return legacy.get(email)
+
+    monkeypatch.setattr(auth_tokens, "find_user_by_id", find_user_by_id)
+    monkeypatch.setattr(auth_tokens, "find_user_by_email", find_user_by_email)
+    return by_id, calls
+
+
+def test_profile_ttl(users, monkeypatch):
+    by_id, calls = users
+    clock = Clock()
+    monkeypatch.setattr(auth_tokens, "time", clock)
+    cache = ProfileCache(ttl=60)
+
+    profile = asyncio.run(cache.get("uid-1"))
+    assert profile["role"] == "doctor" and "password" not in profile
+    clock.now += 59
+    asyncio.run(cache.get("uid-1"))
+    assert calls["id"] == 1
+    clock.now += 1
+    asyncio.run(cache.get("uid-1"))
+    assert calls["id"] == 2
+
+
+def test_profile_miss_has_shorter_ttl(users, monkeypatch):
+    by_id, calls = users
+    clock = Clock()
+    monkeypatch.setattr(auth_tokens, "time", clock)
+    cache = ProfileCache(ttl=60)
+
+    assert asyncio.run(cache.get("uid-new")) is None
+    by_id["uid-new"] = {"id": "uid-new", "role": "patient"}
+    clock.now += PROFILE_MISS_TTL - 0.5
+    assert asyncio.run(cache.get("uid-new")) is None
+    clock.now += 0.5
+    assert asyncio.run(cache.get("uid-new"))["role"] == "patient"
+
+    cache.invalidate("uid-1")
+    asyncio.run(cache.get("uid-1"))
+    asyncio.run(cache.get("uid-1"))
+    assert calls["id"] == 3
+
+
+def test_resolve_profile_uses_uid_and_only_verified_email(users, monkeypatch):
+    monkeypatch.setattr(auth_tokens, "profile_cache", ProfileCache(ttl=0))
+    resolve = auth_tokens.resolve_profile
+
+    # The email claim never overrides the uid
+    assert asyncio.run(resolve({"uid": "uid-1", "email": "old@example.com", "email_verified": True}))["id"] == "uid-1"
+    # Legacy profiles are found by email only when it is verified
+    assert asyncio.run(resolve({"uid": "uid-9", "email": "old@example.com", "email_verified": True}))["id"] == "legacy-1"
+    assert asyncio.run(resolve({"uid": "uid-9", "email": "old@example.com", "email_verified": False})) is None
+    assert asyncio.run(resolve({"uid": "uid-9", "email": "old@example.com"})) is None
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import auth
+from utils.directory import DirectorySnapshot, UserDirectory, encode_cursor
+
+DOCTORS = [
+    {"id": "d1", "name": "Ada", "role": "doctor", "specialization": "Cardiology", "password": "x"},
+    {"id": "d2", "name": "Bo", "role": "doctor", "specialization": "Dermatology"},
+    {"id": "d3", "name": "Cy", "role": "doctor", "specialization": "cardiology"},
+]
+
+
+class WatchedSource:
+    """Directory source with a change feed the test drives by hand."""
+
+    def __init__(self, users):
+        self.users = list(users)
+        self.loads = 0
+        self.callback = self.on_error = None
+        self.unsubscribed = False
+
+    def load(self):
+        self.loads += 1
+        return list(self.users)
+
+    def watch(self, callback, on_error=None):
+        self.callback, self.on_error = callback, on_error
+        return self.unsubscribe
+
+    def unsubscribe(self):
+        self.unsubscribed = True
+
+
+def test_snapshot_projects_sorts_and_pages():
+    snapshot = DirectorySnapshot(DOCTORS, ("id", "name", "specialization"))
+    assert [u["id"] for u in snapshot.rows] == ["d1", "d2", "d3"]
+    assert "password" not in snapshot.rows[0]
+    assert [u["id"] for u in snapshot.query(specialization="CARDIOLOGY")["users"]] == ["d1", "d3"]
+
+    first = snapshot.query(limit=2)
+    assert first["hasMore"] and [u["id"] for u in first["users"]] == ["d1", "d2"]
+    rest = snapshot.query(limit=2, cursor=first["nextCursor"])
+    assert [u["id"] for u in rest["users"]] == ["d3"] and not rest["hasMore"]
+    with pytest.raises(ValueError):
+        snapshot.query(cursor="!!")
+
+
+def test_page_etag_covers_normalized_params():
+    snapshot = DirectorySnapshot(DOCTORS, ("id", "name"))
+    assert snapshot.page_etag() == snapshot.page_etag(specialization="", q=None)
+    assert snapshot.page_etag(q="Ad") == snapshot.page_etag(q=" ad ")
+    tags = {
+        snapshot.page_etag(),
+        snapshot.page_etag(q="a"),
+        snapshot.page_etag(specialization="cardiology"),
+        snapshot.page_etag(limit=1),
+        snapshot.page_etag(limit=1, cursor=encode_cursor(("ada", "d1"))),
+    }
+    assert len(tags) == 5
+    assert DirectorySnapshot(DOCTORS[:2], ("id", "name")).page_etag() != snapshot.page_etag()
+
+
+def test_listener_updates_and_falls_back_to_ttl_on_error():
+    source = WatchedSource(DOCTORS)
+    directory = UserDirectory("doctor", source, ttl=60, listen=True)
+    assert len(directory.get()) == 3
+    assert directory.stats()["listening"]
+
+    source.callback(DOCTORS[:1])
+    assert len(directory.get()) == 1 and source.loads == 1
+
+    source.on_error(RuntimeError("stream closed"))
+    assert not directory.stats()["listening"]
+    assert len(directory.get()) == 3 and source.loads == 2
+    time.sleep(0.05)
+    assert source.unsubscribed
+    # TTL refresh from now on; the listener is not re-attached
+    directory.get()
+    assert source.loads == 2
+
+
+@pytest.fixture
+def client(monkeypatch):
+    directory = UserDirectory("doctor", WatchedSource(DOCTORS), ttl=60, listen=False)
+    monkeypatch.setitem(auth.directories, "doctor", directory)
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/api/auth")
+    return TestClient(app)
+
+
+def test_doctors_etag_depends_on_query(client):
+    full = client.get("/api/auth/doctors")
+    assert full.status_code == 200 and len(full.json()["doctors"]) == 3
+    etag = full.headers["etag"]
+    assert client.get("/api/auth/doctors", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/auth/doctors", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+
+    filtered = client.get("/api/auth/doctors?specialization=cardiology", headers={"If-None-Match": etag})
+    assert filtered.status_code == 200 and len(filtered.json()["doctors"]) == 2
+    assert filtered.headers["etag"] != etag
+
+
+def test_bad_cursor_is_rejected_before_304(client):
+    etag = client.get("/api/auth/doctors?cursor=bad").headers.get("etag")
+    response = client.get("/api/auth/doctors?cursor=bad", headers={"If-None-Match": etag or "*"})
+    assert response.status_code == 400
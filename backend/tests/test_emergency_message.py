@@ -0,0 +1,124 @@
+from utils import emergency_message
+from utils.emergency_message import SignalIndex, assess_emergency
+
+
+def test_rebuild_returns_a_new_index(monkeypatch):
+    monkeypatch.setattr(emergency_message, "_index", SignalIndex())
+    index = emergency_message.get_signal_index()
+    matcher, phrases = index.matcher, index.phrases
+
+    rebuilt = index.rebuild({"cardiac": ["Jaw Pain"]}, version=2)
+    # The live index is untouched, so a scan in flight never mixes old and new tables
+    assert index.matcher is matcher and index.phrases is phrases
+    assert index.scan("chest pain")[0] == ["cardiac"]
+    assert rebuilt.version == 2 and index.version == 0
+    assert rebuilt.phrases["symptom:cardiac"] == ["jaw pain"]
+    assert rebuilt.scan("chest pain")[0] == [] and rebuilt.scan("jaw pain")[0] == ["cardiac"]
+    assert rebuilt.context_signals is index.context_signals
+
+    emergency_message.set_signal_index(rebuilt)
+    assert assess_emergency("jaw pain")["risk"] == 60 and assess_emergency("chest pain")["risk"] == 0
+    assert index.rebuild().version == 0
+
+
+def test_normalize_composes_and_cleans():
+    normalize = emergency_message._normalize
+    # Decomposed and precomposed sequences compare equal after NFC
+    assert normalize("e\u0301") == normalize("\u00e9") == "\u00e9"
+    assert normalize("\u0928\u093c") == normalize("\u0929")  # Devanagari nukta
+    assert normalize("\u0c46\u0c56") == normalize("\u0c48")  # Telugu ai vowel sign
+    # Zero-width joiners vanish; punctuation, symbols and runs of space collapse
+    assert normalize("Chest\u200d Pain!!  \U0001f630 NOW") == "chest pain now"
+    assert normalize("सीने   में\tदर्द।") == "सीने में दर्द"
+    assert normalize("") == normalize(None) == ""
+
+
+def test_normalize_memoizes_only_short_texts():
+    cached = emergency_message._normalize_cached
+    assert cached.cache_info().maxsize == emergency_message.NORMALIZE_CACHE_SIZE
+    cached.cache_clear()
+    short = "Chest pain"
+    long = "chest pain " * (emergency_message.NORMALIZE_CACHE_MAX_LEN // 10)
+    assert len(long) > emergency_message.NORMALIZE_CACHE_MAX_LEN
+
+    emergency_message._normalize(short)
+    emergency_message._normalize(short)
+    assert cached.cache_info().hits == 1 and cached.cache_info().currsize == 1
+    assert emergency_message._normalize(long) == long.strip()
+    assert cached.cache_info().currsize == 1
+
+
+def test_script_counts_and_language_ranking():
+    index = SignalIndex()
+    counts = emergency_message._script_counts("chest pain मेंदर्द 😰", index)
+    assert counts == {"hi": 7, "te": 0, "en": 9}
+    assert emergency_message._rank_languages(counts) == ["en", "hi"]
+    assert emergency_message._rank_languages({"hi": 2, "te": 2, "en": 2}) == ["hi", "te", "en"]
+    assert emergency_message._rank_languages({"hi": 0, "te": 0, "en": 0}) == []
+
+    assert emergency_message._detect_language("సీనే నొప్పి pain", index) == "te"
+    assert emergency_message._detect_language("Crème brûlée", index) == "en"
+    # Digits, symbols and scripts outside the ranges do not count
+    assert emergency_message._detect_language("123 😰 ¿?", index) == "en"
+
+
+def test_report_language_picks_the_message():
+    report = assess_emergency("सीने में दर्द और सांस लेने में कठिनाई, help", index=SignalIndex())
+    assert report["isEmergency"] and report["languages"] == ["hi", "en"]
+    assert report["message"] == emergency_message.EMERGENCY_MESSAGES["hi"]
+    assert assess_emergency("", index=SignalIndex())["languages"] == ["en"]
+
+
+class Clock:
+    """Stands in for the time module inside emergency_message."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+def test_assessment_cache_hits_expiry_and_eviction(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(emergency_message, "time", clock)
+    cache = emergency_message.AssessmentCache(maxsize=2, ttl=60)
+    monkeypatch.setattr(emergency_message, "assessment_cache", cache)
+    monkeypatch.setattr(emergency_message, "_index", SignalIndex())
+
+    report = assess_emergency("Heavy bleeding!")
+    report["reasons"].append("mutated by the caller")
+    # Same normalized text: served from the cache, as an unshared copy
+    again = assess_emergency("  heavy   BLEEDING ")
+    assert again["reasons"] != report["reasons"] and again["risk"] == report["risk"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    # Threshold and fuzzy are part of the key
+    assess_emergency("heavy bleeding", threshold=90)
+    assess_emergency("heavy bleeding", fuzzy=True)
+    assert cache.stats()["misses"] == 3 and cache.stats()["size"] == 2
+
+    clock.now += 59
+    assess_emergency("heavy bleeding", fuzzy=True)
+    assert cache.stats()["hits"] == 2
+    clock.now += 2
+    assess_emergency("heavy bleeding", fuzzy=True)
+    assert cache.stats()["misses"] == 4
+
+    # Reports against another index are not cached
+    assess_emergency("heavy bleeding", index=SignalIndex())
+    assert cache.stats()["misses"] == 4
+
+
+def test_assessment_cache_cleared_on_index_swap(monkeypatch):
+    cache = emergency_message.AssessmentCache()
+    monkeypatch.setattr(emergency_message, "assessment_cache", cache)
+    monkeypatch.setattr(emergency_message, "_index", SignalIndex())
+
+    assert assess_emergency("heavy bleeding")["isEmergency"]
+    assert cache.stats()["size"] == 1
+    emergency_message.set_signal_index(SignalIndex({"cardiac": ["jaw pain"]}, {}))
+    assert cache.stats()["size"] == 0
+    assert not assess_emergency("heavy bleeding")["isEmergency"]
@@ -0,0 +1,51 @@
+import pytest
+
+from utils.fuzzy_index import FuzzyIndex, edit_budget
+
+PHRASES = ["stroke", "seizure", "bad cough", "chest pain"]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return FuzzyIndex((phrase, {"category": phrase}) for phrase in PHRASES)
+
+
+def distances(index, text):
+    return {m["text"]: m["distance"] for m in index.search(text)}
+
+
+@pytest.mark.parametrize("length, budget", [(6, 0), (7, 1), (9, 1), (10, 2), (25, 2)])
+def test_edit_budget_by_length(length, budget):
+    assert edit_budget(length) == budget
+    assert edit_budget(length, max_edits=1) == min(budget, 1)
+
+
+def test_exact_only_phrases_are_not_indexed(index):
+    assert len(index) == 3 and "stroke" not in index.phrases
+    assert distances(index, "a strokr") == {}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("had a seizre today", {"seizure": 1}),
+        ("had a sezre today", {}),
+        ("a bad cugh", {"bad cough": 1}),
+        ("a bd cugh", {}),
+        ("sharp chest pian", {"chest pain": 2}),
+        ("sharp chst pian", {}),
+        ("the best plan", {}),
+    ],
+    ids=["7-one-edit", "7-two-edits", "9-one-edit", "9-two-edits", "10-two-edits", "10-three-edits", "unrelated"],
+)
+def test_matches_within_the_budget_only(index, text, expected):
+    assert distances(index, text) == expected
+
+
+def test_match_shape_and_caller_budget(index):
+    [match] = index.search("sharp chest pian now")
+    assert match["category"] == "chest pain"
+    assert (match["start"], match["end"], match["score"]) == (6, 16, 0.8)
+    assert index.search("sharp chest pian", max_edits=1) == []
+    assert index.search("sharp chest pian", min_score=0.9) == []
+    assert index.search("sharp chest pain")[0]["distance"] == 0
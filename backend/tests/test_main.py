@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+import main
+from utils import signals
+
+
+def test_lifespan_loads_signals_and_shuts_down(monkeypatch):
+    calls = []
+    monkeypatch.setattr(signals.signal_cache, "get", lambda: calls.append("signals"))
+    # Keep the shared executors alive for the rest of the suite
+    monkeypatch.setattr(main, "shutdown_workers", lambda: calls.append("shutdown"))
+
+    with TestClient(main.app) as client:
+        assert calls == ["signals"]
+        assert client.get("/health").json()["status"] == "ok"
+    assert calls == ["signals", "shutdown"]
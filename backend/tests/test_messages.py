@@ -0,0 +1,245 @@
+import pytest
+
+from database import messages
+from database.conversations import encode_cursor
+from database.messages import MessageStore
+from database.sqlite_store import SQLiteStore
+from database.storage import set_repository
+from utils.etags import if_none_match, parse_etags
+
+
+@pytest.fixture(params=["memory", "sqlite", "firestore"])
+def engine(request):
+    if request.param == "memory":
+        store = MessageStore()
+        set_repository(None)
+        messages.message_store, saved = store, messages.message_store
+        yield store
+        messages.message_store = saved
+    else:
+        if request.param == "sqlite":
+            store = SQLiteStore(":memory:")
+        else:
+            store = request.getfixturevalue("firestore_repository")
+        set_repository(store)
+        yield store
+
+
+def _send(text, sender="patient"):
+    return messages.send_message("p1", "d1", "Pat", "Doc", text, sender)
+
+
+def test_since_returns_new_and_updated_messages(engine):
+    first = _send("hello")
+    second = _send("hi", sender="doctor")
+    since = max(first["updatedAt"], second["updatedAt"])
+    assert messages.get_conversation_page("p1", "d1", since=since)["messages"] == []
+
+    messages.mark_conversation_as_read("p1", "d1", reader="doctor")
+    third = _send("there?")
+    delta = messages.get_conversation_page("p1", "d1", since=since)["messages"]
+    assert [m["id"] for m in delta] == [first["id"], third["id"]]
+    assert delta[0]["read"] and delta[0]["updatedAt"] > since
+
+
+def test_since_rejects_cursors(engine):
+    _send("hello")
+    with pytest.raises(ValueError):
+        messages.get_conversation_page("p1", "d1", since="2020-01-01", after="x")
+
+
+def test_etag_tracks_changes_and_query(engine):
+    assert messages.get_conversation_etag("p1", "d1") == messages.get_conversation_etag("p1", "d1")
+    empty = messages.get_conversation_etag("p1", "d1")
+    msg = _send("hello")
+    sent = messages.get_conversation_etag("p1", "d1")
+    assert sent != empty
+    assert messages.get_conversation_etag("p1", "d1", limit=10) != sent
+    assert messages.get_conversation_etag("p1", "d1", since=msg["updatedAt"]) != sent
+
+    _send("reply", sender="doctor")
+    replied = messages.get_conversation_etag("p1", "d1")
+    # Reading a message that is not the newest still changes the tag
+    messages.mark_conversation_as_read("p1", "d1", reader="doctor")
+    read = messages.get_conversation_etag("p1", "d1")
+    assert read != replied
+    messages.delete_message(msg["id"])
+    assert messages.get_conversation_etag("p1", "d1") != read
+
+
+@pytest.mark.parametrize(
+    "header, matches",
+    [
+        ('"abc"', True),
+        ('"x", "abc"', True),
+        ('W/"abc"', True),
+        ('"x",W/"abc" ', True),
+        ("*", True),
+        ('"abcd"', False),
+        ('"ab"', False),
+        ("abc", False),
+        ("", False),
+        (None, False),
+    ],
+)
+def test_if_none_match(header, matches):
+    assert if_none_match(header, '"abc"') is matches
+
+
+def test_parse_etags():
+    assert parse_etags('"a", W/"b",   "c,d"') == ['"a"', '"b"', '"c,d"']
+
+
+def test_bulk_send_keeps_names_and_newest_last_message(engine):
+    _send("latest", sender="doctor")
+    older = dict(messages._build_message("p1", "d1", "", "", "older", "doctor"), timestamp="2000-01-01T00:00:00")
+    results = engine.add_messages([older, messages._build_message("p2", "d1", "", "Doc", "hello", "doctor")])
+    assert all(r["success"] for r in results)
+
+    summary = engine.get_summary("p1", "d1")
+    assert summary["patientName"] == "Pat" and summary["doctorName"] == "Doc"
+    assert summary["lastMessage"] == "latest"
+    assert summary["unreadForPatient"] == 2
+    assert engine.get_summary("p2", "d1")["lastMessage"] == "hello"
+
+
+def test_concurrent_mark_read_and_send_keep_counters_exact(engine):
+    import threading
+
+    for i in range(20):
+        _send(f"m{i}", sender="patient" if i % 2 else "doctor")
+
+    def worker(i):
+        if i % 3 == 0:
+            _send(f"late{i}")
+        else:
+            messages.mark_conversation_as_read("p1", "d1", reader="doctor" if i % 2 else None)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    unread = [m for m in messages.get_conversation("p1", "d1") if not m["read"]]
+    summary = engine.get_summary("p1", "d1")
+    assert summary["unreadForDoctor"] == sum(1 for m in unread if m["sender"] != "doctor")
+    assert summary["unreadForPatient"] == sum(1 for m in unread if m["sender"] == "doctor")
+
+
+def test_colliding_ids_never_overwrite(engine, monkeypatch):
+    from database.storage import DocumentExists
+
+    first = _send("first")
+    taken = iter([first["id"], first["id"]])
+    real = messages.new_message_id
+    monkeypatch.setattr(messages, "new_message_id", lambda: next(taken, None) or real())
+
+    second = _send("second")
+    assert second["id"] != first["id"]
+    results = messages.send_messages([
+        dict(patient_id="p1", doctor_id="d1", patient_name="", doctor_name="", message="bulk", sender="doctor"),
+    ])
+    assert results[0]["success"] and results[0]["data"]["id"] != first["id"]
+
+    stored = {m["id"]: m["message"] for m in messages.get_conversation("p1", "d1")}
+    assert stored[first["id"]] == "first" and len(stored) == 3
+    assert engine.get_summary("p1", "d1")["unreadForDoctor"] == 2
+
+    with pytest.raises(DocumentExists):
+        engine.add_message(dict(first, message="overwrite"))
+
+
+def _msg(msg_id, patient_id, minute, sender="patient"):
+    return {
+        "id": msg_id,
+        "patientId": patient_id,
+        "doctorId": "d1",
+        "patientName": "Pat",
+        "doctorName": "Doc",
+        "message": msg_id,
+        "sender": sender,
+        "timestamp": f"2024-01-01T00:{minute:02d}:00",
+        "read": False,
+    }
+
+
+def test_message_store_evicts_oldest_past_max():
+    assert MessageStore().max_messages == messages.MESSAGE_STORE_MAX
+    store = MessageStore(max_messages=3)
+    store.add_message(_msg("m1", "p1", 1))
+    store.add_message(_msg("m2", "p2", 2))
+    store.add_message(_msg("m3", "p2", 3, sender="doctor"))
+    assert len(store) == 3
+
+    store.add_message(_msg("m4", "p2", 4))
+    # m1 was inserted first; its thread, summary and partner index go with it
+    assert len(store) == 3 and store.get_message("m1") is None
+    assert store.thread("p1", "d1") == [] and store.get_summary("p1", "d1") is None
+    assert [s["patientId"] for s in store.summaries_for("doctor", "d1")] == ["p2"]
+    assert store.summaries_for("patient", "p1") == []
+
+    store.add_message(_msg("m5", "p2", 5))
+    summary = store.get_summary("p2", "d1")
+    assert [m["id"] for m in store.thread("p2", "d1")] == ["m3", "m4", "m5"]
+    assert (summary["unreadForDoctor"], summary["unreadForPatient"]) == (2, 1)
+    assert summary["lastMessageId"] == "m5"
+
+
+def test_cursor_pages_backward_and_forward(engine):
+    for i in range(1, 6):
+        engine.add_message(_msg(f"m{i}", "p1", i))
+
+    def ids(page):
+        return [m["id"] for m in page["messages"]]
+
+    # Newest first by page, each page oldest first
+    page = messages.get_conversation_page("p1", "d1", limit=2)
+    assert ids(page) == ["m4", "m5"] and page["hasMore"]
+    page = messages.get_conversation_page("p1", "d1", limit=2, before=page["nextCursor"])
+    assert ids(page) == ["m2", "m3"] and page["hasMore"]
+    page = messages.get_conversation_page("p1", "d1", limit=2, before=page["nextCursor"])
+    assert ids(page) == ["m1"] and not page["hasMore"] and page["nextCursor"] is None
+
+    # after= walks toward newer messages
+    page = messages.get_conversation_page("p1", "d1", limit=2, after=encode_cursor(_msg("m1", "p1", 1)))
+    assert ids(page) == ["m2", "m3"] and page["hasMore"]
+    page = messages.get_conversation_page("p1", "d1", limit=2, after=page["nextCursor"])
+    assert ids(page) == ["m4", "m5"] and not page["hasMore"]
+
+    assert ids(messages.get_conversation_page("p1", "d1")) == ["m1", "m2", "m3", "m4", "m5"]
+    with pytest.raises(ValueError):
+        messages.get_conversation_page("p1", "d1", before="not-a-cursor")
+
+
+def test_mark_read_treats_every_non_doctor_sender_alike(engine):
+    # unread_field: whatever the doctor did not send is addressed to the doctor
+    for i, sender in enumerate(["patient", None, "nurse", "doctor"]):
+        engine.add_message(dict(_msg(f"m{i}", "p1", i), sender=sender))
+    summary = engine.get_summary("p1", "d1")
+    assert (summary["unreadForDoctor"], summary["unreadForPatient"]) == (3, 1)
+
+    assert messages.mark_conversation_as_read("p1", "d1", reader="doctor") == 3
+    summary = engine.get_summary("p1", "d1")
+    assert (summary["unreadForDoctor"], summary["unreadForPatient"]) == (0, 1)
+    read = {m["id"]: m["read"] for m in messages.get_conversation_page("p1", "d1")["messages"]}
+    assert read == {"m0": True, "m1": True, "m2": True, "m3": False}
+
+    assert messages.mark_conversation_as_read("p1", "d1", reader="patient") == 1
+    summary = engine.get_summary("p1", "d1")
+    assert (summary["unreadForDoctor"], summary["unreadForPatient"]) == (0, 0)
+
+
+def test_since_falls_back_to_timestamp_for_legacy_messages(engine):
+    # Stored before messages carried updatedAt
+    for i in (1, 5):
+        engine.add_message(_msg(f"m{i}", "p1", i))
+
+    def changed(since):
+        return [m["id"] for m in messages.get_conversation_page("p1", "d1", since=since)["messages"]]
+
+    assert changed("2024-01-01T00:00:30") == ["m1", "m5"]
+    assert changed("2024-01-01T00:03:00") == ["m5"]
+    assert changed("2024-01-01T00:05:00") == []
+    messages.mark_conversation_as_read("p1", "d1")
+    assert changed("2024-01-01T00:05:00") == ["m1", "m5"]
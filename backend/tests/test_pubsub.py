@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import messages
+from utils import auth_tokens
+from utils.auth_tokens import InvalidTokenError
+from utils.pubsub import Broker, PubSubHub, SUBSCRIBER_QUEUE_SIZE
+
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker()
+
+    class Partial(Broker):
+        def start(self, deliver):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_counters_from_many_threads():
+    hub = PubSubHub()
+    threads, per_thread = 8, 100
+    total = threads * per_thread
+
+    async def run():
+        subscription = hub.subscribe(["doctor:d1"])
+
+        def publish():
+            for i in range(per_thread):
+                hub.publish("doctor:d1", {"type": "message", "data": i})
+
+        workers = [threading.Thread(target=publish) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            await asyncio.to_thread(worker.join)
+        while hub.stats()["delivered"] < total:
+            await asyncio.sleep(0.01)
+        stats = hub.stats()
+        hub.unsubscribe(subscription)
+        return stats, subscription
+
+    stats, subscription = asyncio.run(run())
+    assert stats["published"] == stats["delivered"] == total
+    assert stats["dropped"] == subscription.dropped == total - SUBSCRIBER_QUEUE_SIZE
+    assert stats["connections"] == 1
+    assert hub.stats()["connections"] == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Messages routes whose tokens are the uid of a known profile."""
+    profiles = {
+        "p1": {"id": "p1", "role": "patient"},
+        "d1": {"id": "d1", "role": "doctor"},
+    }
+
+    async def verify_token(token):
+        if token not in profiles:
+            raise InvalidTokenError("bad token")
+        return {"uid": token}
+
+    async def resolve_profile(claims):
+        return profiles.get(claims["uid"])
+
+    monkeypatch.setattr(auth_tokens, "verify_token", verify_token)
+    monkeypatch.setattr(auth_tokens, "resolve_profile", resolve_profile)
+    app = FastAPI()
+    app.include_router(messages.router, prefix="/api/messages")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "params, headers, status",
+    [
+        ({"userId": "p1", "role": "patient"}, {}, 401),
+        ({"userId": "p1", "role": "patient", "token": "forged"}, {}, 401),
+        ({"userId": "p1", "role": "patient", "token": "d1"}, {}, 403),
+        ({"userId": "d1", "role": "patient", "token": "d1"}, {}, 403),
+        ({"userId": "p1", "role": "doctor"}, {"Authorization": "Bearer p1"}, 403),
+    ],
+    ids=["no-token", "bad-token", "other-user", "other-role", "header-other-role"],
+)
+def test_stream_rejects_other_callers(client, params, headers, status):
+    response = client.get("/api/messages/stream", params=params, headers=headers)
+    assert response.status_code == status
+
+
+def test_stream_accepts_own_channel(client, monkeypatch):
+    subscribed = []
+
+    class Stop(Exception):
+        pass
+
+    def subscribe(channels):
+        subscribed.extend(channels)
+        raise Stop()
+
+    # Stop before the endless event loop; only the gate is under test
+    monkeypatch.setattr(messages.hub, "subscribe", subscribe)
+    with pytest.raises(Stop):
+        client.get("/api/messages/stream", params={"userId": "d1", "role": "doctor"}, headers={"Authorization": "Bearer d1"})
+    with pytest.raises(Stop):
+        client.get("/api/messages/stream", params={"userId": "p1", "role": "patient", "token": "p1"})
+    assert subscribed == ["doctor:d1", "patient:p1"]
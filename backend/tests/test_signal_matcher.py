@@ -0,0 +1,76 @@
+from utils.signal_matcher import SignalMatcher, compile_signals, first_match
+
+
+def matcher_for(*phrases):
+    return SignalMatcher((phrase, {"text": phrase}) for phrase in phrases)
+
+
+def spans(matcher, text):
+    return [(m["text"], m["start"], m["end"]) for m in matcher.find_all(text)]
+
+
+def test_overlapping_and_nested_phrases():
+    matcher = matcher_for("he", "she", "his", "hers")
+    # Ordered by end offset; a phrase ending inside another is still reported
+    assert spans(matcher, "ushers") == [("she", 1, 4), ("he", 2, 4), ("hers", 2, 6)]
+    assert spans(matcher, "hishe") == [("his", 0, 3), ("she", 2, 5), ("he", 3, 5)]
+
+
+def test_offsets_and_repeats():
+    matcher = matcher_for("chest pain", "pain")
+    text = "pain, then chest pain"
+    found = spans(matcher, text)
+    assert found == [("pain", 0, 4), ("chest pain", 11, 21), ("pain", 17, 21)]
+    assert all(text[start:end] == phrase for phrase, start, end in found)
+
+
+def test_empty_pattern_set():
+    for matcher in (SignalMatcher([]), matcher_for("")):
+        assert len(matcher) == 0
+        assert matcher.find_all("chest pain") == []
+    assert matcher_for("pain").find_all("") == []
+
+
+def test_non_latin_text():
+    matcher = matcher_for("सीने में दर्द", "दर्द", "గుండె నొప్పి")
+    text = "मुझे सीने में दर्द है और గుండె నొప్పి"
+    found = spans(matcher, text)
+    assert [phrase for phrase, _, _ in found] == ["सीने में दर्द", "दर्द", "గుండె నొప్పి"]
+    # Offsets count code points, combining marks included
+    assert all(text[start:end] == phrase for phrase, start, end in found)
+
+
+def test_compile_signals_and_first_match():
+    matcher = compile_signals({
+        "symptomSignals": {
+            "cardiac": ["Chest Pain", {"text": "jaw pain"}],
+            "trauma": [],
+            "bleeding": ["pain"],
+        },
+        "contextSignals": {"sudden": ["sudden"]},
+    })
+    assert ("symptom", "trauma") in matcher.categories
+    matches = matcher.find_all("sudden pain in the jaw, then chest pain")
+    assert [(m["kind"], m["category"], m["text"]) for m in matches] == [
+        ("context", "sudden", "sudden"),
+        ("symptom", "bleeding", "pain"),
+        ("symptom", "cardiac", "chest pain"),
+        ("symptom", "bleeding", "pain"),
+    ]
+
+    # The phrase defined first wins, whatever its position in the text
+    assert first_match(matches, "symptom")["text"] == "chest pain"
+    assert first_match(matches, "symptom", "bleeding")["start"] == 7
+    assert first_match(matches, "context")["category"] == "sudden"
+    assert first_match(matches, "symptom", "trauma") is None
+
+
+def test_advance_resumes_across_chunks():
+    matcher = matcher_for("chest pain", "pain")
+    text = "sudden chest pain"
+    whole = list(matcher.iter_matches(text))
+    for cut in range(len(text) + 1):
+        state, first = matcher.advance(text[:cut])
+        state, rest = matcher.advance(text[cut:], state, cut)
+        assert first + rest == whole
+    assert list(matcher.iter_matches("st pain", matcher.advance("sudden che")[0], 10)) == whole
@@ -0,0 +1,178 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database.sqlite_store import SQLiteStore
+from database.storage import set_repository
+from routes import signals as signal_routes
+from utils import emergency_message, signals
+from utils.emergency_message import SignalIndex, assess_emergency, build_signal_index
+from utils.signals import LocalSignalSource, SignalCache
+
+PUBLISHED = {
+    "version": 7,
+    "symptomSignals": {"cardiac": ["crushing chest", {"text": "heart attack"}]},
+    "contextSignals": {"sudden": ["abruptly"]},
+}
+
+
+def test_published_set_replaces_built_ins():
+    index = build_signal_index(PUBLISHED, 7)
+    assert index.version == 7
+    assert index.symptom_signals == {"cardiac": ["crushing chest", "heart attack"]}
+    assert index.context_signals == {"sudden": ["abruptly"]}
+
+    assert index.scan("abruptly a crushing chest")[:2] == (["cardiac"], ["sudden"])
+    # Built-in phrases the published set left out no longer match
+    assert index.scan("slurred speech, getting worse")[:2] == ([], [])
+    assert index.scan("कार दुर्घटना")[:2] == ([], [])
+
+
+def test_version_is_the_stored_one():
+    source = LocalSignalSource({"symptomSignals": {}, "contextSignals": {}})
+    cache = SignalCache(source, listen=False)
+    # Never published: no global version
+    assert cache.version == 0
+
+    cache.set(dict(PUBLISHED, version=3))
+    cache.set(dict(PUBLISHED, version=3, contextSignals={}))
+    # A changed document without a new stored version does not invent one locally
+    assert cache.version == 3
+    assert cache.get().index.version == 3
+
+
+def published(version, *phrases):
+    return {"version": version, "symptomSignals": {"cardiac": list(phrases)}, "contextSignals": {}}
+
+
+class Clock:
+    """Stands in for the time module inside signals."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+def test_local_source_loads_and_notifies_watchers():
+    source = LocalSignalSource(published(1, "chest pain"))
+    seen = []
+    unsubscribe = source.watch(seen.append)
+    assert source.load()["version"] == 1 and source.loads == 1
+
+    source.update(published(2, "jaw pain"))
+    assert [s["version"] for s in seen] == [2]
+    unsubscribe()
+    source.update(published(3, "jaw pain"))
+    assert [s["version"] for s in seen] == [2]
+    assert source.load()["version"] == 3
+
+
+def test_listener_swaps_snapshots_without_reloading():
+    source = LocalSignalSource(published(1, "chest pain"))
+    cache = SignalCache(source)
+    installed = []
+    cache.add_listener(installed.append)
+
+    first = cache.get()
+    assert first.version == 1 and cache.get() is first
+    assert source.loads == 1 and len(source._watchers) == 1
+
+    source.update(published(2, "jaw pain"))
+    second = cache.get()
+    assert second is not first and second.version == 2
+    assert source.loads == 1
+    assert installed == [first, second]
+    # Compiled before the swap; a request holding the old snapshot keeps it intact
+    assert [p["text"] for p in second.matcher.payloads] == ["jaw pain"]
+    assert [p["text"] for p in first.matcher.payloads] == ["chest pain"]
+    assert second.index.version == 2
+
+    # An identical document installs nothing new
+    source.update(published(2, "jaw pain"))
+    assert cache.get() is second and len(installed) == 2
+
+    cache.invalidate()
+    assert source._watchers == []
+    assert cache.get() is second and source.loads == 2 and len(source._watchers) == 1
+
+
+def test_ttl_refresh_without_listener(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(signals, "time", clock)
+    source = LocalSignalSource(published(1, "chest pain"))
+    cache = SignalCache(source, ttl=60, listen=False)
+
+    assert cache.version == 1
+    source.signals = published(2, "jaw pain")
+    clock.now += 59
+    assert cache.version == 1 and source.loads == 1
+    clock.now += 1
+    assert cache.version == 2 and source.loads == 2
+
+
+def test_failed_load_keeps_the_last_snapshot(monkeypatch):
+    source = LocalSignalSource(published(4, "chest pain"))
+    cache = SignalCache(source, ttl=0, listen=False)
+    snapshot = cache.get()
+
+    def fail():
+        raise RuntimeError("unavailable")
+
+    monkeypatch.setattr(source, "load", fail)
+    assert cache.get() is snapshot
+
+    empty = SignalCache(LocalSignalSource(None), default=published(0, "fallback"), listen=False)
+    assert empty.get().signals["symptomSignals"] == {"cardiac": ["fallback"]}
+
+
+def test_installed_snapshot_swaps_the_emergency_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(emergency_message, "_index", emergency_message.get_signal_index())
+    monkeypatch.setattr(signals, "WORKER_STATUS_DIR", str(tmp_path))
+    source = LocalSignalSource(published(5, "chest pain"))
+    cache = SignalCache(source)
+    cache.add_listener(signals._install_snapshot)
+    monkeypatch.setattr(signals, "signal_cache", cache)
+
+    cache.get()
+    assert emergency_message.get_signal_index().version == 5
+    source.update(published(6, "jaw pain"))
+    index = emergency_message.get_signal_index()
+    assert index.version == 6 and index.scan("jaw pain")[0] == ["cardiac"]
+
+    status = signals.worker_status()
+    assert status["version"] == 6
+    assert [w["version"] for w in status["workers"]] == [6]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "सीने में दर्द और सांस लेने में कठिनाई",
+        "dil ka daura",
+        "ఛాతిలో నొప్పి, నడుస్తున్నప్పుడు",
+        "chest pain while walking",
+    ],
+)
+def test_seeding_keeps_multilingual_detection(text, monkeypatch, tmp_path):
+    monkeypatch.setattr(emergency_message, "_index", SignalIndex())
+    monkeypatch.setattr(signals, "WORKER_STATUS_DIR", str(tmp_path))
+    cache = SignalCache(LocalSignalSource(None))
+    cache.add_listener(signals._install_snapshot)
+    monkeypatch.setattr(signals, "signal_cache", cache)
+    set_repository(SQLiteStore(":memory:"))
+    app = FastAPI()
+    app.include_router(signal_routes.router, prefix="/api/signals")
+
+    before = assess_emergency(text)
+    assert before["risk"] > 0
+    response = TestClient(app).post("/api/signals/init")
+    assert response.status_code == 200 and response.json()["version"] == 1
+
+    assert emergency_message.get_signal_index().version == 1
+    after = assess_emergency(text)
+    assert (after["risk"], after["reasons"]) == (before["risk"], before["reasons"])
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import symptoms
+from utils import emergency_message
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(symptoms.router, prefix="/api/health")
+    return TestClient(app)
+
+
+def test_assess_stream_survives_bad_messages(client):
+    with client.websocket_connect("/api/health/assess/stream") as ws:
+        ws.send_text("chest pain")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json(["chest pain"])
+        assert ws.receive_json()["type"] == "error"
+
+        ws.send_json({"text": "heavy bleeding"})
+        report = ws.receive_json()
+        assert report["type"] == "emergency" and report["isEmergency"]
+        ws.send_json({"chunk": " from the arm"})
+        assert ws.receive_json()["type"] == "assessment"
+
+
+def test_assess_stream_rejects_binary_frames(client):
+    with client.websocket_connect("/api/health/assess/stream") as ws:
+        ws.send_bytes(b'{"text": "heavy bleeding"}')
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"text": "heavy bleeding"})
+        assert ws.receive_json()["type"] == "emergency"
+
+
+def test_assess_stream_caps_the_transcript(client, monkeypatch):
+    monkeypatch.setattr(symptoms, "ASSESS_STREAM_MAX_CHARS", 20)
+    with client.websocket_connect("/api/health/assess/stream") as ws:
+        ws.send_json({"chunk": "my chest "})
+        assert ws.receive_json()["type"] == "assessment"
+        ws.send_json({"chunk": "hurts a great deal"})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"text": "x" * 21})
+        assert ws.receive_json()["type"] == "error"
+
+        # The rejected chunk was not kept; a reset starts a fresh transcript
+        ws.send_json({"chunk": "pain"})
+        assert ws.receive_json()["type"] == "assessment"
+        ws.send_json({"reset": True, "chunk": "heavy bleeding"})
+        assert ws.receive_json()["type"] == "emergency"
+
+
+def test_assess_batch_keeps_input_order(client, monkeypatch):
+    # Several chunks, on threads instead of the spawned process pool
+    monkeypatch.setattr(emergency_message, "ASSESS_CHUNK_SIZE", 2)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        monkeypatch.setattr(emergency_message, "get_assess_pool", lambda: pool)
+        texts = ["heavy bleeding", "mild headache", "", "stroke", "slight cough", "sudden heavy bleeding", "ok"]
+        response = client.post("/api/health/assess/batch", json={"texts": texts})
+
+    body = response.json()
+    assert response.status_code == 200 and body["count"] == len(texts)
+    expected = [emergency_message.assess_emergency(text)["isEmergency"] for text in texts]
+    assert [r["isEmergency"] for r in body["results"]] == expected == [True, False, False, True, False, True, False]
+    assert all("elapsedMs" in r for r in body["results"])
+
+
+def test_assess_batch_cap(client, monkeypatch):
+    monkeypatch.setattr(symptoms, "ASSESS_BATCH_MAX", 3)
+    assert client.post("/api/health/assess/batch", json={"texts": ["a"] * 4}).status_code == 413
+    response = client.post("/api/health/assess/batch", json={"texts": ["a", "stroke", "b"]})
+    assert [r["isEmergency"] for r in response.json()["results"]] == [False, True, False]
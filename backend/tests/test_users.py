@@ -0,0 +1,59 @@
+import pytest
+
+from database.emails import EmailAlreadyRegistered
+from database.sqlite_store import SQLiteStore
+
+
+@pytest.fixture
+def store():
+    return SQLiteStore(":memory:")
+
+
+def _index(store):
+    return dict(store._conn.execute("SELECT email, userId FROM user_emails").fetchall())
+
+
+def test_email_is_unique_and_normalized(store):
+    store.create_user({"id": "u1", "email": "Ada@Example.com"})
+    assert store.find_user_by_email(" ada@example.COM ")["id"] == "u1"
+    with pytest.raises(EmailAlreadyRegistered):
+        store.create_user({"id": "u2", "email": "ada@example.com"})
+
+
+def test_recreating_a_user_replaces_its_entry(store):
+    store.create_user({"id": "u1", "email": "a@x.com"})
+    store.create_user({"id": "u1", "email": "b@x.com"})
+    assert _index(store) == {"b@x.com": "u1"}
+    store.create_user({"id": "u1"})
+    assert _index(store) == {}
+
+
+def test_update_moves_the_entry(store):
+    store.create_user({"id": "u1", "email": "a@x.com"})
+    store.create_user({"id": "u2", "email": "b@x.com"})
+    with pytest.raises(EmailAlreadyRegistered):
+        store.update_user("u1", {"email": "B@x.com"})
+    store.update_user("u1", {"email": "c@x.com"})
+    assert _index(store) == {"b@x.com": "u2", "c@x.com": "u1"}
+    assert store.find_user_by_email("a@x.com") is None
+
+
+def test_stale_entry_is_taken_over(store):
+    store.create_user({"id": "u1", "email": "a@x.com"})
+    # The user document changed email behind the index's back
+    store._conn.execute("UPDATE users SET email = 'z@x.com' WHERE id = 'u1'")
+    store.create_user({"id": "u2", "email": "a@x.com"})
+    assert _index(store)["a@x.com"] == "u2"
+
+
+def test_rebuild_indexes_missing_users_without_overwriting(store):
+    store._conn.executescript(
+        "INSERT INTO users (id, email, role, data) VALUES "
+        "('old1', 'Old@x.com', 'patient', '{\"id\": \"old1\", \"email\": \"Old@x.com\"}'),"
+        "('old2', 'old@x.com', 'patient', '{\"id\": \"old2\", \"email\": \"old@x.com\"}');"
+    )
+    store.create_user({"id": "u1", "email": "a@x.com"})
+    indexed, conflicts = store.rebuild_email_index()
+    assert indexed == 1 and conflicts == [("old@x.com", "old2")]
+    assert _index(store) == {"a@x.com": "u1", "old@x.com": "old1"}
+    assert store.rebuild_email_index() == (0, [("old@x.com", "old2")])
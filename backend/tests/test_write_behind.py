@@ -0,0 +1,91 @@
+import pytest
+
+from database.sqlite_store import SQLiteStore
+from database.storage import set_repository
+from utils import write_behind as wb
+
+
+class FlakyStore(SQLiteStore):
+    """SQLite store whose batch writes fail while ``down`` or when they include a bad document."""
+
+    def __init__(self):
+        super().__init__(":memory:")
+        self.down = False
+        self.calls = 0
+
+    def write_records(self, writes):
+        self.calls += 1
+        if self.down or any(data.get("bad") for _, _, data in writes):
+            raise RuntimeError("write rejected")
+        super().write_records(writes)
+
+    def add_record(self, collection, data, record_id=None):
+        if self.down:
+            raise RuntimeError("write rejected")
+        return super().add_record(collection, data, record_id)
+
+
+@pytest.fixture
+def store():
+    return FlakyStore()
+
+
+@pytest.fixture
+def dead_letter(tmp_path):
+    return wb.DeadLetterFile(str(tmp_path / "dead.jsonl"))
+
+
+def _queue(store, dead_letter, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    return wb.WriteBehindQueue(store, flush_interval=0.01, dead_letter=dead_letter, **kwargs)
+
+
+def test_batch_commits(store, dead_letter):
+    queue = _queue(store, dead_letter)
+    ids = [queue.enqueue("symptoms", {"userId": "p1", "n": i}) for i in range(10)]
+    assert queue.close(5)
+    assert len(store.find_records("symptoms", "p1")) == 10
+    assert len(set(ids)) == 10
+    assert queue.stats["written"] == 10
+    assert dead_letter.take() == []
+
+
+def test_bad_document_is_isolated_and_dead_lettered(store, dead_letter):
+    queue = _queue(store, dead_letter, max_retries=1)
+    for i in range(5):
+        queue.enqueue("symptoms", {"userId": "p1", "n": i, "bad": i == 2})
+    assert queue.close(5)
+    assert sorted(r["n"] for r in store.find_records("symptoms", "p1")) == [0, 1, 3, 4]
+    entries = dead_letter.take()
+    assert [e["data"]["n"] for e in entries] == [2]
+    assert entries[0]["collection"] == "symptoms" and entries[0]["error"] == "write rejected"
+    assert queue.stats["dead_lettered"] == 1 and queue.pending == 0
+
+
+def test_outage_dead_letters_then_replays(store, dead_letter):
+    store.down = True
+    queue = _queue(store, dead_letter, max_retries=2)
+    queue.enqueue("emergency", {"userId": "p1"})
+    assert queue.close(5)
+    assert not queue.healthy
+    assert store.find_records("emergency", "p1") == []
+
+    store.down = False
+    assert wb.replay_dead_letters(store, dead_letter) == (1, 0)
+    assert len(store.find_records("emergency", "p1")) == 1
+    assert dead_letter.take() == []
+
+
+def test_priority_writes_bypass_failing_queue(store, dead_letter, monkeypatch):
+    queue = _queue(store, dead_letter)
+    monkeypatch.setattr(wb, "_queue", queue)
+    set_repository(store)
+    queue.healthy = False
+    wb.write_behind("emergency", {"userId": "p1"}, priority=True)
+    assert queue.stats["enqueued"] == 0
+    assert store.find_records("emergency", "p1") == [{"userId": "p1"}]
+
+    store.down = True
+    with pytest.raises(RuntimeError):
+        wb.write_behind("emergency", {"userId": "p2"}, priority=True)
+    assert [e["data"] for e in dead_letter.take()] == [{"userId": "p2"}]
@@ -0,0 +1,381 @@
+"""
+Firebase ID-token verification with local caches.
+
+Tokens are RS256 JWTs signed by one of Google's rotating securetoken keys.
+Instead of a network round trip (verify_id_token) plus a users query per
+request, this module keeps:
+
+    - the signing certificates, refetched when their Cache-Control max-age
+      runs out (or early, at most once a minute, for an unknown key id)
+    - a bounded LRU of decoded claims, each entry valid until the token's exp
+    - a short-TTL cache of the resolved user profile, keyed by uid
+
+Routes use the ``get_token_claims`` / ``get_current_user`` dependencies.
+For tests and offline runs, install a verifier built on a StaticKeySet of
+local PEM certificates (or public keys) with ``set_verifier``.
+
+Tunables (env):
+    FIREBASE_PROJECT_ID      audience/issuer to accept (defaults to the
+                             Firebase Admin app's project)
+    AUTH_TOKEN_CACHE_SIZE    decoded tokens kept (default 4096)
+    AUTH_PROFILE_TTL         seconds a resolved profile is reused (default 60)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Header, HTTPException, Query
+
+try:
+    import jwt  # type: ignore
+    from cryptography.x509 import load_pem_x509_certificate  # type: ignore
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key  # type: ignore
+except Exception:
+    jwt = None
+
+from database.executor import run_blocking
+from database.users import find_user_by_email, find_user_by_id
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+AUTH_PROFILE_TTL = float(os.getenv("AUTH_PROFILE_TTL", "60"))
+
+# Used when the certificate response carries no usable max-age
+DEFAULT_CERT_TTL = 300.0
+# Minimum gap between refetches triggered by an unknown key id
+UNKNOWN_KID_REFETCH = 60.0
+# Retry delay after a failed refetch while older keys are still usable
+CERT_RETRY_INTERVAL = 30.0
+# Allowed clock difference when checking iat/exp
+CLOCK_SKEW = 10
+# Unknown users are remembered briefly so a fresh signup is seen quickly
+# by workers that did not handle it
+PROFILE_MISS_TTL = 5.0
+
+
+class InvalidTokenError(Exception):
+    """The token is malformed, expired, or not signed for this project."""
+
+
+def _project_id() -> Optional[str]:
+    project = os.getenv("FIREBASE_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
+    if project:
+        return project
+    try:
+        import firebase_admin  # type: ignore
+        return firebase_admin.get_app().project_id
+    except Exception:
+        return None
+
+
+def _max_age(headers) -> Optional[float]:
+    """Seconds the response may be reused per Cache-Control (minus Age), or None."""
+    cache_control = headers.get("Cache-Control") or ""
+    if re.search(r"\b(no-store|no-cache)\b", cache_control):
+        return 0.0
+    match = re.search(r"\bmax-age=(\d+)", cache_control)
+    if not match:
+        return None
+    try:
+        age = float(headers.get("Age") or 0)
+    except ValueError:
+        age = 0.0
+    return max(0.0, float(match.group(1)) - age)
+
+
+def _load_key(pem: str):
+    if "BEGIN CERTIFICATE" in pem:
+        return load_pem_x509_certificate(pem.encode()).public_key()
+    return load_pem_public_key(pem.encode())
+
+
+class StaticKeySet:
+    """Fixed kid -> PEM certificate/public key map (tests, offline runs)."""
+
+    def __init__(self, keys: Dict[str, str]):
+        self._keys = {kid: _load_key(pem) for kid, pem in keys.items()}
+
+    def get(self, kid: str):
+        return self._keys.get(kid)
+
+
+class GoogleCertKeySet:
+    """Google's signing certificates, cached for as long as the response allows."""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+        self.fetches = 0
+        self._keys: Dict[str, object] = {}
+        self._expires = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self) -> Tuple[Dict[str, str], Optional[float]]:
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8")), _max_age(response.headers)
+
+    def _refresh(self, now: float) -> None:
+        certs, max_age = self._fetch()
+        self.fetches += 1
+        self._keys = {kid: _load_key(pem) for kid, pem in certs.items()}
+        self._last_fetch = now
+        self._expires = now + (DEFAULT_CERT_TTL if max_age is None else max_age)
+
+    def get(self, kid: str):
+        with self._lock:
+            now = time.monotonic()
+            stale = now >= self._expires
+            # Keys rotate; a new kid can appear before our copy expires
+            unknown = kid not in self._keys and now - self._last_fetch >= UNKNOWN_KID_REFETCH
+            if stale or unknown:
+                try:
+                    self._refresh(now)
+                except Exception:
+                    if not self._keys:
+                        raise
+                    # Keep verifying with the keys we have and retry shortly
+                    self._last_fetch = now
+                    self._expires = now + CERT_RETRY_INTERVAL
+            return self._keys.get(kid)
+
+
+class TokenVerifier:
+    """Verifies Firebase ID tokens and memoizes the decoded claims until exp."""
+
+    def __init__(self, key_set, project_id: str, maxsize: int = AUTH_TOKEN_CACHE_SIZE):
+        self.key_set = key_set
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, object]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+    def cached(self, token: str) -> Optional[Dict[str, object]]:
+        """Claims for a token verified earlier and not yet expired, else None."""
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def verify(self, token: str) -> Dict[str, object]:
+        """Decoded claims (with ``uid``) for a valid token; raises InvalidTokenError."""
+        claims = self.cached(token)
+        return claims if claims is not None else self.decode(token)
+
+    def decode(self, token: str) -> Dict[str, object]:
+        """Check the signature and claims without consulting the cache, then cache them."""
+        if jwt is None:
+            raise InvalidTokenError("PyJWT is not installed")
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e))
+        if header.get("alg") != "RS256" or not header.get("kid"):
+            raise InvalidTokenError("Unexpected token header")
+        key = self.key_set.get(header["kid"])
+        if key is None:
+            raise InvalidTokenError("Unknown signing key")
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=self.issuer,
+                leeway=CLOCK_SKEW,
+                options={"require": ["exp", "iat", "sub"]},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e))
+        if not isinstance(claims.get("sub"), str) or not 0 < len(claims["sub"]) <= 128:
+            raise InvalidTokenError("Invalid subject")
+        claims["uid"] = claims["sub"]
+        self._remember(token, claims)
+        return dict(claims)
+
+    def _remember(self, token: str, claims: Dict[str, object]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[self.key(token)] = (float(claims["exp"]), claims)
+            self._entries.move_to_end(self.key(token))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class ProfileCache:
+    """User profiles by Firebase uid for a short TTL (misses for PROFILE_MISS_TTL at most).
+
+    Signup stores users under their uid. ``email`` is a fallback for
+    profiles created before that and must only be passed when the token
+    says it is verified.
+    """
+
+    def __init__(self, ttl: float = AUTH_PROFILE_TTL, maxsize: int = AUTH_TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Dict[str, object]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, uid: str, email: Optional[str] = None) -> Optional[Dict[str, object]]:
+        key = uid
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return dict(entry[1]) if entry[1] else None
+        user = await find_user_by_id(uid)
+        if not user and email:
+            user = await find_user_by_email(email)
+        if user:
+            user = {k: v for k, v in user.items() if k != "password"}
+        if self.ttl > 0:
+            with self._lock:
+                ttl = self.ttl if user else min(self.ttl, PROFILE_MISS_TTL)
+                self._entries[key] = (time.monotonic() + ttl, user)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return dict(user) if user else None
+
+    def invalidate(self, uid: str) -> None:
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_verifier: Optional[TokenVerifier] = None
+_verifier_lock = threading.Lock()
+profile_cache = ProfileCache()
+
+
+def get_verifier() -> Optional[TokenVerifier]:
+    """Shared verifier, or None when PyJWT or the project id is unavailable."""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None and jwt is not None:
+            project = _project_id()
+            if project:
+                _verifier = TokenVerifier(GoogleCertKeySet(), project)
+        return _verifier
+
+
+def set_verifier(verifier: Optional[TokenVerifier]) -> None:
+    """Swap the shared verifier (e.g. one over a StaticKeySet); clears the profile cache."""
+    global _verifier
+    with _verifier_lock:
+        _verifier = verifier
+    profile_cache.clear()
+
+
+async def verify_token(token: str) -> Dict[str, object]:
+    """Claims for ``token``; cache hits stay on the event loop, misses go to the executor."""
+    verifier = get_verifier()
+    if verifier is None:
+        raise InvalidTokenError("Token verification is not configured")
+    claims = verifier.cached(token)
+    if claims is not None:
+        return claims
+    # A miss may have to fetch Google's certificates
+    return await run_blocking(verifier.decode, token)
+
+
+async def resolve_profile(claims: Dict[str, object]) -> Optional[Dict[str, object]]:
+    """Stored profile of the token's user: by uid, else by email if the token marks it verified."""
+    uid = claims.get("uid")
+    if not uid:
+        return None
+    email = claims.get("email") if claims.get("email_verified") is True else None
+    return await profile_cache.get(uid, email)
+
+
+def _bearer(authorization: Optional[str]) -> str:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise HTTPException(
+            status_code=401,
+            detail="Missing bearer token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token.strip()
+
+
+async def get_token_claims(authorization: Optional[str] = Header(None)) -> Dict[str, object]:
+    """Dependency: verified claims of the request's ``Authorization: Bearer`` token."""
+    token = _bearer(authorization)
+    try:
+        return await verify_token(token)
+    except InvalidTokenError:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired Firebase ID token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except Exception:
+        # Signing certificates could not be fetched
+        raise HTTPException(status_code=503, detail="Token verification unavailable")
+
+
+async def get_current_user(authorization: Optional[str] = Header(None)) -> Dict[str, object]:
+    """Dependency: the caller's profile, or a minimal one built from the token."""
+    claims = await get_token_claims(authorization)
+    user = await resolve_profile(claims)
+    if user:
+        return user
+    return {
+        "id": claims["uid"],
+        "name": claims.get("name") or "",
+        "email": claims.get("email"),
+        "phone": "",
+        "role": "user",
+    }
+
+
+async def get_stream_user(
+    authorization: Optional[str] = Header(None),
+    token: Optional[str] = Query(None),
+) -> Dict[str, object]:
+    """Dependency for event streams: like get_current_user, but also accepts the
+    ID token as a ``token`` query param, since EventSource cannot set headers."""
+    if not authorization and token:
+        authorization = f"Bearer {token}"
+    return await get_current_user(authorization)
@@ -0,0 +1,241 @@
+"""
+In-process doctor and patient directories.
+
+/api/auth/doctors and /patients used to stream every user with the role,
+pull whole documents and strip passwords per request. A UserDirectory
+keeps only the public fields of each user, sorted by name and indexed by
+specialization. It is kept fresh by the storage engine's change feed (a
+Firestore snapshot listener) when one can be attached, otherwise, or once
+the listener fails, by re-reading once DIRECTORY_CACHE_TTL expires. Every
+rebuild gets a new ETag, and each page's ETag adds the query params, so
+clients holding an unchanged page are answered with 304.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from database.storage import get_repository
+
+DIRECTORY_CACHE_TTL = float(os.getenv("DIRECTORY_CACHE_TTL", "60"))
+DIRECTORY_CACHE_LISTEN = os.getenv("DIRECTORY_CACHE_LISTEN", "1") != "0"
+
+# Fields served per role; anything else on the user document stays private
+PUBLIC_FIELDS = {
+    "doctor": ("id", "name", "email", "phone", "role", "specialization"),
+    "patient": ("id", "name", "email", "phone", "role", "bloodGroup", "age"),
+}
+
+
+def _fold(value):
+    return (value or "").strip().casefold()
+
+
+def encode_cursor(key):
+    """Opaque pagination token for a (name, id) directory position."""
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """(name, id) from a cursor token; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        name, user_id = json.loads(raw)
+        return (str(name), str(user_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class RepositoryDirectorySource:
+    """Users with one role from the storage engine, watched when it has a change feed."""
+
+    def __init__(self, repository, role, fields):
+        self.repository = repository
+        self.role = role
+        self.fields = list(fields)
+
+    def load(self):
+        return self.repository.find_users_by_role(self.role, fields=self.fields)
+
+    def watch(self, callback, on_error=None):
+        # Rows are projected to the public fields on rebuild
+        return self.repository.watch_users_by_role(self.role, callback, on_error)
+
+
+class EmptyDirectorySource:
+    """No database configured: an empty directory, as before."""
+
+    def load(self):
+        return []
+
+
+class DirectorySnapshot:
+    """Immutable, name-sorted view of one directory version."""
+
+    def __init__(self, users, fields):
+        rows = []
+        for user in users:
+            if not user or not user.get("id"):
+                continue
+            row = {f: user.get(f) for f in fields if f in user}
+            rows.append(((_fold(row.get("name")), row["id"]), row))
+        rows.sort(key=lambda r: r[0])
+        self.keys = [key for key, _ in rows]
+        self.rows = [row for _, row in rows]
+
+        by_specialization = {}
+        for key, row in rows:
+            specialization = _fold(row.get("specialization"))
+            if specialization:
+                keys, entries = by_specialization.setdefault(specialization, ([], []))
+                keys.append(key)
+                entries.append(row)
+        self.by_specialization = by_specialization
+
+        digest = hashlib.blake2b(json.dumps(self.rows, sort_keys=True, default=str).encode(), digest_size=12)
+        self.etag = f'"{digest.hexdigest()}"'
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def page_etag(self, specialization=None, q=None, limit=None, cursor=None):
+        """ETag of one query's page: this snapshot's ETag plus the normalized params."""
+        params = [_fold(specialization), _fold(q), limit, cursor or None]
+        raw = json.dumps([self.etag] + params).encode()
+        return f'"{hashlib.blake2b(raw, digest_size=12).hexdigest()}"'
+
+    def query(self, specialization=None, q=None, limit=None, cursor=None):
+        """One page of users; returns {users, nextCursor, hasMore}.
+
+        ``specialization`` matches exactly (case-insensitive), ``q`` is a
+        case-insensitive name prefix, ``cursor`` is a nextCursor from an
+        earlier page. Raises ValueError for a malformed cursor.
+        """
+        if specialization:
+            keys, rows = self.by_specialization.get(_fold(specialization), ([], []))
+        else:
+            keys, rows = self.keys, self.rows
+        lo, hi = 0, len(keys)
+        prefix = _fold(q)
+        if prefix:
+            lo = bisect_left(keys, (prefix,))
+            hi = bisect_left(keys, (prefix + "\U0010ffff",))
+        if cursor:
+            lo = max(lo, bisect_right(keys, decode_cursor(cursor)))
+        end = hi if limit is None else min(hi, lo + limit)
+        has_more = end < hi
+        return {
+            "users": [dict(row) for row in rows[lo:end]],
+            "nextCursor": encode_cursor(keys[end - 1]) if has_more and end > lo else None,
+            "hasMore": has_more,
+        }
+
+
+class UserDirectory:
+    """
+    Cached directory of the users with one role.
+    Kept fresh by a snapshot listener when the source supports one,
+    otherwise by re-reading the source once the TTL expires.
+    """
+
+    def __init__(self, role, source, ttl=DIRECTORY_CACHE_TTL, listen=DIRECTORY_CACHE_LISTEN):
+        self.role = role
+        self.fields = PUBLIC_FIELDS[role]
+        self.source = source
+        self.ttl = ttl
+        self.listen = listen
+        self.loads = 0
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._unsubscribe = None
+        self._lock = threading.Lock()
+
+    def fresh(self):
+        """The current snapshot if it needs no reload, else None (never blocks on I/O)."""
+        snapshot = self._snapshot
+        if snapshot is not None and (self._unsubscribe or time.monotonic() < self._expires_at):
+            return snapshot
+        return None
+
+    def get(self):
+        """Return the current DirectorySnapshot, loading or refreshing as needed."""
+        snapshot = self.fresh()
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self.fresh() is None:
+                self._refresh()
+            return self._snapshot
+
+    def _refresh(self):
+        try:
+            users = self.source.load()
+            self.loads += 1
+        except Exception as e:
+            print(f"Warning: Could not load {self.role} directory: {e}")
+            users = None
+        if users is not None or self._snapshot is None:
+            self._snapshot = DirectorySnapshot(users or [], self.fields)
+        self._expires_at = time.monotonic() + self.ttl
+
+        if self.listen and self._unsubscribe is None and hasattr(self.source, "watch"):
+            try:
+                self._unsubscribe = self.source.watch(self._on_change, self._on_watch_error)
+                if self._unsubscribe is None:
+                    # No change feed; rely on TTL refresh
+                    self.listen = False
+            except Exception as e:
+                print(f"Warning: Could not watch {self.role} directory, using TTL refresh: {e}")
+                self.listen = False
+
+    def _on_change(self, users):
+        snapshot = DirectorySnapshot(users, self.fields)
+        with self._lock:
+            self._snapshot = snapshot
+
+    def _on_watch_error(self, error):
+        """The listener failed: detach it and fall back to TTL refresh."""
+        print(f"Warning: {self.role} directory listener failed, using TTL refresh: {error}")
+        unsubscribe, self._unsubscribe = self._unsubscribe, None
+        self.listen = False
+        self._expires_at = 0.0
+        if unsubscribe is not None:
+            # Not from the listener's own thread, which may be the caller
+            threading.Thread(target=unsubscribe, daemon=True).start()
+
+    def invalidate(self):
+        """Re-read the source on the next get() (after a local write).
+
+        With a listener attached this is a no-op; the change arrives there.
+        """
+        self._expires_at = 0.0
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "role": self.role,
+            "size": len(snapshot) if snapshot else 0,
+            "etag": snapshot.etag if snapshot else None,
+            "loads": self.loads,
+            "listening": self._unsubscribe is not None,
+        }
+
+
+def _default_source(role):
+    repo = get_repository()
+    return RepositoryDirectorySource(repo, role, PUBLIC_FIELDS[role]) if repo is not None else EmptyDirectorySource()
+
+
+directories = {role: UserDirectory(role, _default_source(role)) for role in PUBLIC_FIELDS}
+
+
+def invalidate_directory(role):
+    directory = directories.get(role)
+    if directory is not None:
+        directory.invalidate()
@@ -11,37 +11,80 @@ Usage:
     if result["isEmergency"]:
         print(result["message"])  # Localized guidance
 
+    # Repeat submissions are served from assessment_cache (see .stats())
+
+    # Score a backlog of texts across the process pool, in input order
+    results = assess_emergency_many(["...", "..."])
+
     # Optionally persist a record in Firestore
     log_emergency_message(user_id="abc123", input_text="...", assessment=result)
 """
 
-from typing import Dict, List, Optional
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.storage import get_repository
+
+from utils.fuzzy_index import FuzzyIndex
+from utils.signal_matcher import SignalMatcher
+
+
+def _normalize_char(ch: str) -> Optional[str]:
+    """Lower-case letters, digits and combining marks; drop zero-width
+    joiners; turn everything else (whitespace, punctuation, symbols) into
+    a space."""
+    category = unicodedata.category(ch)
+    if ch.isalnum() or category[0] == "M":
+        return ch.lower()
+    if category == "Cf":
+        return None
+    return " "
+
+
+class _AstralTable(dict):
+    """Lazy ``str.translate`` table for code points beyond the BMP (emoji etc.)."""
+
+    def __missing__(self, code: int) -> Optional[str]:
+        value = self[code] = _normalize_char(chr(code))
+        return value
+
+
+# Precomputed for the whole BMP: a list lookup per character is the fastest
+# mapping str.translate supports. Astral characters fall back to _AstralTable.
+_NORMALIZE_TABLE: List[Optional[str]] = [_normalize_char(chr(code)) for code in range(0x10000)]
+_ASTRAL_TABLE = _AstralTable()
+_ASTRAL_RE = re.compile("[\U00010000-\U0010FFFF]")
+
+# Only short inputs are memoized so the cache stays small in bytes, not just entries
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "4096"))
+NORMALIZE_CACHE_MAX_LEN = 512
+
 
-try:
-    from firebase_admin import firestore  # type: ignore
-    _db = firestore.client()
-except Exception:
-    _db = None
+def _normalize_text(text: str) -> str:
+    # NFC first so precomposed and decomposed Devanagari/Telugu sequences compare equal
+    text = unicodedata.normalize("NFC", text)
+    table = _NORMALIZE_TABLE if text.isascii() or not _ASTRAL_RE.search(text) else _ASTRAL_TABLE
+    return " ".join(text.translate(table).split())
+
+
+_normalize_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize_text)
 
 
 def _normalize(text: str) -> str:
     if not text:
         return ""
-    lower = text.lower()
-    # Basic Unicode-safe cleanup: keep letters/numbers/spaces
-    cleaned = []
-    for ch in lower:
-        # Keep common whitespace
-        if ch.isspace():
-            cleaned.append(" ")
-            continue
-        # Keep alnum; for other unicode letters, rely on .isalpha()
-        if ch.isalnum() or ch.isalpha():
-            cleaned.append(ch)
-            continue
-        # Replace punctuation with space
-        cleaned.append(" ")
-    return " ".join("".join(cleaned).split())
+    if len(text) <= NORMALIZE_CACHE_MAX_LEN:
+        return _normalize_cached(text)
+    return _normalize_text(text)
 
 
 # Emergency messages in English, Hindi, Telugu
@@ -80,6 +123,11 @@ SYMPTOM_SIGNALS: Dict[str, List[str]] = {
         "ఛాతిలో నొప్పి",
         "గుండె నొప్పి",
         "హృదయాఘాతం",
+        # Common romanized spellings; fuzzy mode absorbs the variants
+        "seene mein dard",
+        "dil ka daura",
+        "chathi lo noppi",
+        "gunde noppi",
     ],
     "neurological": [
         "slurred speech",
@@ -92,6 +140,8 @@ SYMPTOM_SIGNALS: Dict[str, List[str]] = {
         "మాట తడబడటం",
         "పక్షవాతం",
         "ఫిట్స్",
+        "lakwa",
+        "pakshavatham",
     ],
     "respiratory": [
         "shortness of breath",
@@ -101,6 +151,9 @@ SYMPTOM_SIGNALS: Dict[str, List[str]] = {
         "सांस नहीं आ रही",
         "శ్వాస తీసుకోవడంలో ఇబ్బంది",
         "ఊపిరి రావడం లేదు",
+        "saans lene mein takleef",
+        "saans nahi aa rahi",
+        "oopiri raavadam ledu",
     ],
     "bleeding": [
         "heavy bleeding",
@@ -128,65 +181,222 @@ CONTEXT_SIGNALS: Dict[str, List[str]] = {
 }
 
 
-def _detect_language(text: str) -> str:
-    """Very lightweight language hint based on matched signals."""
-    # If any Hindi script matches
-    if any(token in text for token in ("अ", "आ", "इ", "ई", "उ", "ऊ", "ए", "ऐ", "ओ", "औ", "क", "ख", "ग")):
-        return "hi"
-    # If any Telugu script matches
-    if any(token in text for token in ("అ", "ఆ", "ఇ", "ఈ", "ఉ", "ఊ", "ఎ", "ఏ", "ఐ", "ఒ", "ఓ", "ఔ", "క", "ఖ", "గ")):
-        return "te"
-    return "en"
-
-
-def _calculate_risk(text: str) -> Dict[str, object]:
-    score = 0
-    categories: List[str] = []
-
-    for category, signals in SYMPTOM_SIGNALS.items():
-        if any(_normalize(s) in text for s in signals):
-            categories.append(category)
-            if category == "cardiac":
-                score += 60
-            elif category == "neurological":
-                score += 70
-            elif category == "bleeding":
-                score += 80
-            elif category == "respiratory":
-                score += 70
-            else:
-                score += 40
-
-    detected_lang = _detect_language(text)
-    return {"score": score, "categories": categories, "detectedLang": detected_lang}
+# Risk weight per symptom category; anything unlisted scores DEFAULT_CATEGORY_WEIGHT
+CATEGORY_WEIGHTS: Dict[str, int] = {
+    "cardiac": 60,
+    "neurological": 70,
+    "bleeding": 80,
+    "respiratory": 70,
+}
+DEFAULT_CATEGORY_WEIGHT = 40
 
+# Unicode blocks used for the language hint; earlier entries win ties
+SCRIPT_RANGES: List[Tuple[str, int, int]] = [
+    ("hi", 0x0900, 0x097F),  # Devanagari
+    ("te", 0x0C00, 0x0C7F),  # Telugu
+    ("en", 0x0041, 0x005A),  # Basic Latin upper
+    ("en", 0x0061, 0x007A),  # Basic Latin lower
+    ("en", 0x00C0, 0x024F),  # Latin-1 Supplement / Extended-A/B letters
+]
 
-def _detect_context(text: str) -> List[str]:
-    ctx: List[str] = []
-    for name, tokens in CONTEXT_SIGNALS.items():
-        if any(_normalize(t) in text for t in tokens):
-            ctx.append(name)
-    return ctx
 
+def _build_script_table(script_ranges: List[Tuple[str, int, int]]) -> Tuple[List[Optional[str]], Dict[str, str]]:
+    """``str.translate`` table mapping each code point in a script range to a
+    one-character tag for its language and everything else to nothing, so
+    per-script counts take one C-level pass plus ``str.count``."""
+    tags: Dict[str, str] = {}
+    for lang, _lo, _hi in script_ranges:
+        tags.setdefault(lang, chr(0x30 + len(tags)))
+    # Code points past the table raise IndexError and are left untouched;
+    # they can never equal a tag, so they do not affect the counts
+    table: List[Optional[str]] = [None] * (max(hi for _lang, _lo, hi in script_ranges) + 1)
+    for lang, lo, hi in script_ranges:
+        for code in range(lo, hi + 1):
+            table[code] = tags[lang]
+    return table, tags
 
-def assess_emergency(input_text: Optional[str], threshold: int = 70) -> Dict[str, object]:
-    """Assess input free-text for emergency signals and produce a report.
 
-    Returns a dict with keys: isEmergency, risk, reasons, message.
+class SignalIndex:
+    """Normalized, precompiled view of the symptom/context signal tables.
+
+    Never modified once built. ``rebuild()`` returns a new index for changed
+    definitions, which ``set_signal_index()`` swaps in with one assignment,
+    so concurrent assessments see either the old or the new index, never a
+    mix of the two.
     """
-    text = _normalize(input_text or "")
-    risk_data = _calculate_risk(text)
-    ctx = _detect_context(text)
 
-    is_emergency = int(risk_data["score"]) >= threshold
+    def __init__(
+        self,
+        symptom_signals: Optional[Dict[str, List[str]]] = None,
+        context_signals: Optional[Dict[str, List[str]]] = None,
+        weights: Optional[Dict[str, int]] = None,
+        script_ranges: Optional[List[Tuple[str, int, int]]] = None,
+        version: int = 0,
+    ):
+        # Signal definitions version this index was built from (0 = built-in constants)
+        self.version = version
+        self.symptom_signals = symptom_signals if symptom_signals is not None else SYMPTOM_SIGNALS
+        self.context_signals = context_signals if context_signals is not None else CONTEXT_SIGNALS
+        self.weights = weights if weights is not None else CATEGORY_WEIGHTS
+        self.script_ranges = script_ranges if script_ranges is not None else SCRIPT_RANGES
+        self.script_table, self.script_tags = _build_script_table(self.script_ranges)
+        self._compile()
+
+    def rebuild(
+        self,
+        symptom_signals: Optional[Dict[str, List[str]]] = None,
+        context_signals: Optional[Dict[str, List[str]]] = None,
+        version: Optional[int] = None,
+    ) -> "SignalIndex":
+        """A new index, recompiled from new definitions where given; this one is left as is."""
+        return SignalIndex(
+            symptom_signals if symptom_signals is not None else self.symptom_signals,
+            context_signals if context_signals is not None else self.context_signals,
+            self.weights,
+            self.script_ranges,
+            version=self.version if version is None else version,
+        )
+
+    def _compile(self) -> None:
+        phrases: Dict[str, List[str]] = {}
+        patterns = []
+        for kind, table in (("symptom", self.symptom_signals), ("context", self.context_signals)):
+            for order, (category, signals) in enumerate(table.items()):
+                weight = self.weights.get(category, DEFAULT_CATEGORY_WEIGHT) if kind == "symptom" else 0
+                payload = {"kind": kind, "category": category, "weight": weight, "order": order}
+                normalized = phrases.setdefault(f"{kind}:{category}", [])
+                for signal in signals:
+                    phrase = _normalize(signal)
+                    normalized.append(phrase)
+                    patterns.append((phrase, payload))
+
+        self.phrases = phrases
+        self.fuzzy = FuzzyIndex(patterns)
+        self.matcher = SignalMatcher(patterns)
+
+    def scan(self, text: str) -> Tuple[List[str], List[str], int]:
+        """Match normalized ``text`` in one pass.
+
+        Returns (symptom categories, context categories, risk score), with
+        categories in definition order.
+        """
+        matcher = self.matcher
+        payloads = matcher.payloads
+        return _summarize(payloads[idx] for _start, _end, idx in matcher.iter_matches(text))
+
+    def scan_fuzzy(self, text: str) -> Tuple[List[str], List[str], int, List[Dict[str, object]]]:
+        """Like ``scan`` but also accepts near-misses within each phrase's edit budget.
+
+        The fourth element lists the approximate (non-exact) candidates with
+        their scores.
+        """
+        matcher = self.matcher
+        payloads = matcher.payloads
+        found = [payloads[idx] for _start, _end, idx in matcher.iter_matches(text)]
+        candidates = [m for m in self.fuzzy.search(text) if m["distance"]]
+        categories, context, score = _summarize(found + candidates)
+        return categories, context, score, candidates
+
+
+def _summarize(payloads: Iterable[Dict[str, object]]) -> Tuple[List[str], List[str], int]:
+    """Reduce matched payloads to ordered categories and the summed risk score."""
+    symptoms: Dict[str, Dict[str, object]] = {}
+    contexts: Dict[str, Dict[str, object]] = {}
+    for payload in payloads:
+        found = symptoms if payload["kind"] == "symptom" else contexts
+        found.setdefault(payload["category"], payload)
+
+    categories = sorted(symptoms, key=lambda c: symptoms[c]["order"])
+    context = sorted(contexts, key=lambda c: contexts[c]["order"])
+    score = sum(int(p["weight"]) for p in symptoms.values())
+    return categories, context, score
+
+
+_index = SignalIndex()
+
+
+def get_signal_index() -> SignalIndex:
+    return _index
+
+
+def set_signal_index(index: SignalIndex) -> None:
+    """Swap in a new index; in-flight assessments keep the one they started with."""
+    global _index
+    _index = index
+    # Cached reports were scored against the old phrases
+    assessment_cache.clear()
+
+
+def _phrase_table(table: Optional[Dict[str, list]]) -> Dict[str, List[str]]:
+    """Category -> phrase texts of a stored table; entries may be strings or {"text": ...}."""
+    phrases: Dict[str, List[str]] = {}
+    for category, entries in (table or {}).items():
+        target = phrases.setdefault(category, [])
+        for phrase in entries or []:
+            text = str(phrase.get("text", "")) if isinstance(phrase, dict) else str(phrase)
+            if text and text not in target:
+                target.append(text)
+    return phrases
+
+
+def build_signal_index(signals: Dict[str, object], version: int = 0) -> SignalIndex:
+    """Index for a published config/signals document. The published set
+    replaces the built-in SYMPTOM_SIGNALS / CONTEXT_SIGNALS, so a phrase
+    removed from it stops matching; it must carry any multilingual phrases
+    it wants to keep."""
+    return SignalIndex(
+        _phrase_table(signals.get("symptomSignals")),  # type: ignore[arg-type]
+        _phrase_table(signals.get("contextSignals")),  # type: ignore[arg-type]
+        version=version,
+    )
+
+
+def _script_counts(text: str, index: Optional[SignalIndex] = None) -> Dict[str, int]:
+    """Letters per language script, from a single pass over the code points."""
+    index = index or _index
+    tagged = text.translate(index.script_table)
+    return {lang: tagged.count(tag) for lang, tag in index.script_tags.items()}
+
+
+def _rank_languages(counts: Dict[str, int]) -> List[str]:
+    """Languages present in ``counts``, most letters first (ties keep range order)."""
+    order = {lang: i for i, lang in enumerate(counts)}
+    return sorted((lang for lang, n in counts.items() if n), key=lambda lang: (-counts[lang], order[lang]))
+
+
+def _detect_language(text: str, index: Optional[SignalIndex] = None) -> str:
+    """Dominant language of the text by script, defaulting to English."""
+    ranked = _rank_languages(_script_counts(text, index))
+    return ranked[0] if ranked else "en"
+
+
+def _calculate_risk(text: str, index: Optional[SignalIndex] = None) -> Dict[str, object]:
+    index = index or _index
+    categories, _context, score = index.scan(text)
+    detected_lang = _detect_language(text, index)
+    return {"score": score, "categories": categories, "detectedLang": detected_lang}
+
+
+def _detect_context(text: str, index: Optional[SignalIndex] = None) -> List[str]:
+    return (index or _index).scan(text)[1]
+
+
+def _build_report(
+    categories: List[str],
+    ctx: List[str],
+    score: int,
+    languages: List[str],
+    threshold: int,
+) -> Dict[str, object]:
+    lang = languages[0] if languages else "en"
+    is_emergency = score >= threshold
 
     reasons: List[str] = []
-    for c in risk_data["categories"]:  # type: ignore
+    for c in categories:
         reasons.append(f"signal: {c}")
     for c in ctx:
         reasons.append(f"context: {c}")
 
-    lang = str(risk_data["detectedLang"]) if risk_data.get("detectedLang") else "en"
     message = (
         EMERGENCY_MESSAGES.get(lang) or EMERGENCY_MESSAGES["en"]
         if is_emergency
@@ -195,28 +405,323 @@ def assess_emergency(input_text: Optional[str], threshold: int = 70) -> Dict[str
 
     return {
         "isEmergency": is_emergency,
-        "risk": int(risk_data["score"]),
+        "risk": int(score),
         "reasons": reasons,
         "message": message,
+        "languages": languages or ["en"],
     }
 
 
+# Memoized assessments: templated intake and client retries resubmit the same text
+ASSESS_CACHE_SIZE = int(os.getenv("ASSESS_CACHE_SIZE", "4096"))
+ASSESS_CACHE_TTL = float(os.getenv("ASSESS_CACHE_TTL", "600"))
+
+
+class AssessmentCache:
+    """Bounded LRU of assessment reports with a TTL.
+
+    Keys are a digest of the normalized text plus the threshold, fuzzy
+    flag and signal version, so long messages are not held as keys and a
+    reload never serves a report scored against old phrases.
+    """
+
+    def __init__(self, maxsize: int = ASSESS_CACHE_SIZE, ttl: float = ASSESS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, Tuple[float, Dict[str, object]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, threshold: int, fuzzy: bool, version: int) -> tuple:
+        digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        return (digest, threshold, fuzzy, version)
+
+    def get(self, key: tuple) -> Optional[Dict[str, object]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy_report(entry[1])
+
+    def put(self, key: tuple, report: Dict[str, object]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, _copy_report(report))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def _copy_report(report: Dict[str, object]) -> Dict[str, object]:
+    """Copy deep enough that callers can mutate the report (add elapsedMs, pop keys)."""
+    copied = dict(report)
+    for key, value in copied.items():
+        if isinstance(value, list):
+            copied[key] = [dict(v) if isinstance(v, dict) else v for v in value]
+    return copied
+
+
+assessment_cache = AssessmentCache()
+
+
+def assess_emergency(
+    input_text: Optional[str],
+    threshold: int = 70,
+    index: Optional[SignalIndex] = None,
+    fuzzy: bool = False,
+) -> Dict[str, object]:
+    """Assess input free-text for emergency signals and produce a report.
+
+    Returns a dict with keys: isEmergency, risk, reasons, message and
+    languages (scripts present, dominant first; it picks the message). With
+    ``fuzzy``, misspelled signals within the edit budget also count and the
+    report lists them under ``fuzzyMatches``.
+
+    Reports against the shared index are memoized in ``assessment_cache``.
+    """
+    cached = index is None or index is _index
+    index = index or _index
+    text = _normalize(input_text or "")
+    if cached:
+        key = AssessmentCache.key(text, threshold, fuzzy, index.version)
+        report = assessment_cache.get(key)
+        if report is not None:
+            return report
+
+    languages = _rank_languages(_script_counts(text, index))
+    if not fuzzy:
+        categories, ctx, score = index.scan(text)
+        report = _build_report(categories, ctx, score, languages, threshold)
+    else:
+        categories, ctx, score, candidates = index.scan_fuzzy(text)
+        report = _build_report(categories, ctx, score, languages, threshold)
+        report["fuzzyMatches"] = [
+            {k: m[k] for k in ("kind", "category", "text", "start", "end", "distance", "score")}
+            for m in candidates
+        ]
+
+    if cached:
+        assessment_cache.put(key, report)
+    return report
+
+
+# Batch assessment: texts are scored in chunks on a process pool
+ASSESS_POOL_WORKERS = int(os.getenv("ASSESS_POOL_WORKERS", "0")) or (os.cpu_count() or 1)
+ASSESS_CHUNK_SIZE = int(os.getenv("ASSESS_CHUNK_SIZE", "256"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_assess_pool() -> ProcessPoolExecutor:
+    """Lazily start the shared assessment pool.
+
+    Workers are spawned rather than forked: the parent may hold gRPC
+    (Firestore) threads, which are not fork-safe.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=ASSESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_assess_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _assess_chunk(
+    texts: List[Optional[str]],
+    threshold: int,
+    fuzzy: bool = False,
+    definitions: Optional[Tuple[int, Dict[str, List[str]], Dict[str, List[str]]]] = None,
+) -> List[Dict[str, object]]:
+    """Score one chunk, recording per-item wall time. Runs inside pool workers.
+
+    ``definitions`` is (version, symptom signals, context signals) of the
+    parent's index; a pool worker still on an older version rebuilds first.
+    """
+    if definitions and definitions[0] != _index.version:
+        version, symptom_signals, context_signals = definitions
+        set_signal_index(SignalIndex(symptom_signals, context_signals, version=version))
+
+    results = []
+    for text in texts:
+        started = time.perf_counter()
+        result = assess_emergency(text, threshold, fuzzy=fuzzy)
+        result["elapsedMs"] = round((time.perf_counter() - started) * 1000, 3)
+        results.append(result)
+    return results
+
+
+def assess_emergency_many(
+    texts: List[Optional[str]],
+    threshold: int = 70,
+    chunk_size: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    fuzzy: bool = False,
+) -> List[Dict[str, object]]:
+    """Assess many texts, fanning chunks out across a process pool.
+
+    Results are returned in input order; each carries ``elapsedMs``.
+    Batches that fit in a single chunk are scored in-process, since the
+    pool round trip would cost more than the work.
+    """
+    chunk_size = max(1, chunk_size or ASSESS_CHUNK_SIZE)
+    if len(texts) <= chunk_size and executor is None:
+        return _assess_chunk(list(texts), threshold, fuzzy)
+
+    executor = executor or get_assess_pool()
+    index = _index
+    # Pool workers start from the built-in constants; ship reloaded definitions along
+    definitions = (index.version, index.symptom_signals, index.context_signals) if index.version else None
+    chunks = [list(texts[i:i + chunk_size]) for i in range(0, len(texts), chunk_size)]
+    results: List[Dict[str, object]] = []
+    for chunk_results in executor.map(
+        _assess_chunk,
+        chunks,
+        [threshold] * len(chunks),
+        [fuzzy] * len(chunks),
+        [definitions] * len(chunks),
+    ):
+        results.extend(chunk_results)
+    return results
+
+
+class StreamingAssessor:
+    """Incremental assessment of a growing transcript (e.g. live speech).
+
+    Matcher state is carried between chunks, so each character is examined
+    once and phrases split across chunk boundaries are still found. Feed
+    either appended chunks (``feed``) or the whole transcript so far
+    (``update``); a revised transcript that no longer extends the previous
+    one restarts the scan.
+    """
+
+    def __init__(self, threshold: int = 70, index: Optional[SignalIndex] = None):
+        self.threshold = threshold
+        self.index = index or _index
+        self.reset()
+
+    def reset(self) -> None:
+        self.transcript = ""
+        self.alerted = False
+        self._matcher = self.index.matcher
+        self._state = 0
+        self._offset = 0
+        self._pending_space = False
+        self._symptoms: Dict[str, Dict[str, object]] = {}
+        self._contexts: Dict[str, Dict[str, object]] = {}
+        self._scripts: Dict[str, int] = {}
+
+    def update(self, transcript: str) -> Dict[str, object]:
+        """Advance to ``transcript``, the full text recognized so far."""
+        transcript = transcript or ""
+        if not transcript.startswith(self.transcript):
+            # Recognizer revised earlier words; rescan but never re-announce
+            alerted = self.alerted
+            self.reset()
+            self.alerted = alerted
+        return self.feed(transcript[len(self.transcript):])
+
+    def feed(self, chunk: str) -> Dict[str, object]:
+        """Append ``chunk`` and return the current report.
+
+        The report carries ``newEmergency`` on the call that first crosses
+        the threshold.
+        """
+        if chunk and self._offset and unicodedata.category(chunk[0])[0] == "M":
+            # A combining mark may compose with the previous chunk under NFC; rescan
+            transcript = self.transcript + chunk
+            alerted = self.alerted
+            self.reset()
+            self.alerted = alerted
+            chunk = transcript
+
+        if chunk:
+            self.transcript += chunk
+            normalized = _normalize(chunk)
+            # _normalize trims separators, so re-insert the one at the chunk boundary
+            if normalized and self._offset and (self._pending_space or not _normalize(chunk[0])):
+                normalized = " " + normalized
+            if normalized:
+                self._pending_space = not _normalize(chunk[-1])
+                self._scan(normalized)
+            elif self._offset:
+                self._pending_space = True
+
+        report = self.report()
+        report["newEmergency"] = bool(report["isEmergency"] and not self.alerted)
+        if report["isEmergency"]:
+            self.alerted = True
+        return report
+
+    def _scan(self, text: str) -> None:
+        payloads = self._matcher.payloads
+        self._state, hits = self._matcher.advance(text, self._state, self._offset)
+        for _start, _end, idx in hits:
+            payload = payloads[idx]
+            found = self._symptoms if payload["kind"] == "symptom" else self._contexts
+            found.setdefault(payload["category"], payload)
+        self._offset += len(text)
+        for lang, count in _script_counts(text, self.index).items():
+            self._scripts[lang] = self._scripts.get(lang, 0) + count
+
+    def report(self) -> Dict[str, object]:
+        symptoms, contexts = self._symptoms, self._contexts
+        categories = sorted(symptoms, key=lambda c: symptoms[c]["order"])
+        ctx = sorted(contexts, key=lambda c: contexts[c]["order"])
+        score = sum(int(p["weight"]) for p in symptoms.values())
+        return _build_report(categories, ctx, score, _rank_languages(self._scripts), self.threshold)
+
+
 def log_emergency_message(user_id: str, input_text: str, assessment: Dict[str, object]) -> Optional[str]:
     """Persist an emergency assessment record to Firestore.
 
-    Returns the document ID if saved, else None.
+    The write goes through the write-behind queue, in the priority lane when
+    the assessment is an emergency. Returns the document ID if queued or
+    saved, else None.
     """
-    if not _db:
+    if get_repository() is None:
         return None
 
     try:
+        from utils.write_behind import write_behind
         payload = {
             "userId": user_id,
             "input": input_text,
             "assessment": assessment,
         }
-        doc_ref = _db.collection("emergency_messages").document()
-        doc_ref.set(payload)
-        return doc_ref.id
+        return write_behind("emergency_messages", payload, priority=bool(assessment.get("isEmergency")))
     except Exception:
         return None
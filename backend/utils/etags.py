@@ -0,0 +1,28 @@
+"""
+Conditional GET helpers.
+
+If-None-Match carries ``*`` or a comma-separated list of entity tags,
+each optionally weak (``W/"..."``). GET uses weak comparison (RFC 9110
+13.1.2), so ``W/"abc"`` matches ``"abc"``.
+"""
+
+import re
+from typing import Optional
+
+_TAG = re.compile(r'\s*(?:W/)?("[^"]*")\s*(?:,|$)')
+
+
+def parse_etags(header: Optional[str]):
+    """Opaque tags (with quotes, without W/) listed in an If-None-Match value; ["*"] for any."""
+    header = (header or "").strip()
+    if header == "*":
+        return ["*"]
+    return [m.group(1) for m in _TAG.finditer(header)]
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """True when the request's If-None-Match matches ``etag`` (answer 304)."""
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    tags = parse_etags(header)
+    return "*" in tags or etag in tags
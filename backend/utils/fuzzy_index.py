@@ -0,0 +1,171 @@
+"""
+Fuzzy index - typo-tolerant signal matching
+
+A character n-gram index over normalized signal phrases finds candidate
+alignments in the input; each candidate window is then verified with a
+bounded edit distance (Myers' bit-parallel algorithm), so the cost stays
+proportional to the input length and the number of plausible hits, not to
+the number of phrases.
+
+Usage:
+    from utils.fuzzy_index import FuzzyIndex
+
+    index = FuzzyIndex([("chest pain", {"category": "cardiac"})])
+    index.search("severe chest pian since morning")
+    # [{"category": "cardiac", "text": "chest pain", "distance": 2, "score": 0.8, ...}]
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Default edit budget by phrase length: short phrases must match exactly
+EDIT_BUDGETS: List[Tuple[int, int]] = [(7, 0), (10, 1)]
+MAX_EDITS = 2
+
+
+def edit_budget(length: int, max_edits: int = MAX_EDITS) -> int:
+    """Edits allowed for a phrase of ``length`` characters."""
+    for limit, edits in EDIT_BUDGETS:
+        if length < limit:
+            return min(edits, max_edits)
+    return max_edits
+
+
+def _best_alignment(pattern: str, text: str, max_edits: int) -> Optional[Tuple[int, int]]:
+    """Lowest edit distance of ``pattern`` against any substring of ``text``.
+
+    Myers (1999) bit-vector search. Returns (distance, end offset) for the
+    best hit within ``max_edits``, or None.
+    """
+    m = len(pattern)
+    if m == 0:
+        return None
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    best: Optional[Tuple[int, int]] = None
+    for j, ch in enumerate(text):
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        # On ties keep the later end, so the span covers the whole phrase
+        if score <= max_edits and (best is None or score <= best[0]):
+            best = (score, j + 1)
+    return best
+
+
+class FuzzyIndex:
+    """N-gram index over (normalized phrase, payload) pairs.
+
+    Only phrases long enough to have an edit budget are indexed; exact
+    matching of the rest is left to the signal matcher.
+    """
+
+    def __init__(self, phrases: Iterable[Tuple[str, Dict[str, object]]], n: int = 3, max_edits: int = MAX_EDITS):
+        self.n = n
+        self.max_edits = max_edits
+        self.phrases: List[str] = []
+        self.payloads: List[Dict[str, object]] = []
+        self.budgets: List[int] = []
+        self._needed: List[int] = []
+        self._grams: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+        for phrase, payload in phrases:
+            budget = edit_budget(len(phrase), max_edits)
+            # Exact-only phrases are the automaton's job; indexing them only adds candidates
+            if not phrase or not budget:
+                continue
+            pid = len(self.phrases)
+            self.phrases.append(phrase)
+            self.payloads.append(payload)
+            self.budgets.append(budget)
+            grams = [phrase[i:i + n] for i in range(len(phrase) - n + 1)] or [phrase]
+            for pos, gram in enumerate(grams):
+                self._grams[gram].append((pid, pos))
+            # q-gram lemma: each edit destroys at most n grams of the phrase
+            self._needed.append(max(1, len(grams) - budget * n))
+        self._grams = dict(self._grams)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def search(self, text: str, max_edits: Optional[int] = None, min_score: float = 0.0) -> List[Dict[str, object]]:
+        """Approximate matches of indexed phrases in normalized ``text``.
+
+        Each result is the phrase payload plus ``text`` (the phrase),
+        ``start``/``end`` offsets of the matched span, ``distance`` and
+        ``score`` (1 - distance / phrase length). Best match per phrase,
+        sorted by score.
+        """
+        n = self.n
+        grams = self._grams
+        # Count gram hits per (phrase, alignment start) to find plausible windows
+        anchors: Dict[int, Dict[int, int]] = {}
+        totals: Dict[int, int] = defaultdict(int)
+        for i in range(max(1, len(text) - n + 1)):
+            entries = grams.get(text[i:i + n])
+            if not entries:
+                continue
+            for pid, pos in entries:
+                counts = anchors.get(pid)
+                if counts is None:
+                    counts = anchors[pid] = defaultdict(int)
+                counts[i - pos] += 1
+                totals[pid] += 1
+
+        results = []
+        for pid, counts in anchors.items():
+            phrase = self.phrases[pid]
+            budget = self.budgets[pid] if max_edits is None else min(self.budgets[pid], max_edits)
+            needed = max(1, self._needed[pid] + (self.budgets[pid] - budget) * n)
+            if totals[pid] < needed:
+                continue
+            best = None
+            covered = -1
+            for anchor in sorted(counts):
+                if anchor <= covered:
+                    continue
+                # Edits shift grams by at most ``budget`` positions from the anchor
+                hits = sum(counts.get(a, 0) for a in range(anchor - budget, anchor + budget + 1))
+                if hits < needed:
+                    continue
+                lo = max(0, anchor - budget)
+                hi = anchor + len(phrase) + budget
+                covered = anchor + budget
+                found = _best_alignment(phrase, text[lo:hi], budget)
+                if found and (best is None or found[0] < best[0]):
+                    best = (found[0], lo + found[1])
+                    if found[0] == 0:
+                        break
+            if best is None:
+                continue
+            distance, end = best
+            score = 1 - distance / len(phrase)
+            if score < min_score:
+                continue
+            match = dict(self.payloads[pid])
+            match.update({
+                "text": phrase,
+                "start": max(0, end - len(phrase)),
+                "end": end,
+                "distance": distance,
+                "score": round(score, 3),
+            })
+            results.append(match)
+
+        results.sort(key=lambda m: (-m["score"], m["start"]))
+        return results
@@ -0,0 +1,187 @@
+"""
+Pub/sub hub - push chat events to connected sessions
+
+Route handlers publish events (new messages, read receipts) to channels
+such as "patient:<id>" / "doctor:<id>"; streaming endpoints subscribe a
+queue per connection. Publishing goes through a Broker: LocalBroker
+delivers within this process, and a multi-worker deployment plugs in a
+broker that relays through shared infrastructure (Redis, Pub/Sub, ...)
+and calls ``deliver`` on every worker.
+
+Usage:
+    from utils.pubsub import hub
+
+    hub.publish("doctor:d1", {"type": "message", "data": msg})
+
+    subscription = hub.subscribe(["patient:p1"])
+    event = await subscription.get()
+    hub.unsubscribe(subscription)
+"""
+
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+# Per-connection backlog; a client that falls this far behind loses the oldest events
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Broker(ABC):
+    """Transport between publishers and the hubs of every worker.
+
+    ``start`` receives the local hub's deliver callback; ``publish`` must
+    eventually call it (in each worker) with the same channel and event.
+    """
+
+    @abstractmethod
+    def start(self, deliver: Callable[[str, Dict[str, object]], None]) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, channel: str, event: Dict[str, object]) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class LocalBroker(Broker):
+    """In-process broker: delivers synchronously to this worker's subscribers."""
+
+    def __init__(self):
+        self._deliver: Optional[Callable[[str, Dict[str, object]], None]] = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, channel, event):
+        if self._deliver is not None:
+            self._deliver(channel, event)
+
+
+class Subscription:
+    """One connection's view of the hub: a bounded event queue on its event loop."""
+
+    def __init__(self, channels: Iterable[str], loop: asyncio.AbstractEventLoop, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.channels = list(channels)
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, object]]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _put(self, event: Dict[str, object]) -> bool:
+        """Queue an event; True if the oldest one had to be dropped for it."""
+        # Runs on the subscriber's loop
+        dropped = self.queue.full()
+        if dropped:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+        return dropped
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, object]]:
+        """Next event, or None after ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PubSubHub:
+    """Channel -> subscriptions registry with fan-out metrics."""
+
+    def __init__(self, broker: Optional[Broker] = None, latency_samples: int = 1000):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        # Counters are bumped from publishing threads and every subscriber loop
+        self._stats_lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.broker: Broker = LocalBroker()
+        self.set_broker(broker or self.broker)
+
+    def set_broker(self, broker: Broker) -> None:
+        """Swap the transport, e.g. for a cross-worker broker at startup."""
+        if broker is not self.broker:
+            self.broker.close()
+        self.broker = broker
+        broker.start(self.deliver)
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        """Register a connection; must be called from its event loop."""
+        subscription = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel: str, event: Dict[str, object]) -> None:
+        """Publish from any thread; stamps the event for fan-out latency."""
+        with self._stats_lock:
+            self.published += 1
+        self.broker.publish(channel, dict(event, publishedAt=time.time()))
+
+    def deliver(self, channel: str, event: Dict[str, object]) -> None:
+        """Hand an event to this worker's subscribers of ``channel`` (broker callback)."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(self._enqueue, subscription, event)
+            except RuntimeError:
+                # Loop already closed; the connection is going away
+                self.unsubscribe(subscription)
+
+    def _enqueue(self, subscription: Subscription, event: Dict[str, object]) -> None:
+        dropped = subscription._put(event)
+        published_at = event.get("publishedAt")
+        with self._stats_lock:
+            self.delivered += 1
+            self.dropped += dropped
+            if isinstance(published_at, (int, float)):
+                self._latencies.append((time.time() - published_at) * 1000)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            subscriptions = {s for subs in self._subscribers.values() for s in subs}
+            channels = len(self._subscribers)
+        with self._stats_lock:
+            published, delivered, dropped = self.published, self.delivered, self.dropped
+            latencies: List[float] = sorted(self._latencies)
+
+        def pct(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))], 3)
+
+        return {
+            "connections": len(subscriptions),
+            "channels": channels,
+            "published": published,
+            "delivered": delivered,
+            "dropped": dropped,
+            "fanoutP50Ms": pct(50),
+            "fanoutP99Ms": pct(99),
+            "broker": type(self.broker).__name__,
+        }
+
+
+hub = PubSubHub()
+
+
+def conversation_channels(patient_id: str, doctor_id: str) -> List[str]:
+    """Channels that should see events of a patient-doctor conversation."""
+    return [f"patient:{patient_id}", f"doctor:{doctor_id}"]
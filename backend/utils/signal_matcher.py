@@ -0,0 +1,153 @@
+"""
+Signal matcher - Aho-Corasick automaton over signal phrases
+
+Compiles every symptom/context phrase once so a single pass over the input
+finds all hits (with offsets) regardless of how many phrases are defined.
+
+Usage:
+    from utils.signal_matcher import compile_signals
+
+    matcher = compile_signals(DEFAULT_SIGNALS)
+    for match in matcher.find_all("sudden chest pain"):
+        print(match["kind"], match["category"], match["start"], match["end"])
+"""
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _phrase_text(phrase) -> str:
+    """Signals may be plain strings or {"text": ...} dicts."""
+    if isinstance(phrase, dict):
+        return str(phrase.get("text", ""))
+    return str(phrase)
+
+
+class SignalMatcher:
+    """Multi-pattern matcher built from (phrase, payload) pairs.
+
+    Patterns are matched as plain substrings, like ``phrase in text``.
+    Each payload is a dict that is copied into every match together with
+    ``start``/``end`` offsets and a ``priority`` (definition order).
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Dict[str, object]]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.payloads: List[Dict[str, object]] = []
+        self.lengths: List[int] = []
+        # (kind, category) pairs known to the definitions, even if empty
+        self.categories = set()
+
+        for phrase, payload in patterns:
+            if not phrase:
+                continue
+            state = 0
+            for ch in phrase:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append(len(self.payloads))
+            self.payloads.append(payload)
+            self.lengths.append(len(phrase))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                # Inherit outputs of the suffix state so matching never walks fail links
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def _scan(self, text: str, state: int, offset: int, hits: List[Tuple[int, int, int]]) -> int:
+        """Run the automaton over ``text`` from ``state``, appending
+        (start, end, pattern_index) hits; returns the final state."""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        lengths = self.lengths
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = offset + i + 1
+                for idx in out[state]:
+                    hits.append((end - lengths[idx], end, idx))
+        return state
+
+    def iter_matches(self, text: str, state: int = 0, offset: int = 0) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, pattern_index) for every hit in ``text``.
+
+        ``state`` and ``offset`` let callers resume a previous scan, so
+        phrases spanning two chunks are still found.
+        """
+        hits: List[Tuple[int, int, int]] = []
+        self._scan(text, state, offset, hits)
+        return iter(hits)
+
+    def advance(self, text: str, state: int = 0, offset: int = 0) -> Tuple[int, List[Tuple[int, int, int]]]:
+        """Like ``iter_matches`` but also returns the final state for the next chunk."""
+        hits: List[Tuple[int, int, int]] = []
+        state = self._scan(text, state, offset, hits)
+        return state, hits
+
+    def find_all(self, text: str) -> List[Dict[str, object]]:
+        """Return every match in ``text`` ordered by end offset."""
+        matches = []
+        for start, end, idx in self.iter_matches(text):
+            match = dict(self.payloads[idx])
+            match["start"] = start
+            match["end"] = end
+            match["priority"] = idx
+            matches.append(match)
+        return matches
+
+
+def compile_signals(signals: Dict[str, object], transform=None) -> SignalMatcher:
+    """Compile a ``{"symptomSignals": ..., "contextSignals": ...}`` document.
+
+    ``transform`` is applied to every phrase (defaults to ``str.lower``).
+    Payloads carry ``kind`` ("symptom" or "context"), ``category`` and the
+    transformed phrase as ``text``.
+    """
+    transform = transform or str.lower
+    patterns = []
+    categories = set()
+    for kind, key in (("symptom", "symptomSignals"), ("context", "contextSignals")):
+        for category, phrases in (signals.get(key) or {}).items():
+            categories.add((kind, category))
+            for phrase in phrases or []:
+                text = transform(_phrase_text(phrase))
+                patterns.append((text, {"text": text, "kind": kind, "category": category}))
+    matcher = SignalMatcher(patterns)
+    matcher.categories = categories
+    return matcher
+
+
+def first_match(matches: List[Dict[str, object]], kind: str, category: Optional[str] = None) -> Optional[Dict[str, object]]:
+    """Pick the match defined first, mirroring a category-by-category scan."""
+    best = None
+    for match in matches:
+        if match["kind"] != kind or (category and match["category"] != category):
+            continue
+        if best is None or match["priority"] < best["priority"]:
+            best = match
+    return best
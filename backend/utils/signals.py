@@ -1,15 +1,30 @@
 """
-Signals utility - Load emergency signals from Firestore
+Signals utility - Load emergency signals from the configured storage
 """
 
-try:
-    from firebase_admin import firestore  # type: ignore
-    db = firestore.client()
-except Exception:
-    db = None
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime
 
-# Default signals in case Firestore is unavailable
-DEFAULT_SIGNALS = {
+from database.storage import get_repository
+
+from utils.emergency_message import (
+    CONTEXT_SIGNALS,
+    SYMPTOM_SIGNALS,
+    SignalIndex,
+    build_signal_index,
+    set_signal_index,
+)
+from utils.fuzzy_index import FuzzyIndex
+from utils.signal_matcher import compile_signals, first_match
+
+# English phrases served by the signal routes beyond the built-in tables
+_ENGLISH_SIGNALS = {
     "symptomSignals": {
         "cardiac": [
             "chest pain",
@@ -60,19 +75,304 @@ DEFAULT_SIGNALS = {
     }
 }
 
-def get_signals():
-    """Retrieve signals from Firestore or return default."""
-    if not db:
-        return DEFAULT_SIGNALS
-    
+
+def _with_phrases(base, extra):
+    merged = {category: list(phrases) for category, phrases in base.items()}
+    for category, phrases in extra.items():
+        target = merged.setdefault(category, [])
+        target.extend(p for p in phrases if p not in target)
+    return merged
+
+
+# Default signals in case Firestore is unavailable, and what /init seeds. A
+# published set replaces the built-in tables, so it carries all of them,
+# including the Hindi, Telugu and romanized phrases.
+DEFAULT_SIGNALS = {
+    "symptomSignals": _with_phrases(SYMPTOM_SIGNALS, _ENGLISH_SIGNALS["symptomSignals"]),
+    "contextSignals": _with_phrases(CONTEXT_SIGNALS, _ENGLISH_SIGNALS["contextSignals"]),
+}
+
+SIGNALS_CACHE_TTL = float(os.getenv("SIGNALS_CACHE_TTL", "300"))
+SIGNALS_CACHE_LISTEN = os.getenv("SIGNALS_CACHE_LISTEN", "1") != "0"
+
+
+def _signals_fingerprint(signals):
+    return json.dumps(signals, sort_keys=True, default=str)
+
+
+class SignalSnapshot:
+    """
+    One version of the signal definitions plus everything compiled from it:
+    the substring matcher, the fuzzy index and the emergency SignalIndex.
+    Built completely before it is installed, so swapping snapshots is a
+    single reference assignment.
+    """
+
+    def __init__(self, signals):
+        self.signals = signals
+        # The global version publish_signals stored with the document, the
+        # same in every worker; 0 for definitions that were never published
+        self.version = signals.get("version") or 0
+        self.fingerprint = _signals_fingerprint(signals)
+        self.loaded_at = time.time()
+        self._matcher = None
+        self._fuzzy = None
+        self._index = None
+
+    def compile(self):
+        self.matcher
+        self.fuzzy
+        self.index
+        return self
+
+    @property
+    def matcher(self):
+        # Compiled lazily; a benign race at worst compiles twice
+        if self._matcher is None:
+            self._matcher = compile_signals(self.signals)
+        return self._matcher
+
+    @property
+    def fuzzy(self):
+        if self._fuzzy is None:
+            self._fuzzy = FuzzyIndex((p["text"], p) for p in self.matcher.payloads)
+        return self._fuzzy
+
+    @property
+    def index(self):
+        if self._index is None:
+            if self.signals.get("version"):
+                self._index = build_signal_index(self.signals, self.version)
+            else:
+                # Unpublished defaults: assess_emergency keeps its built-in tables
+                self._index = SignalIndex()
+        return self._index
+
+
+class RepositorySignalSource:
+    """Reads config/signals from the storage engine and watches it when the
+    engine has a change feed (Firestore); otherwise the cache polls on TTL."""
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def load(self):
+        return self.repository.get_config("signals")
+
+    def watch(self, callback):
+        return self.repository.watch_config("signals", callback)
+
+
+class LocalSignalSource:
+    """In-process signal source, used without Firestore and as a fake in tests."""
+
+    def __init__(self, signals=None):
+        self.signals = signals
+        self.loads = 0
+        self._watchers = []
+
+    def load(self):
+        self.loads += 1
+        return self.signals
+
+    def watch(self, callback):
+        self._watchers.append(callback)
+        return lambda: self._watchers.remove(callback)
+
+    def update(self, signals):
+        """Replace the stored definitions and notify watchers, like a snapshot event."""
+        self.signals = signals
+        for callback in list(self._watchers):
+            callback(signals)
+
+
+class SignalCache:
+    """
+    Versioned in-process cache of the signal definitions.
+    Kept fresh by a snapshot listener when the source supports one,
+    otherwise by re-reading the source once the TTL expires.
+    """
+
+    def __init__(self, source, default=None, ttl=SIGNALS_CACHE_TTL, listen=SIGNALS_CACHE_LISTEN):
+        self.source = source
+        self.default = default if default is not None else DEFAULT_SIGNALS
+        self.ttl = ttl
+        self.listen = listen
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._unsubscribe = None
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def get(self):
+        """Return the current SignalSnapshot, loading or refreshing as needed."""
+        snapshot = self._snapshot
+        if snapshot is not None and (self._unsubscribe or time.monotonic() < self._expires_at):
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or not (self._unsubscribe or time.monotonic() < self._expires_at):
+                self._refresh()
+            return self._snapshot
+
+    def _refresh(self):
+        try:
+            signals = self.source.load()
+        except Exception as e:
+            print(f"Warning: Could not fetch signals from Firestore: {e}")
+            signals = self._snapshot.signals if self._snapshot else None
+        self._apply(signals or self.default)
+        self._expires_at = time.monotonic() + self.ttl
+
+        if self.listen and self._unsubscribe is None and hasattr(self.source, "watch"):
+            try:
+                self._unsubscribe = self.source.watch(self._on_change)
+                if self._unsubscribe is None:
+                    # No change feed; other workers' publishes arrive on TTL refresh
+                    self.listen = False
+            except Exception as e:
+                print(f"Warning: Could not watch signals, using TTL refresh: {e}")
+                self.listen = False
+
+    def _on_change(self, signals):
+        with self._lock:
+            self._apply(signals or self.default)
+
+    def _apply(self, signals):
+        current = self._snapshot
+        if current is not None and current.fingerprint == _signals_fingerprint(signals):
+            return
+        # Compile before swapping so requests never see a half-built version
+        snapshot = SignalSnapshot(signals).compile()
+        self._snapshot = snapshot
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Warning: signal listener failed: {e}")
+
+    def set(self, signals):
+        """Install definitions that were just written, without waiting for the listener."""
+        with self._lock:
+            self._apply(signals)
+            self._expires_at = time.monotonic() + self.ttl
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next get() to re-read the source."""
+        self._expires_at = 0.0
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) whenever a new version is installed."""
+        self._listeners.append(listener)
+
+    @property
+    def version(self):
+        return self.get().version
+
+
+def _default_source():
+    repo = get_repository()
+    return RepositorySignalSource(repo) if repo is not None else LocalSignalSource(DEFAULT_SIGNALS)
+
+
+signal_cache = SignalCache(_default_source())
+
+
+def publish_signals(signals):
+    """
+    Store new definitions under the next global version and install them
+    in this worker. Other workers pick the version up through their
+    snapshot listeners (or TTL refresh) and swap it in themselves.
+    """
+    repo = get_repository()
+    if repo is None:
+        raise RuntimeError("Database not available")
+    return signal_cache.set(repo.publish_config("signals", signals))
+
+
+# Each worker records the version it serves here so any worker can report all of them
+WORKER_STATUS_DIR = os.getenv("SIGNALS_WORKER_STATUS_DIR") or os.path.join(tempfile.gettempdir(), "docai-signal-workers")
+
+
+def _worker_status_path(pid=None):
+    return os.path.join(WORKER_STATUS_DIR, f"{socket.gethostname()}-{pid or os.getpid()}.json")
+
+
+def _record_worker_status(snapshot):
+    status = {
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "version": snapshot.version,
+        "fingerprint": hashlib.sha1(snapshot.fingerprint.encode("utf-8")).hexdigest()[:12],
+        "loadedAt": datetime.fromtimestamp(snapshot.loaded_at).isoformat(),
+    }
     try:
-        doc = db.collection("config").document("signals").get()
-        if doc.exists:
-            return doc.to_dict()
-    except Exception as e:
-        print(f"Warning: Could not fetch signals from Firestore: {e}")
-    
-    return DEFAULT_SIGNALS
+        os.makedirs(WORKER_STATUS_DIR, exist_ok=True)
+        tmp = _worker_status_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(status, f)
+        os.replace(tmp, _worker_status_path())
+    except OSError as e:
+        print(f"Warning: Could not record signal worker status: {e}")
+
+
+def _install_snapshot(snapshot):
+    set_signal_index(snapshot.index)
+    _record_worker_status(snapshot)
+
+
+signal_cache.add_listener(_install_snapshot)
+
+
+def worker_status():
+    """Versions served by this worker and every live worker on this host."""
+    snapshot = signal_cache.get()
+    workers = []
+    host = socket.gethostname()
+    try:
+        names = sorted(os.listdir(WORKER_STATUS_DIR))
+    except OSError:
+        names = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(WORKER_STATUS_DIR, name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if status.get("host") == host and not _pid_alive(status.get("pid")):
+            # Worker exited (restart or scale-down); drop its stale record
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        workers.append(status)
+    return {
+        "pid": os.getpid(),
+        "version": snapshot.version,
+        "loadedAt": datetime.fromtimestamp(snapshot.loaded_at).isoformat(),
+        "workers": workers,
+    }
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except PermissionError:
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+
+def get_signals():
+    """Retrieve signals from the in-process cache (Firestore-backed when available)."""
+    return signal_cache.get().signals
 
 def get_symptom_signals():
     """Get symptom signals."""
@@ -84,35 +384,52 @@ def get_context_signals():
     signals = get_signals()
     return signals.get("contextSignals", {})
 
-def check_symptom(text, category=None):
+def get_matcher():
+    """Get the compiled matcher for the current signal definitions."""
+    return signal_cache.get().matcher
+
+def find_signals(text, fuzzy=False):
+    """
+    Find every symptom and context hit in a single pass over text.
+    Returns matches with kind, category, text and start/end offsets
+    into the lower-cased input. With fuzzy=True, near-misses within
+    the edit budget are appended with their distance and score.
+    """
+    snapshot = signal_cache.get()
+    text_lower = (text or "").lower()
+    matches = snapshot.matcher.find_all(text_lower)
+    if fuzzy:
+        matches.extend(m for m in snapshot.fuzzy.search(text_lower) if m["distance"])
+    return matches
+
+def check_symptom(text, category=None, fuzzy=False):
     """
     Check if text contains emergency symptoms.
     If category is None, check all categories.
-    Returns matched symptom and category.
+    Returns matched symptom and category. With fuzzy=True, a misspelled
+    symptom is accepted when no exact one matches; the result then
+    carries its score and distance.
     """
-    symptoms = get_symptom_signals()
-    text_lower = text.lower()
-    
-    if category and category in symptoms:
-        for symptom in symptoms[category]:
-            if isinstance(symptom, dict):
-                symptom_text = symptom.get("text", "").lower()
-            else:
-                symptom_text = str(symptom).lower()
-            
-            if symptom_text in text_lower:
-                return {"symptom": symptom_text, "category": category, "emergency": True}
-    else:
-        for cat, symptom_list in symptoms.items():
-            for symptom in symptom_list:
-                if isinstance(symptom, dict):
-                    symptom_text = symptom.get("text", "").lower()
-                else:
-                    symptom_text = str(symptom).lower()
-                
-                if symptom_text in text_lower:
-                    return {"symptom": symptom_text, "category": cat, "emergency": True}
-    
+    snapshot = signal_cache.get()
+    matcher = snapshot.matcher
+    text_lower = (text or "").lower()
+    if not (category and ("symptom", category) in matcher.categories):
+        category = None
+
+    match = first_match(matcher.find_all(text_lower), "symptom", category)
+    if match:
+        return {"symptom": match["text"], "category": match["category"], "emergency": True}
+
+    if fuzzy:
+        for candidate in snapshot.fuzzy.search(text_lower):
+            if candidate["kind"] == "symptom" and (not category or candidate["category"] == category):
+                return {
+                    "symptom": candidate["text"],
+                    "category": candidate["category"],
+                    "emergency": True,
+                    "score": candidate["score"],
+                    "distance": candidate["distance"],
+                }
     return {"emergency": False}
 
 def check_context(text):
@@ -120,18 +437,8 @@ def check_context(text):
     Check if text contains context signals (severity indicators).
     Returns matched contexts.
     """
-    contexts = get_context_signals()
-    text_lower = text.lower()
-    matched = []
-    
-    for ctx_type, ctx_list in contexts.items():
-        for ctx in ctx_list:
-            if isinstance(ctx, dict):
-                ctx_text = ctx.get("text", "").lower()
-            else:
-                ctx_text = str(ctx).lower()
-            
-            if ctx_text in text_lower:
-                matched.append({"context": ctx_text, "type": ctx_type})
-    
-    return matched
+    seen = {}
+    for match in find_signals(text):
+        if match["kind"] == "context":
+            seen.setdefault(match["priority"], {"context": match["text"], "type": match["category"]})
+    return [seen[idx] for idx in sorted(seen)]
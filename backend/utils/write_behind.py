@@ -0,0 +1,322 @@
+"""
+Write-behind queue - batched, off-request-path record writes
+
+Request handlers enqueue documents and return immediately with a
+pre-assigned document id; a background thread commits them through the
+storage engine's write_records() in groups of up to 500 writes, once
+enough are pending or the oldest has waited FLUSH_INTERVAL. Emergency
+records go in a priority lane that is always flushed ahead of routine
+logs.
+
+Usage:
+    from utils.write_behind import write_behind
+
+    doc_id = write_behind("emergency", record, priority=True)
+
+Tuning (env): WRITE_QUEUE_MAX_PENDING, WRITE_QUEUE_BATCH_SIZE,
+WRITE_QUEUE_FLUSH_INTERVAL, WRITE_QUEUE_MAX_RETRIES, WRITE_QUEUE_DEAD_LETTER.
+When the queue is full, writes fall back to a direct add_record() so memory
+stays bounded and no record is dropped at the door.
+
+Nothing is discarded: a batch that fails is retried one document at a
+time, so one bad document cannot sink the others, and documents that still
+fail after WRITE_QUEUE_MAX_RETRIES go to a dead-letter file (one JSON line
+per write, each reported with a warning) that replay_dead_letters() re-applies.
+While the queue cannot commit, priority writes skip it and are written
+synchronously.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from database.storage import get_repository
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+WRITE_QUEUE_MAX_PENDING = int(os.getenv("WRITE_QUEUE_MAX_PENDING", "20000"))
+WRITE_QUEUE_BATCH_SIZE = min(int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "500")), FIRESTORE_BATCH_LIMIT)
+WRITE_QUEUE_FLUSH_INTERVAL = float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", "0.25"))
+WRITE_QUEUE_MAX_RETRIES = int(os.getenv("WRITE_QUEUE_MAX_RETRIES", "5"))
+WRITE_QUEUE_DEAD_LETTER = os.getenv("WRITE_QUEUE_DEAD_LETTER", "write_behind.deadletter.jsonl")
+
+# (collection, document id, data)
+_Write = Tuple[str, str, Dict[str, object]]
+
+
+class WriteQueueFull(Exception):
+    """Raised by enqueue() when the pending limit is reached; callers should write directly."""
+
+
+class DeadLetterFile:
+    """Append-only JSON-lines file of writes the queue could not commit."""
+
+    def __init__(self, path: str = WRITE_QUEUE_DEAD_LETTER):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, write: _Write, error: Exception) -> None:
+        collection, doc_id, data = write
+        line = json.dumps(
+            {"collection": collection, "id": doc_id, "data": data, "error": str(error), "failedAt": datetime.now().isoformat()},
+            default=str,
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"Warning: Dead-lettered write {collection}/{doc_id} to {self.path}: {error}")
+
+    def take(self) -> List[dict]:
+        """Remove and return every dead-lettered entry."""
+        with self._lock:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    entries = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return []
+            os.remove(self.path)
+        return entries
+
+
+class WriteBehindQueue:
+    """Bounded two-lane queue flushed by a background thread."""
+
+    def __init__(
+        self,
+        repository,
+        max_pending: int = WRITE_QUEUE_MAX_PENDING,
+        batch_size: int = WRITE_QUEUE_BATCH_SIZE,
+        flush_interval: float = WRITE_QUEUE_FLUSH_INTERVAL,
+        max_retries: int = WRITE_QUEUE_MAX_RETRIES,
+        backoff: float = 0.2,
+        max_backoff: float = 10.0,
+        dead_letter: Optional[DeadLetterFile] = None,
+    ):
+        self.repository = repository
+        self.dead_letter = dead_letter or DeadLetterFile()
+        self.max_pending = max_pending
+        self.batch_size = min(batch_size, FIRESTORE_BATCH_LIMIT)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._priority: Deque[_Write] = deque()
+        self._routine: Deque[_Write] = deque()
+        self._in_flight = 0
+        self._oldest: Optional[float] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        # False from a failed commit until the next successful one
+        self.healthy = True
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "dead_lettered": 0}
+
+    @property
+    def pending(self) -> int:
+        return len(self._priority) + len(self._routine) + self._in_flight
+
+    def enqueue(self, collection: str, data: Dict[str, object], priority: bool = False, doc_id: Optional[str] = None) -> str:
+        """Queue a document write and return its id without waiting for storage."""
+        doc_id = doc_id or self.repository.new_record_id(collection)
+        with self._cond:
+            if self._closed:
+                raise WriteQueueFull("write queue is closed")
+            if self.pending >= self.max_pending:
+                raise WriteQueueFull(f"{self.pending} writes pending")
+            (self._priority if priority else self._routine).append((collection, doc_id, data))
+            self.stats["enqueued"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._ensure_thread()
+            if priority or self.pending >= self.batch_size:
+                self._cond.notify()
+        return doc_id
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _take(self) -> List[_Write]:
+        """Next batch: priority writes first, topped up with routine ones."""
+        writes: List[_Write] = []
+        for lane in (self._priority, self._routine):
+            while lane and len(writes) < self.batch_size:
+                writes.append(lane.popleft())
+        self._in_flight += len(writes)
+        self._oldest = time.monotonic() if self._priority or self._routine else None
+        return writes
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._priority or len(self._routine) >= self.batch_size:
+                        break
+                    if self._oldest is not None:
+                        wait = self.flush_interval - (time.monotonic() - self._oldest)
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                writes = self._take()
+                if not writes and self._closed:
+                    self._cond.notify_all()
+                    return
+            if writes:
+                self._commit(writes)
+
+    def _done(self, written: int, dead: int = 0) -> None:
+        with self._cond:
+            self._in_flight -= written + dead
+            self.stats["written"] += written
+            self.stats["dead_lettered"] += dead
+            self._cond.notify_all()
+
+    def _commit(self, writes: List[_Write]) -> None:
+        try:
+            self.repository.write_records(writes)
+            self.healthy = True
+            with self._cond:
+                self.stats["batches"] += 1
+            self._done(len(writes))
+            return
+        except Exception as e:
+            self.healthy = False
+            print(f"Warning: Batch of {len(writes)} queued writes failed, retrying one at a time: {e}")
+
+        # One at a time, so a bad document only fails itself
+        pending = list(writes)
+        attempt = 0
+        while True:
+            failed = []
+            for write in pending:
+                try:
+                    self.repository.write_records([write])
+                except Exception as e:
+                    failed.append((write, e))
+            self._done(len(pending) - len(failed))
+            if not failed:
+                self.healthy = True
+                return
+            attempt += 1
+            if attempt > self.max_retries:
+                break
+            with self._cond:
+                self.stats["retries"] += 1
+            pending = [write for write, _ in failed]
+            time.sleep(min(self.max_backoff, self.backoff * (2 ** (attempt - 1))))
+
+        for write, error in failed:
+            try:
+                self.dead_letter.append(write, error)
+            except Exception as e:
+                # Last resort: the record survives in the log
+                print(f"Warning: Could not dead-letter write {write[0]}/{write[1]} ({e}): {write[2]!r}")
+        self._done(0, len(failed))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wake the flusher and wait until everything queued so far is written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._oldest = 0.0 if self._priority or self._routine else self._oldest
+            self._cond.notify_all()
+            while self.pending:
+                if self._thread is None or not self._thread.is_alive():
+                    self._ensure_thread()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.1)
+                # Keep the flusher from waiting out the interval while draining
+                if self._priority or self._routine:
+                    self._oldest = 0.0
+                    self._cond.notify_all()
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0) -> bool:
+        """Stop accepting writes and drain what is queued (called on shutdown)."""
+        drained = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return drained
+
+
+_queue: Optional[WriteBehindQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> Optional[WriteBehindQueue]:
+    """Shared queue for this worker, or None when no storage is available."""
+    global _queue
+    repo = get_repository()
+    if repo is None:
+        return None
+    with _queue_lock:
+        if _queue is None or _queue.repository is not repo:
+            _queue = WriteBehindQueue(repo)
+        return _queue
+
+
+def write_behind(collection: str, data: Dict[str, object], priority: bool = False) -> str:
+    """Queue a write if possible, otherwise write synchronously; returns the document id.
+
+    Priority writes are written synchronously while the queue is failing to
+    commit. A synchronous write that fails is dead-lettered, then re-raised.
+    Raises RuntimeError when no storage is available.
+    """
+    queue = get_write_queue()
+    if queue is None:
+        raise RuntimeError("Database not available")
+    if not (priority and not queue.healthy):
+        try:
+            return queue.enqueue(collection, data, priority=priority)
+        except WriteQueueFull:
+            pass
+    doc_id = queue.repository.new_record_id(collection)
+    try:
+        queue.repository.add_record(collection, data, doc_id)
+    except Exception as e:
+        queue.dead_letter.append((collection, doc_id, data), e)
+        raise
+    return doc_id
+
+
+def drain_write_queue(timeout: float = 30.0) -> None:
+    global _queue
+    with _queue_lock:
+        queue, _queue = _queue, None
+    if queue is not None:
+        queue.close(timeout)
+
+
+def replay_dead_letters(repository=None, dead_letter: Optional[DeadLetterFile] = None) -> Tuple[int, int]:
+    """Re-apply dead-lettered writes; returns (written, still failing).
+
+    Writes that fail again are dead-lettered again, so this is safe to re-run.
+    """
+    repository = repository or get_repository()
+    if repository is None:
+        raise RuntimeError("Database not available")
+    dead_letter = dead_letter or DeadLetterFile()
+    written = failed = 0
+    for entry in dead_letter.take():
+        write = (entry["collection"], entry["id"], entry["data"])
+        try:
+            repository.write_records([write])
+            written += 1
+        except Exception as e:
+            dead_letter.append(write, e)
+            failed += 1
+    return written, failed
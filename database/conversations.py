@@ -0,0 +1,89 @@
+"""
+Conversation helpers shared by the message storage engines: thread
+ordering, pagination cursors and page shaping, and the per-conversation
+summary fields.
+"""
+
+import base64
+import json
+
+READERS = ("patient", "doctor")
+
+
+def sort_key(msg):
+    return (msg["timestamp"], msg["id"])
+
+
+def encode_cursor(msg):
+    """Opaque pagination token for a message's position in its thread."""
+    raw = json.dumps(list(sort_key(msg)), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """(timestamp, id) from a cursor token; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        timestamp, msg_id = json.loads(raw)
+        return (str(timestamp), str(msg_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def unread_field(msg):
+    """Summary counter a message counts against while unread: its recipient's."""
+    return "unreadForPatient" if msg.get("sender") == "doctor" else "unreadForDoctor"
+
+
+def reader_field(reader):
+    return f"unreadFor{reader.capitalize()}"
+
+
+def last_message_fields(msg):
+    return {
+        "lastMessage": msg["message"],
+        "lastMessageTime": msg["timestamp"],
+        "lastMessageId": msg["id"],
+        "lastSender": msg.get("sender"),
+    }
+
+
+def name_fields(msg):
+    """patientName/doctorName of a message for its summary; blank names are left out
+    so a message sent without them does not erase the ones on file."""
+    return {f: msg[f] for f in ("patientName", "doctorName") if msg.get(f)}
+
+
+def updated_at(msg):
+    """When a message last changed (sent or read); older messages lack updatedAt."""
+    return msg.get("updatedAt") or msg["timestamp"]
+
+
+def new_summary(msg):
+    summary = {
+        "patientId": msg["patientId"],
+        "doctorId": msg["doctorId"],
+        "patientName": msg.get("patientName"),
+        "doctorName": msg.get("doctorName"),
+        "unreadForDoctor": 0,
+        "unreadForPatient": 0,
+        # Bumped on every change to the conversation; part of its ETag
+        "version": 0,
+    }
+    summary.update(last_message_fields(msg))
+    return summary
+
+
+def make_page(messages, limit, forward):
+    """Trim a window fetched with limit + 1 and work out the next cursor.
+
+    ``messages`` is in fetch order (oldest first going forward, newest
+    first going backward); the page is always returned oldest first.
+    """
+    has_more = limit is not None and len(messages) > limit
+    if has_more:
+        messages = messages[:limit]
+    next_cursor = encode_cursor(messages[-1]) if has_more else None
+    if not forward:
+        messages = messages[::-1]
+    return {"messages": messages, "nextCursor": next_cursor, "hasMore": has_more}
@@ -0,0 +1,26 @@
+"""
+Email index helpers shared by the storage engines.
+
+Each user's email is registered under its normalized form (user_emails in
+Firestore, the user_emails table in SQLite), so lookups are a single key
+read and uniqueness is enforced by the write that claims the key.
+"""
+
+from urllib.parse import quote
+
+
+class EmailAlreadyRegistered(ValueError):
+    """Another user already holds this email."""
+
+    def __init__(self, email):
+        super().__init__(f"Email already registered: {email}")
+        self.email = email
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def email_key(email):
+    """Index key (Firestore document id) for an email; '/' is not allowed in ids."""
+    return quote(normalize_email(email), safe="@+")
@@ -0,0 +1,47 @@
+"""
+Bounded executor for blocking data-access calls.
+
+The Firestore Admin client is synchronous. Async route handlers must not
+call it directly, or one slow request stalls every other request on the
+worker's event loop. ``run_blocking`` runs the call on a shared thread
+pool whose size (DB_EXECUTOR_WORKERS) bounds concurrent Firestore calls
+per worker.
+
+Usage:
+    from database.executor import run_blocking
+
+    user = await run_blocking(_find_user_by_id, user_id)
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "32"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+        return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Await ``fn(*args, **kwargs)`` on the data-access pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -0,0 +1,523 @@
+"""
+Firestore storage engine (DOCAI_STORAGE=firestore, the default).
+
+Collections: users, user_emails (normalized email -> userId), messages,
+conversations (one summary per patient/doctor pair, id
+"<patientId>_<doctorId>"), symptoms/emergency/emergency_messages and
+config. Summary counters and the email index are maintained in
+transactions with the documents they describe; large writes go out in
+batches of at most 500 writes, committed in parallel, except mark-read
+chunks, which run one after another (see FirestoreRepository.mark_read).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from firebase_admin import firestore  # type: ignore
+from google.api_core.exceptions import AlreadyExists  # type: ignore
+
+from database.conversations import (
+    last_message_fields,
+    make_page,
+    name_fields,
+    new_summary,
+    reader_field,
+    sort_key,
+    unread_field,
+    updated_at,
+)
+from database.emails import EmailAlreadyRegistered, email_key, normalize_email
+from database.storage import DocumentExists, Repository
+
+# Firestore allows at most 500 writes per batch; chunks commit in parallel
+WRITE_BATCH_LIMIT = 500
+# Messages marked read per transaction; one more write goes to the summary
+MARK_READ_CHUNK = WRITE_BATCH_LIMIT - 1
+BATCH_WRITE_CONCURRENCY = int(os.getenv("BATCH_WRITE_CONCURRENCY", "4"))
+
+# Emails are indexed in user_emails/<normalized email> -> {userId, email}.
+# Until init_email_index.py has backfilled users created before the index,
+# a miss falls back to the email query; set 0 afterwards so misses (every
+# new signup) cost one document read.
+USER_EMAIL_INDEX_FALLBACK = os.getenv("USER_EMAIL_INDEX_FALLBACK", "1") != "0"
+
+
+def _listener(deliver, on_error):
+    """on_snapshot callback running deliver(docs), reporting failures to on_error."""
+    def on_snapshot(docs, changes, read_time):
+        try:
+            deliver(docs)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(e)
+
+    return on_snapshot
+
+
+def _parallel(fn, chunks):
+    """Run fn over chunks, in parallel when there is more than one; results in order."""
+    if len(chunks) == 1:
+        return [fn(chunks[0])]
+    with ThreadPoolExecutor(max_workers=min(BATCH_WRITE_CONCURRENCY, len(chunks))) as pool:
+        return list(pool.map(fn, chunks))
+
+
+# Transaction bodies; firestore.transactional retries them on contention
+
+@firestore.transactional
+def _send_in_transaction(transaction, repo, msgs):
+    """Write messages and fold them into their conversation summaries atomically.
+
+    Summaries are read first so the last-message fields only move forward:
+    concurrent senders may commit out of order and the newest stays "last".
+    """
+    keys = list(dict.fromkeys((msg["patientId"], msg["doctorId"]) for msg in msgs))
+    refs = [repo._summary_ref(*key) for key in keys]
+    current = {snapshot.id: snapshot.to_dict() for snapshot in repo.client.get_all(refs, transaction=transaction) if snapshot.exists}
+
+    updates, newest = {}, {}
+    for msg in msgs:
+        key = (msg["patientId"], msg["doctorId"])
+        update = updates.get(key)
+        if update is None:
+            summary = current.get(repo._summary_ref(*key).id)
+            update = updates[key] = {"patientId": key[0], "doctorId": key[1], "counts": {}}
+            if summary is None:
+                update["counts"] = {"unreadForDoctor": 0, "unreadForPatient": 0}
+            else:
+                newest[key] = (summary.get("lastMessageTime", ""), summary.get("lastMessageId", ""))
+        update.update(name_fields(msg))
+        field = unread_field(msg)
+        update["counts"][field] = update["counts"].get(field, 0) + 1
+        if key not in newest or sort_key(msg) >= newest[key]:
+            update.update(last_message_fields(msg))
+            newest[key] = sort_key(msg)
+
+    for msg in msgs:
+        # create() fails the transaction if the id is taken instead of overwriting
+        transaction.create(repo._messages.document(msg["id"]), msg)
+    for (patient_id, doctor_id), update in updates.items():
+        counts = update.pop("counts")
+        update.update({f: firestore.Increment(n) for f, n in counts.items()})
+        update["version"] = firestore.Increment(1)
+        transaction.set(repo._summary_ref(patient_id, doctor_id), update, merge=True)
+
+
+@firestore.transactional
+def _mark_read_in_transaction(transaction, repo, patient_id, doctor_id, read_at, reader):
+    """Mark up to MARK_READ_CHUNK unread messages read and recompute the summary
+    counters. The summary and the messages are read in the transaction, so a
+    concurrent send or mark-read makes it retry rather than skew the counters
+    (Firestore does not clamp Increment). Returns how many messages changed."""
+    summary_ref = repo._summary_ref(patient_id, doctor_id)
+    snapshot = summary_ref.get(transaction=transaction)
+    q = (
+        repo._messages
+        .where("patientId", "==", patient_id)
+        .where("doctorId", "==", doctor_id)
+        .where("read", "==", False)
+    )
+    if reader == "patient":
+        queries = [q.where("sender", "==", "doctor")]
+    elif reader == "doctor":
+        # Everything the doctor did not send, as unread_field counts it; != skips null senders
+        queries = [q.where("sender", "!=", "doctor"), q.where("sender", "==", None)]
+    else:
+        queries = [q]
+    found = {}
+    for query in queries:
+        if len(found) >= MARK_READ_CHUNK:
+            break
+        for d in query.select(["sender"]).limit(MARK_READ_CHUNK - len(found)).stream(transaction=transaction):
+            found.setdefault(d.id, d)
+    docs = list(found.values())
+
+    decrements = {field: 0 for field in ([reader_field(reader)] if reader else ("unreadForDoctor", "unreadForPatient"))}
+    for d in docs:
+        transaction.update(d.reference, {"read": True, "readAt": read_at, "updatedAt": read_at})
+        field = unread_field(d.to_dict())
+        decrements[field] = decrements.get(field, 0) + 1
+    if snapshot.exists:
+        summary = snapshot.to_dict()
+        if len(docs) < MARK_READ_CHUNK:
+            # That was every unread message for these counters
+            update = {f: 0 for f in decrements}
+        else:
+            update = {f: max(0, summary.get(f, 0) - n) for f, n in decrements.items()}
+        update = {f: n for f, n in update.items() if summary.get(f) != n}
+        if docs or update:
+            update["version"] = firestore.Increment(1)
+            transaction.set(summary_ref, update, merge=True)
+    return len(docs)
+
+
+@firestore.transactional
+def _delete_in_transaction(transaction, repo, message_id):
+    """Delete a message and back it out of the conversation summary."""
+    msg_ref = repo._messages.document(message_id)
+    snapshot = msg_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return False
+    msg = snapshot.to_dict()
+    summary_ref = repo._summary_ref(msg["patientId"], msg["doctorId"])
+    summary = summary_ref.get(transaction=transaction).to_dict() or {}
+
+    update = {"version": firestore.Increment(1)}
+    if not msg.get("read"):
+        update[unread_field(msg)] = firestore.Increment(-1)
+    if summary.get("lastMessageId") == message_id:
+        remaining = [
+            d.to_dict()
+            for d in repo._thread_query(msg["patientId"], msg["doctorId"], firestore.Query.DESCENDING)
+            .limit(2)
+            .stream(transaction=transaction)
+            if d.id != message_id
+        ]
+        if not remaining:
+            transaction.delete(msg_ref)
+            transaction.delete(summary_ref)
+            return True
+        update.update(last_message_fields(remaining[0]))
+    transaction.delete(msg_ref)
+    transaction.set(summary_ref, update, merge=True)
+    return True
+
+
+def _claim_email(transaction, repo, email, user_id):
+    """Reserve email for user_id inside transaction; returns its index ref.
+
+    An entry held by another user is taken over when that user no longer
+    has the email (deleted, or rewritten with another one); otherwise
+    raises EmailAlreadyRegistered.
+    """
+    ref = repo._email_ref(email)
+    snapshot = ref.get(transaction=transaction)
+    owner_id = snapshot.to_dict().get("userId") if snapshot.exists else None
+    if owner_id and owner_id != user_id:
+        owner = repo._users.document(owner_id).get(transaction=transaction)
+        if owner.exists and normalize_email(owner.to_dict().get("email")) == normalize_email(email):
+            raise EmailAlreadyRegistered(email)
+    return ref
+
+
+def _owned_email_ref(transaction, repo, email, user_id):
+    """Index ref of email if it points at user_id (safe to delete), else None."""
+    if not email:
+        return None
+    ref = repo._email_ref(email)
+    snapshot = ref.get(transaction=transaction)
+    return ref if snapshot.exists and snapshot.to_dict().get("userId") == user_id else None
+
+
+def _read_email_move(transaction, repo, user_id, old_email, new_email):
+    """Reads for pointing the index at user_id's new email; returns (ref to delete, ref to set)."""
+    new_ref = _claim_email(transaction, repo, new_email, user_id) if new_email else None
+    if normalize_email(old_email) == normalize_email(new_email):
+        return None, new_ref
+    return _owned_email_ref(transaction, repo, old_email, user_id), new_ref
+
+
+def _write_email_move(transaction, user_id, new_email, refs):
+    old_ref, new_ref = refs
+    if old_ref is not None:
+        transaction.delete(old_ref)
+    if new_ref is not None:
+        transaction.set(new_ref, {"userId": user_id, "email": normalize_email(new_email)})
+
+
+@firestore.transactional
+def _create_user_in_transaction(transaction, repo, user_id, user_data):
+    user_ref = repo._users.document(user_id)
+    # Re-creating a user under the same id replaces its old index entry.
+    # Reads come before writes in a Firestore transaction.
+    existing = user_ref.get(transaction=transaction)
+    old_email = existing.to_dict().get("email") if existing.exists else None
+    refs = _read_email_move(transaction, repo, user_id, old_email, user_data.get("email"))
+    _write_email_move(transaction, user_id, user_data.get("email"), refs)
+    transaction.set(user_ref, user_data)
+
+
+@firestore.transactional
+def _update_user_in_transaction(transaction, repo, user_id, updates):
+    user_ref = repo._users.document(user_id)
+    snapshot = user_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    user = snapshot.to_dict()
+    if "email" in updates:
+        refs = _read_email_move(transaction, repo, user_id, user.get("email"), updates["email"])
+        _write_email_move(transaction, user_id, updates["email"], refs)
+    transaction.update(user_ref, updates)
+    user.update(updates)
+    return user
+
+
+@firestore.transactional
+def _publish_config_in_transaction(transaction, ref, data):
+    current = ref.get(transaction=transaction)
+    version = int((current.to_dict() or {}).get("version", 0)) if current.exists else 0
+    data = dict(data, version=version + 1, updatedAt=datetime.now().isoformat())
+    transaction.set(ref, data)
+    return data
+
+
+class FirestoreRepository(Repository):
+    """Repository over a Firestore client (firebase_admin.firestore.client())."""
+
+    def __init__(self, client):
+        self.client = client
+        self._users = client.collection("users")
+        self._messages = client.collection("messages")
+
+    # Messages -------------------------------------------------------------
+
+    def _summary_ref(self, patient_id, doctor_id):
+        return self.client.collection("conversations").document(f"{patient_id}_{doctor_id}")
+
+    def _thread_query(self, patient_id, doctor_id, direction):
+        return (
+            self._messages
+            .where("patientId", "==", patient_id)
+            .where("doctorId", "==", doctor_id)
+            .order_by("timestamp", direction=direction)
+            .order_by("id", direction=direction)
+        )
+
+    def add_message(self, msg):
+        try:
+            _send_in_transaction(self.client.transaction(), self, [msg])
+        except AlreadyExists:
+            raise DocumentExists(msg["id"])
+        return msg
+
+    def add_messages(self, msgs):
+        """Messages plus one summary update per conversation per transaction,
+        packed under the batch limit; transactions commit in parallel."""
+        chunks, chunk, conversations = [], [], set()
+        for msg in msgs:
+            key = (msg["patientId"], msg["doctorId"])
+            writes = len(chunk) + len(conversations) + 1 + (key not in conversations)
+            if chunk and writes > WRITE_BATCH_LIMIT:
+                chunks.append(chunk)
+                chunk, conversations = [], set()
+            chunk.append(msg)
+            conversations.add(key)
+        if chunk:
+            chunks.append(chunk)
+        if not chunks:
+            return []
+
+        def commit(chunk):
+            try:
+                _send_in_transaction(self.client.transaction(), self, chunk)
+                return [{"success": True, "data": msg} for msg in chunk]
+            except AlreadyExists as e:
+                return [{"success": False, "error": str(e), "data": msg, "duplicate": True} for msg in chunk]
+            except Exception as e:
+                return [{"success": False, "error": str(e), "data": msg} for msg in chunk]
+
+        return [result for results in _parallel(commit, chunks) for result in results]
+
+    def get_message(self, message_id):
+        doc = self._messages.document(message_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_summary(self, patient_id, doctor_id):
+        doc = self._summary_ref(patient_id, doctor_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def thread_page(self, patient_id, doctor_id, limit=None, before=None, after=None):
+        forward = after is not None
+        direction = firestore.Query.ASCENDING if forward else firestore.Query.DESCENDING
+        q = self._thread_query(patient_id, doctor_id, direction)
+        if forward:
+            q = q.start_after({"timestamp": after[0], "id": after[1]})
+            if before:
+                q = q.end_before({"timestamp": before[0], "id": before[1]})
+        elif before:
+            q = q.start_after({"timestamp": before[0], "id": before[1]})
+        if limit is not None:
+            q = q.limit(limit + 1)
+        return make_page([d.to_dict() for d in q.stream()], limit, forward)
+
+    def thread_changes(self, patient_id, doctor_id, since):
+        thread = self._messages.where("patientId", "==", patient_id).where("doctorId", "==", doctor_id)
+        # Messages stored before updatedAt existed only match on their timestamp,
+        # like the other engines' updatedAt-or-timestamp comparison
+        changed = {}
+        for field in ("updatedAt", "timestamp"):
+            for d in thread.where(field, ">", since).stream():
+                msg = d.to_dict()
+                if updated_at(msg) > since:
+                    changed[d.id] = msg
+        return sorted(changed.values(), key=sort_key)
+
+    def summaries_for(self, role, user_id):
+        docs = self.client.collection("conversations").where(f"{role}Id", "==", user_id).stream()
+        return [d.to_dict() for d in docs]
+
+    def mark_read(self, patient_id, doctor_id, read_at, reader=None):
+        """Only unread messages are touched, MARK_READ_CHUNK per transaction.
+
+        The chunks run one after another on purpose. Each transaction reads
+        and rewrites the conversation summary to recompute its counters, and
+        picks "the first MARK_READ_CHUNK unread" by query. Parallel chunks
+        would all contend on that one summary document and select the same
+        messages, so Firestore would retry them back into sequence, or give
+        up after its retry limit, instead of speeding them up.
+        """
+        total = 0
+        while True:
+            changed = _mark_read_in_transaction(self.client.transaction(), self, patient_id, doctor_id, read_at, reader)
+            total += changed
+            if changed < MARK_READ_CHUNK:
+                return total
+
+    def delete_message(self, message_id):
+        return _delete_in_transaction(self.client.transaction(), self, message_id)
+
+    def rebuild_conversation_summaries(self):
+        summaries = {}
+        for d in self._messages.stream():
+            msg = d.to_dict()
+            key = (msg["patientId"], msg["doctorId"])
+            summary = summaries.get(key)
+            if summary is None:
+                summary = summaries[key] = new_summary(msg)
+            elif sort_key(msg) >= (summary["lastMessageTime"], summary["lastMessageId"]):
+                summary.update(last_message_fields(msg))
+            if not msg.get("read"):
+                summary[unread_field(msg)] += 1
+
+        items = list(summaries.items())
+        for i in range(0, len(items), WRITE_BATCH_LIMIT):
+            batch = self.client.batch()
+            for (patient_id, doctor_id), summary in items[i:i + WRITE_BATCH_LIMIT]:
+                batch.set(self._summary_ref(patient_id, doctor_id), summary)
+            batch.commit()
+        return len(items)
+
+    # Users ----------------------------------------------------------------
+
+    def _email_ref(self, email):
+        return self.client.collection("user_emails").document(email_key(email))
+
+    def get_user(self, user_id):
+        doc = self._users.document(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def find_user_by_email(self, email):
+        entry = self._email_ref(email).get()
+        if entry.exists:
+            user = self.get_user(entry.to_dict()["userId"])
+            # A stale entry (user document rewritten with another email) is a miss
+            if user and normalize_email(user.get("email")) == normalize_email(email):
+                return user
+            return None
+        if not USER_EMAIL_INDEX_FALLBACK:
+            return None
+        docs = self._users.where("email", "==", email).limit(1).stream()
+        return next((d.to_dict() for d in docs), None)
+
+    def find_users_by_role(self, role, fields=None):
+        query = self._users.where("role", "==", role)
+        if fields:
+            query = query.select(list(fields))
+        return [d.to_dict() for d in query.stream()]
+
+    def watch_users_by_role(self, role, callback, on_error=None):
+        # Listeners do not support projections; callers project on rebuild
+        def deliver(docs):
+            callback([d.to_dict() for d in docs])
+
+        watch = self._users.where("role", "==", role).on_snapshot(_listener(deliver, on_error))
+        return watch.unsubscribe
+
+    def create_user(self, user_data):
+        user_id = user_data.get("id") or self._users.document().id
+        _create_user_in_transaction(self.client.transaction(), self, user_id, user_data)
+        return user_data
+
+    def update_user(self, user_id, updates):
+        return _update_user_in_transaction(self.client.transaction(), self, user_id, updates)
+
+    def rebuild_email_index(self):
+        """When several users share an email the first one streamed keeps it.
+
+        Entries are written with create(), so keys already in the index (for
+        instance claimed by a signup while this runs) are never overwritten;
+        an existing key held by another user is reported as a conflict.
+        """
+        owners, conflicts = {}, []
+        for doc in self._users.stream():
+            user = doc.to_dict()
+            email = user.get("email")
+            if not email:
+                continue
+            key = email_key(email)
+            if key in owners:
+                conflicts.append((email, doc.id))
+                continue
+            owners[key] = (doc.id, email)
+
+        index = self.client.collection("user_emails")
+
+        def create(items):
+            created, taken = 0, []
+            for key, (user_id, email) in items:
+                ref = index.document(key)
+                try:
+                    ref.create({"userId": user_id, "email": normalize_email(email)})
+                    created += 1
+                except AlreadyExists:
+                    entry = ref.get()
+                    if entry.exists and entry.to_dict().get("userId") != user_id:
+                        taken.append((email, user_id))
+            return created, taken
+
+        items = list(owners.items())
+        chunks = [items[i:i + WRITE_BATCH_LIMIT] for i in range(0, len(items), WRITE_BATCH_LIMIT)] or [[]]
+        indexed = 0
+        for created, taken in _parallel(create, chunks):
+            indexed += created
+            conflicts.extend(taken)
+        return indexed, conflicts
+
+    # Health records -------------------------------------------------------
+
+    def new_record_id(self, collection):
+        return self.client.collection(collection).document().id
+
+    def add_record(self, collection, data, record_id=None):
+        ref = self.client.collection(collection).document(record_id)
+        ref.set(data)
+        return ref.id
+
+    def write_records(self, writes):
+        batch = self.client.batch()
+        for collection, record_id, data in writes:
+            batch.set(self.client.collection(collection).document(record_id), data)
+        batch.commit()
+
+    def find_records(self, collection, user_id):
+        return [d.to_dict() for d in self.client.collection(collection).where("userId", "==", user_id).stream()]
+
+    # Config documents -----------------------------------------------------
+
+    def get_config(self, name):
+        doc = self.client.collection("config").document(name).get()
+        return doc.to_dict() if doc.exists else None
+
+    def publish_config(self, name, data):
+        ref = self.client.collection("config").document(name)
+        return _publish_config_in_transaction(self.client.transaction(), ref, data)
+
+    def watch_config(self, name, callback, on_error=None):
+        def deliver(docs):
+            for doc in docs:
+                callback(doc.to_dict() if doc.exists else None)
+
+        watch = self.client.collection("config").document(name).on_snapshot(_listener(deliver, on_error))
+        return watch.unsubscribe
@@ -0,0 +1,117 @@
+"""
+Document id generation for messages.
+
+Ids are a snowflake variant: 42 bits of milliseconds since ID_EPOCH_MS,
+10 bits of worker id and 12 bits of per-millisecond sequence, so ids from
+one worker never repeat and sort by creation time. Firestore hot-spots on
+lexicographically increasing keys, so the encoded id is led by a 2-char
+shard derived from a hash of the snowflake; ids spread over 1024 key
+ranges while staying time-ordered within each.
+
+    MSG 3K 01HZX4Q2M8J0A
+    |   |  `- snowflake, Crockford base32, 13 chars
+    |   `---- shard
+    `-------- prefix
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import time
+
+ID_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"  # Crockford base32
+_DECODE = {ch: i for i, ch in enumerate(_ALPHABET)}
+
+
+def _encode(value, width):
+    chars = []
+    for _ in range(width):
+        chars.append(_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def _default_worker_id():
+    """MESSAGE_ID_WORKER_ID if set, else derived from host and pid.
+
+    The derived id is only likely to be distinct: two workers can hash to the
+    same one. Set MESSAGE_ID_WORKER_ID per process where that matters; either
+    way the storage engines create messages rather than overwrite them, so a
+    colliding id fails its write and the send retries with a fresh one.
+    """
+    configured = os.getenv("MESSAGE_ID_WORKER_ID")
+    if configured:
+        return int(configured) & MAX_WORKER_ID
+    host = int.from_bytes(hashlib.blake2b(socket.gethostname().encode(), digest_size=2).digest(), "big")
+    return (host ^ os.getpid()) & MAX_WORKER_ID
+
+
+class IdGenerator:
+    """Thread-safe snowflake id source for one process."""
+
+    def __init__(self, worker_id=None, prefix="MSG", clock=time.time):
+        self.worker_id = _default_worker_id() if worker_id is None else worker_id & MAX_WORKER_ID
+        self.prefix = prefix
+        self.clock = clock
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_int(self):
+        with self._lock:
+            now = int(self.clock() * 1000) - ID_EPOCH_MS
+            # A clock stepping backwards keeps counting from the last millisecond used
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            else:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond; borrow the next one
+                    self._last_ms += 1
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_id(self):
+        value = self.next_int()
+        digest = hashlib.blake2b(value.to_bytes(8, "big"), digest_size=2).digest()
+        shard = int.from_bytes(digest, "big") & 0x3FF
+        return f"{self.prefix}{_encode(shard, 2)}{_encode(value, 13)}"
+
+
+def parse_id(message_id, prefix="MSG"):
+    """(timestamp ms since the Unix epoch, worker id, sequence) of a generated id."""
+    body = message_id[len(prefix) + 2:]
+    if not message_id.startswith(prefix) or len(body) != 13:
+        raise ValueError("Not a generated id")
+    value = 0
+    for ch in body:
+        value = (value << 5) | _DECODE[ch]
+    return (
+        (value >> (WORKER_BITS + SEQUENCE_BITS)) + ID_EPOCH_MS,
+        (value >> SEQUENCE_BITS) & MAX_WORKER_ID,
+        value & MAX_SEQUENCE,
+    )
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def new_message_id():
+    """Next message id; a forked worker gets its own generator and worker id."""
+    global _generator, _generator_pid
+    pid = os.getpid()
+    if _generator_pid != pid:
+        with _generator_lock:
+            if _generator_pid != pid:
+                _generator = IdGenerator()
+                _generator_pid = pid
+    return _generator.next_id()
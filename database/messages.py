@@ -1,132 +1,351 @@
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
 from datetime import datetime
 
-# Optional Firestore client (initialized if Firebase Admin is active)
-try:
-    from firebase_admin import firestore  # type: ignore
-    db = firestore.client()
-except Exception:
-    db = None
+from database.conversations import (
+    READERS,
+    decode_cursor,
+    last_message_fields,
+    make_page,
+    name_fields,
+    new_summary,
+    reader_field,
+    sort_key,
+    unread_field,
+    updated_at,
+)
+from database.ids import new_message_id
+from database.storage import DocumentExists, MessageRepository, get_repository
 
-# In-memory message storage fallback
-messages_cache = []
+# Cap on messages held by the in-memory fallback; the oldest are evicted first
+MESSAGE_STORE_MAX = int(os.getenv("MESSAGE_STORE_MAX", "50000"))
+
+class MessageStore(MessageRepository):
+    """In-memory message storage fallback.
+
+    Messages are indexed by id and kept in timestamp order per
+    (patient, doctor) thread, with per-doctor and per-patient indexes of
+    thread partners, so reads touch only the threads they need. Each thread
+    also has a conversation summary kept up to date on every change. All
+    access goes through one lock since route handlers run on the threadpool.
+    """
+
+    def __init__(self, max_messages=MESSAGE_STORE_MAX):
+        self.max_messages = max_messages
+        self._by_id = OrderedDict()  # insertion order doubles as eviction order
+        self._threads = {}  # (patientId, doctorId) -> ([sort keys], [messages])
+        self._doctor_patients = {}  # doctorId -> {patientId}
+        self._patient_doctors = {}  # patientId -> {doctorId}
+        self._summaries = {}  # (patientId, doctorId) -> conversation summary
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add_message(self, msg):
+        with self._lock:
+            if msg["id"] in self._by_id:
+                raise DocumentExists(msg["id"])
+            self._by_id[msg["id"]] = msg
+            patient_id, doctor_id = msg["patientId"], msg["doctorId"]
+            keys, msgs = self._threads.setdefault((patient_id, doctor_id), ([], []))
+            key = sort_key(msg)
+            pos = bisect_left(keys, key)
+            keys.insert(pos, key)
+            msgs.insert(pos, msg)
+            self._doctor_patients.setdefault(doctor_id, set()).add(patient_id)
+            self._patient_doctors.setdefault(patient_id, set()).add(doctor_id)
+            summary = self._summaries.setdefault((patient_id, doctor_id), new_summary(msg))
+            summary.update(name_fields(msg))
+            if pos == len(msgs) - 1:
+                summary.update(last_message_fields(msg))
+            if not msg.get("read"):
+                summary[unread_field(msg)] += 1
+            summary["version"] += 1
+            while self.max_messages and len(self._by_id) > self.max_messages:
+                self._remove(next(iter(self._by_id)))
+        return msg
+
+    def add_messages(self, msgs):
+        """Insert a batch under a single lock acquisition; all or nothing."""
+        with self._lock:
+            for msg in msgs:
+                if msg["id"] in self._by_id:
+                    raise DocumentExists(msg["id"])
+            for msg in msgs:
+                self.add_message(msg)
+        return [{"success": True, "data": msg} for msg in msgs]
+
+    def get_message(self, message_id):
+        with self._lock:
+            return self._by_id.get(message_id)
+
+    def thread(self, patient_id, doctor_id):
+        """Messages between a patient and doctor, oldest first."""
+        with self._lock:
+            entry = self._threads.get((patient_id, doctor_id))
+            return list(entry[1]) if entry else []
+
+    def get_summary(self, patient_id, doctor_id):
+        with self._lock:
+            summary = self._summaries.get((patient_id, doctor_id))
+            return dict(summary) if summary else None
+
+    def thread_page(self, patient_id, doctor_id, limit=None, before=None, after=None):
+        with self._lock:
+            entry = self._threads.get((patient_id, doctor_id))
+            if not entry:
+                return make_page([], limit, True)
+            keys, msgs = entry
+            lo = bisect_left(keys, after) if after else 0
+            if after and lo < len(keys) and keys[lo] == after:
+                lo += 1
+            hi = bisect_left(keys, before) if before else len(keys)
+            forward = after is not None
+            if limit is None:
+                window = msgs[lo:hi]
+            elif forward:
+                window = msgs[lo:min(hi, lo + limit + 1)]
+            else:
+                window = msgs[max(lo, hi - limit - 1):hi]
+            return make_page(window if forward else window[::-1], limit, forward)
+
+    def thread_changes(self, patient_id, doctor_id, since):
+        with self._lock:
+            entry = self._threads.get((patient_id, doctor_id))
+            return [msg for msg in entry[1] if updated_at(msg) > since] if entry else []
+
+    def summaries_for(self, role, user_id):
+        with self._lock:
+            if role == "doctor":
+                return [dict(self._summaries[(p, user_id)]) for p in self._doctor_patients.get(user_id, ())]
+            return [dict(self._summaries[(user_id, d)]) for d in self._patient_doctors.get(user_id, ())]
+
+    def mark_read(self, patient_id, doctor_id, read_at, reader=None):
+        field = reader_field(reader) if reader else None
+        changed = 0
+        with self._lock:
+            entry = self._threads.get((patient_id, doctor_id))
+            summary = self._summaries.get((patient_id, doctor_id))
+            for msg in entry[1] if entry else ():
+                if msg.get("read") or (field and unread_field(msg) != field):
+                    continue
+                msg["read"] = True
+                msg["readAt"] = msg["updatedAt"] = read_at
+                summary[unread_field(msg)] -= 1
+                changed += 1
+            if changed:
+                summary["version"] += 1
+        return changed
+
+    def delete_message(self, message_id):
+        with self._lock:
+            if message_id not in self._by_id:
+                return False
+            self._remove(message_id)
+            return True
+
+    def _remove(self, message_id):
+        msg = self._by_id.pop(message_id)
+        thread_key = (msg["patientId"], msg["doctorId"])
+        keys, msgs = self._threads[thread_key]
+        pos = bisect_left(keys, sort_key(msg))
+        while msgs[pos] is not msg:
+            pos += 1
+        del keys[pos]
+        del msgs[pos]
+        summary = self._summaries[thread_key]
+        if not msg.get("read"):
+            summary[unread_field(msg)] -= 1
+        summary["version"] += 1
+        if msgs and pos == len(msgs):
+            summary.update(last_message_fields(msgs[-1]))
+        if not msgs:
+            del self._threads[thread_key]
+            del self._summaries[thread_key]
+            patient_id, doctor_id = thread_key
+            self._doctor_patients[doctor_id].discard(patient_id)
+            if not self._doctor_patients[doctor_id]:
+                del self._doctor_patients[doctor_id]
+            self._patient_doctors[patient_id].discard(doctor_id)
+            if not self._patient_doctors[patient_id]:
+                del self._patient_doctors[patient_id]
+
+
+# In-memory fallback for messages when no storage engine is available
+message_store = MessageStore()
+
+def _engine():
+    """Storage for message operations: the configured repository, else memory."""
+    repo = get_repository()
+    return repo if repo is not None else message_store
+
+# Sends retry with a fresh id when a generated one is already taken (worker
+# ids are derived from host and pid and may collide, see database/ids.py)
+ID_ATTEMPTS = 3
 
 def _now_iso():
     return datetime.now().isoformat()
 
-def send_message(patient_id, doctor_id, patient_name, doctor_name, message, sender):
-    """Send a message and store it in Firestore if available, else memory."""
-    msg_id = f"MSG{int(datetime.now().timestamp() * 1000)}"
-    msg = {
-        "id": msg_id,
+def _build_message(patient_id, doctor_id, patient_name, doctor_name, message, sender):
+    now = _now_iso()
+    return {
+        "id": new_message_id(),
         "patientId": patient_id,
         "doctorId": doctor_id,
         "patientName": patient_name,
         "doctorName": doctor_name,
         "message": message,
         "sender": sender,
-        "timestamp": _now_iso(),
+        "timestamp": now,
+        "updatedAt": now,
         "read": False,
     }
 
-    if db:
-        db.collection("messages").document(msg_id).set(msg)
-    else:
-        messages_cache.append(msg)
-    return msg
+def send_message(patient_id, doctor_id, patient_name, doctor_name, message, sender):
+    """Send a message and store it in Firestore if available, else memory."""
+    msg = _build_message(patient_id, doctor_id, patient_name, doctor_name, message, sender)
+    for attempt in range(ID_ATTEMPTS):
+        try:
+            return _engine().add_message(msg)
+        except DocumentExists:
+            if attempt == ID_ATTEMPTS - 1:
+                raise
+            msg = dict(msg, id=new_message_id())
+
+def send_messages(entries):
+    """Send many messages at once.
+
+    ``entries`` are dicts with the send_message arguments (patient_id,
+    doctor_id, patient_name, doctor_name, message, sender). Firestore
+    writes go out in batches of at most 500 writes, committed in parallel,
+    with one summary update per conversation per batch. Returns one result
+    per entry, in order: {"success", "data"} or {"success": False, "error"}.
+    Messages whose generated id was taken are retried with a fresh one.
+    """
+    engine = _engine()
+    msgs = [_build_message(**entry) for entry in entries]
+    results = [None] * len(msgs)
+    pending = list(range(len(msgs)))
+    for attempt in range(ID_ATTEMPTS):
+        batch = [msgs[i] for i in pending]
+        try:
+            batch_results = engine.add_messages(batch)
+        except DocumentExists as e:
+            batch_results = [{"success": False, "error": str(e), "data": msg, "duplicate": True} for msg in batch]
+        retry = []
+        for i, result in zip(pending, batch_results):
+            results[i] = result
+            if result.get("duplicate"):
+                retry.append(i)
+                msgs[i] = dict(msgs[i], id=new_message_id())
+        if not retry:
+            break
+        pending = retry
+    return results
 
 def get_conversation(patient_id, doctor_id):
     """Get messages between a patient and doctor."""
-    if db:
-        q = (
-            db.collection("messages")
-            .where("patientId", "==", patient_id)
-            .where("doctorId", "==", doctor_id)
-        )
-        docs = q.stream()
-        conversation = [d.to_dict() for d in docs]
-    else:
-        conversation = [
-            msg for msg in messages_cache
-            if msg["patientId"] == patient_id and msg["doctorId"] == doctor_id
-        ]
-    conversation.sort(key=lambda x: x["timestamp"])  # ascending
-    return conversation
-
-def get_conversations_for_doctor(doctor_id):
-    """Get all conversations for a doctor grouped by patient."""
-    if db:
-        docs = db.collection("messages").where("doctorId", "==", doctor_id).stream()
-        doctor_messages = [d.to_dict() for d in docs]
-    else:
-        doctor_messages = [msg for msg in messages_cache if msg["doctorId"] == doctor_id]
-
-    conversations = {}
-    for msg in sorted(doctor_messages, key=lambda x: x["timestamp"], reverse=True):
-        patient_id = msg["patientId"]
-        if patient_id not in conversations:
-            conversations[patient_id] = {
-                "patientId": patient_id,
-                "patientName": msg.get("patientName"),
-                "lastMessage": msg["message"],
-                "lastMessageTime": msg["timestamp"],
-                "unreadCount": 0 if msg.get("read") else 1,
-                "messages": [],
-            }
-        elif not msg.get("read") and msg["sender"] != "doctor":
-            conversations[patient_id]["unreadCount"] += 1
-        conversations[patient_id]["messages"].append(msg)
-
-    return list(conversations.values())
-
-def get_conversations_for_patient(patient_id):
-    """Get all conversations for a patient grouped by doctor."""
-    if db:
-        docs = db.collection("messages").where("patientId", "==", patient_id).stream()
-        patient_messages = [d.to_dict() for d in docs]
-    else:
-        patient_messages = [msg for msg in messages_cache if msg["patientId"] == patient_id]
-
-    conversations = {}
-    for msg in sorted(patient_messages, key=lambda x: x["timestamp"], reverse=True):
-        doctor_id = msg["doctorId"]
-        if doctor_id not in conversations:
-            conversations[doctor_id] = {
-                "doctorId": doctor_id,
-                "doctorName": msg.get("doctorName"),
-                "lastMessage": msg["message"],
-                "lastMessageTime": msg["timestamp"],
-                "messages": [],
-            }
-        conversations[doctor_id]["messages"].append(msg)
-    return list(conversations.values())
-
-def mark_conversation_as_read(patient_id, doctor_id):
-    """Mark all messages in a conversation as read."""
-    if db:
-        docs = (
-            db.collection("messages")
-            .where("patientId", "==", patient_id)
-            .where("doctorId", "==", doctor_id)
-        ).stream()
-        batch = db.batch()
-        for d in docs:
-            ref = db.collection("messages").document(d.id)
-            batch.update(ref, {"read": True, "readAt": _now_iso()})
-        batch.commit()
-        return True
-    else:
-        for msg in messages_cache:
-            if msg["patientId"] == patient_id and msg["doctorId"] == doctor_id:
-                msg["read"] = True
-                msg["readAt"] = _now_iso()
-        return True
+    return get_conversation_page(patient_id, doctor_id)["messages"]
+
+def get_conversation_page(patient_id, doctor_id, limit=None, before=None, after=None, since=None):
+    """Get one page of a conversation, oldest message first.
+
+    ``before``/``after`` are cursor tokens. With ``after`` the page moves
+    forward (newer messages); otherwise it holds the newest ``limit``
+    messages before ``before``. ``nextCursor`` continues in the same
+    direction and is None once the thread is exhausted.
+
+    ``since`` is the newest ``updatedAt`` a client holds: the result is
+    every message sent or updated (read) after it, oldest first, for the
+    client to merge by id. It is a delta, so ``limit`` does not apply and
+    it cannot be combined with cursors.
+    """
+    if since:
+        if before or after:
+            raise ValueError("since cannot be combined with before or after")
+        messages = _engine().thread_changes(patient_id, doctor_id, since)
+        return {"messages": messages, "nextCursor": None, "hasMore": False}
+    before_key = decode_cursor(before) if before else None
+    after_key = decode_cursor(after) if after else None
+    return _engine().thread_page(patient_id, doctor_id, limit, before_key, after_key)
+
+def get_conversation_etag(patient_id, doctor_id, **params):
+    """Validator for one conversation response: the conversation's summary
+    version and counters plus the query ``params`` (limit/before/after/since),
+    so it changes with any send, read or delete and differs per query.
+    Costs one document read."""
+    summary = _engine().get_summary(patient_id, doctor_id) or {}
+    state = [
+        patient_id,
+        doctor_id,
+        summary.get("version", 0),
+        summary.get("lastMessageId"),
+        summary.get("unreadForDoctor", 0),
+        summary.get("unreadForPatient", 0),
+        sorted((k, v) for k, v in params.items() if v is not None),
+    ]
+    digest = hashlib.blake2b(json.dumps(state, default=str).encode(), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+def _inbox_entry(summary, role):
+    partner = "patient" if role == "doctor" else "doctor"
+    return {
+        f"{partner}Id": summary[f"{partner}Id"],
+        f"{partner}Name": summary.get(f"{partner}Name"),
+        "lastMessage": summary.get("lastMessage"),
+        "lastMessageTime": summary.get("lastMessageTime"),
+        "lastSender": summary.get("lastSender"),
+        "unreadCount": summary.get(f"unreadFor{role.capitalize()}", 0),
+    }
+
+def _inbox(role, user_id, include_messages):
+    summaries = _engine().summaries_for(role, user_id)
+    summaries.sort(key=lambda x: x.get("lastMessageTime") or "", reverse=True)
+    conversations = []
+    for summary in summaries:
+        entry = _inbox_entry(summary, role)
+        if include_messages:
+            entry["messages"] = get_conversation(summary["patientId"], summary["doctorId"])
+        conversations.append(entry)
+    return conversations
+
+def get_conversations_for_doctor(doctor_id, include_messages=False):
+    """Get all conversations for a doctor, newest first, from the summaries.
+
+    Message bodies are only loaded with ``include_messages``.
+    """
+    return _inbox("doctor", doctor_id, include_messages)
+
+def get_conversations_for_patient(patient_id, include_messages=False):
+    """Get all conversations for a patient, newest first, from the summaries."""
+    return _inbox("patient", patient_id, include_messages)
+
+def mark_conversation_as_read(patient_id, doctor_id, reader=None):
+    """Mark unread messages addressed to ``reader`` ("patient" or "doctor")
+    as read; with no reader, every unread message in the conversation.
+
+    Only unread messages are touched. On Firestore each chunk of at most
+    500 writes is a transaction with the summary counters, so concurrent
+    sends and mark-reads cannot skew them. Returns the number updated.
+    """
+    if reader is not None and reader not in READERS:
+        raise ValueError("reader must be patient or doctor")
+    return _engine().mark_read(patient_id, doctor_id, _now_iso(), reader)
 
 def delete_message(message_id):
     """Delete a message by id."""
-    if db:
-        db.collection("messages").document(message_id).delete()
-        return True
-    else:
-        global messages_cache
-        messages_cache = [msg for msg in messages_cache if msg["id"] != message_id]
-        return True
+    _engine().delete_message(message_id)
+    return True
+
+def rebuild_conversation_summaries():
+    """Recompute every conversation summary from the messages.
+
+    One pass over all messages; for Firestore data written before summaries
+    existed. Returns the number of conversations written.
+    """
+    return _engine().rebuild_conversation_summaries()
@@ -0,0 +1,397 @@
+"""
+SQLite storage engine (DOCAI_STORAGE=sqlite).
+
+Documents are stored as JSON next to the columns they are queried by, with
+indexes matching the Firestore query shapes: users by email and role,
+messages by (patientId, doctorId, timestamp, id), summaries by doctor,
+records by (collection, userId). user_emails maps each normalized email to
+its user, so email lookups are a key read and uniqueness is enforced by
+its primary key. The database runs in WAL mode so readers never wait for
+the writer; each thread gets its own connection and multi-statement
+writes run in BEGIN IMMEDIATE transactions.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+from database.conversations import (
+    last_message_fields,
+    make_page,
+    name_fields,
+    new_summary,
+    reader_field,
+    sort_key,
+    unread_field,
+)
+from database.emails import EmailAlreadyRegistered, normalize_email
+from database.storage import DocumentExists, Repository
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    role TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE INDEX IF NOT EXISTS users_role ON users (role);
+
+CREATE TABLE IF NOT EXISTS user_emails (
+    email TEXT PRIMARY KEY,
+    userId TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    patientId TEXT NOT NULL,
+    doctorId TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    sender TEXT,
+    read INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_thread ON messages (patientId, doctorId, timestamp, id);
+CREATE INDEX IF NOT EXISTS messages_unread ON messages (patientId, doctorId, sender) WHERE read = 0;
+
+CREATE TABLE IF NOT EXISTS conversations (
+    patientId TEXT NOT NULL,
+    doctorId TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (patientId, doctorId)
+);
+CREATE INDEX IF NOT EXISTS conversations_doctor ON conversations (doctorId);
+
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    userId TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS records_user ON records (collection, userId);
+
+CREATE TABLE IF NOT EXISTS config (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _remove_files(path):
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+
+def _loads(row):
+    return json.loads(row[0]) if row else None
+
+
+class SQLiteStore(Repository):
+    """Repository backed by one SQLite database file.
+
+    ``":memory:"`` gives a throwaway database in a temporary file, removed
+    when the store is garbage collected. A shared-cache in-memory database
+    would take table locks that ignore the busy timeout, so concurrent
+    writers would fail instead of waiting.
+    """
+
+    def __init__(self, path=":memory:"):
+        if path == ":memory:":
+            fd, path = tempfile.mkstemp(prefix="docai-", suffix=".sqlite3")
+            os.close(fd)
+            self._cleanup = weakref.finalize(self, _remove_files, path)
+        self.path = path
+        self._local = threading.local()
+        self._keeper = self._connect()
+        self._keeper.executescript(SCHEMA)
+        # Databases created before user_emails existed are indexed on open
+        self.rebuild_email_index()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @property
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextmanager
+    def _tx(self):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Messages -------------------------------------------------------------
+
+    def _summary(self, conn, patient_id, doctor_id):
+        row = conn.execute(
+            "SELECT data FROM conversations WHERE patientId = ? AND doctorId = ?", (patient_id, doctor_id)
+        ).fetchone()
+        return _loads(row)
+
+    def _save_summary(self, conn, summary):
+        summary["version"] = summary.get("version", 0) + 1
+        conn.execute(
+            "INSERT OR REPLACE INTO conversations (patientId, doctorId, data) VALUES (?, ?, ?)",
+            (summary["patientId"], summary["doctorId"], json.dumps(summary)),
+        )
+
+    def _insert(self, conn, msg):
+        try:
+            conn.execute(
+                "INSERT INTO messages (id, patientId, doctorId, timestamp, sender, read, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (msg["id"], msg["patientId"], msg["doctorId"], msg["timestamp"], msg.get("sender"),
+                 int(bool(msg.get("read"))), json.dumps(msg)),
+            )
+        except sqlite3.IntegrityError:
+            # Never overwrite (or count twice) an existing message
+            raise DocumentExists(msg["id"])
+        summary = self._summary(conn, msg["patientId"], msg["doctorId"])
+        if summary is None:
+            summary = new_summary(msg)
+        else:
+            summary.update(name_fields(msg))
+            if sort_key(msg) >= (summary["lastMessageTime"], summary["lastMessageId"]):
+                summary.update(last_message_fields(msg))
+        if not msg.get("read"):
+            summary[unread_field(msg)] += 1
+        self._save_summary(conn, summary)
+
+    def add_message(self, msg):
+        with self._tx() as conn:
+            self._insert(conn, msg)
+        return msg
+
+    def add_messages(self, msgs):
+        with self._tx() as conn:
+            for msg in msgs:
+                self._insert(conn, msg)
+        return [{"success": True, "data": msg} for msg in msgs]
+
+    def get_message(self, message_id):
+        return _loads(self._conn.execute("SELECT data FROM messages WHERE id = ?", (message_id,)).fetchone())
+
+    def get_summary(self, patient_id, doctor_id):
+        return self._summary(self._conn, patient_id, doctor_id)
+
+    def thread_page(self, patient_id, doctor_id, limit=None, before=None, after=None):
+        forward = after is not None
+        clauses = ["patientId = ?", "doctorId = ?"]
+        params = [patient_id, doctor_id]
+        if after:
+            clauses.append("(timestamp, id) > (?, ?)")
+            params.extend(after)
+        if before:
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend(before)
+        order = "ASC" if forward else "DESC"
+        params.append(-1 if limit is None else limit + 1)
+        rows = self._conn.execute(
+            f"SELECT data FROM messages WHERE {' AND '.join(clauses)} "
+            f"ORDER BY timestamp {order}, id {order} LIMIT ?",
+            params,
+        ).fetchall()
+        return make_page([json.loads(r[0]) for r in rows], limit, forward)
+
+    def thread_changes(self, patient_id, doctor_id, since):
+        rows = self._conn.execute(
+            "SELECT data FROM messages WHERE patientId = ? AND doctorId = ? "
+            "AND COALESCE(json_extract(data, '$.updatedAt'), timestamp) > ? "
+            "ORDER BY timestamp, id",
+            (patient_id, doctor_id, since),
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def summaries_for(self, role, user_id):
+        column = "doctorId" if role == "doctor" else "patientId"
+        rows = self._conn.execute(f"SELECT data FROM conversations WHERE {column} = ?", (user_id,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def mark_read(self, patient_id, doctor_id, read_at, reader=None):
+        # Messages addressed to the doctor are the ones the patient side sent
+        sides = [reader] if reader else ["doctor", "patient"]
+        changed = 0
+        with self._tx() as conn:
+            summary = self._summary(conn, patient_id, doctor_id)
+            for side in sides:
+                sender_clause = "sender IS NOT 'doctor'" if side == "doctor" else "sender = 'doctor'"
+                cursor = conn.execute(
+                    "UPDATE messages SET read = 1, "
+                    "data = json_set(data, '$.read', json('true'), '$.readAt', ?, '$.updatedAt', ?) "
+                    f"WHERE patientId = ? AND doctorId = ? AND read = 0 AND {sender_clause}",
+                    (read_at, read_at, patient_id, doctor_id),
+                )
+                changed += cursor.rowcount
+                if summary:
+                    summary[reader_field(side)] = max(0, summary[reader_field(side)] - cursor.rowcount)
+            if summary and changed:
+                self._save_summary(conn, summary)
+        return changed
+
+    def delete_message(self, message_id):
+        with self._tx() as conn:
+            msg = _loads(conn.execute("SELECT data FROM messages WHERE id = ?", (message_id,)).fetchone())
+            if msg is None:
+                return False
+            conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+            summary = self._summary(conn, msg["patientId"], msg["doctorId"])
+            if summary is None:
+                return True
+            if not msg.get("read"):
+                summary[unread_field(msg)] -= 1
+            if summary.get("lastMessageId") == message_id:
+                row = conn.execute(
+                    "SELECT data FROM messages WHERE patientId = ? AND doctorId = ? "
+                    "ORDER BY timestamp DESC, id DESC LIMIT 1",
+                    (msg["patientId"], msg["doctorId"]),
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        "DELETE FROM conversations WHERE patientId = ? AND doctorId = ?",
+                        (msg["patientId"], msg["doctorId"]),
+                    )
+                    return True
+                summary.update(last_message_fields(json.loads(row[0])))
+            self._save_summary(conn, summary)
+        return True
+
+    # Users ----------------------------------------------------------------
+
+    def get_user(self, user_id):
+        return _loads(self._conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone())
+
+    def find_user_by_email(self, email):
+        row = self._conn.execute(
+            "SELECT users.data FROM user_emails JOIN users ON users.id = user_emails.userId "
+            "WHERE user_emails.email = ?",
+            (normalize_email(email),),
+        ).fetchone()
+        return _loads(row)
+
+    def find_users_by_role(self, role, fields=None):
+        rows = self._conn.execute("SELECT data FROM users WHERE role = ?", (role,)).fetchall()
+        users = [json.loads(r[0]) for r in rows]
+        if fields:
+            users = [{f: u[f] for f in fields if f in u} for u in users]
+        return users
+
+    def _claim_email(self, conn, email, user_id):
+        """Point email at user_id, dropping the user's previous entry; raises if taken.
+
+        An entry whose user no longer has the email is taken over.
+        """
+        key = normalize_email(email)
+        row = conn.execute(
+            "SELECT user_emails.userId, users.email FROM user_emails "
+            "LEFT JOIN users ON users.id = user_emails.userId WHERE user_emails.email = ?",
+            (key,),
+        ).fetchone()
+        if row and row[0] != user_id and normalize_email(row[1]) == key:
+            raise EmailAlreadyRegistered(email)
+        conn.execute("DELETE FROM user_emails WHERE userId = ? OR email = ?", (user_id, key))
+        conn.execute("INSERT INTO user_emails (email, userId) VALUES (?, ?)", (key, user_id))
+
+    def create_user(self, user_data):
+        user_id = user_data.get("id") or uuid.uuid4().hex
+        with self._tx() as conn:
+            if user_data.get("email"):
+                self._claim_email(conn, user_data["email"], user_id)
+            else:
+                # Re-created without an email: drop the old entry
+                conn.execute("DELETE FROM user_emails WHERE userId = ?", (user_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO users (id, email, role, data) VALUES (?, ?, ?, ?)",
+                (user_id, user_data.get("email"), user_data.get("role"), json.dumps(user_data)),
+            )
+        return user_data
+
+    def update_user(self, user_id, updates):
+        with self._tx() as conn:
+            user = _loads(conn.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone())
+            if user is None:
+                return None
+            if "email" in updates and normalize_email(updates["email"]) != normalize_email(user.get("email")):
+                if updates["email"]:
+                    self._claim_email(conn, updates["email"], user_id)
+                else:
+                    conn.execute("DELETE FROM user_emails WHERE userId = ?", (user_id,))
+            user.update(updates)
+            conn.execute(
+                "UPDATE users SET email = ?, role = ?, data = ? WHERE id = ?",
+                (user.get("email"), user.get("role"), json.dumps(user), user_id),
+            )
+        return user
+
+    def rebuild_email_index(self):
+        indexed, conflicts = 0, []
+        with self._tx() as conn:
+            rows = conn.execute(
+                "SELECT id, email FROM users WHERE email IS NOT NULL AND email != '' "
+                "AND id NOT IN (SELECT userId FROM user_emails) ORDER BY rowid"
+            ).fetchall()
+            for user_id, email in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO user_emails (email, userId) VALUES (?, ?)", (normalize_email(email), user_id)
+                )
+                if cursor.rowcount:
+                    indexed += 1
+                else:
+                    conflicts.append((email, user_id))
+        return indexed, conflicts
+
+    # Health records -------------------------------------------------------
+
+    def new_record_id(self, collection):
+        return uuid.uuid4().hex
+
+    def add_record(self, collection, data, record_id=None):
+        record_id = record_id or self.new_record_id(collection)
+        self.write_records([(collection, record_id, data)])
+        return record_id
+
+    def write_records(self, writes):
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (collection, id, userId, data) VALUES (?, ?, ?, ?)",
+                [(collection, record_id, data.get("userId"), json.dumps(data, default=str))
+                 for collection, record_id, data in writes],
+            )
+
+    def find_records(self, collection, user_id):
+        rows = self._conn.execute(
+            "SELECT data FROM records WHERE collection = ? AND userId = ?", (collection, user_id)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    # Config documents -----------------------------------------------------
+
+    def get_config(self, name):
+        return _loads(self._conn.execute("SELECT data FROM config WHERE name = ?", (name,)).fetchone())
+
+    def publish_config(self, name, data):
+        with self._tx() as conn:
+            current = _loads(conn.execute("SELECT data FROM config WHERE name = ?", (name,)).fetchone()) or {}
+            data = dict(data, version=int(current.get("version", 0)) + 1, updatedAt=datetime.now().isoformat())
+            conn.execute("INSERT OR REPLACE INTO config (name, data) VALUES (?, ?)", (name, json.dumps(data)))
+        return data
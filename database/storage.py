@@ -0,0 +1,190 @@
+"""
+Storage backend selection.
+
+DOCAI_STORAGE picks where data lives:
+    firestore (default)  Firestore when Firebase Admin is configured; without
+                         it, messages fall back to memory and other data
+                         is unavailable (the historical behaviour)
+    sqlite               everything in a local SQLite database at
+                         DOCAI_SQLITE_PATH (":memory:" for a throwaway one);
+                         no network, for offline runs and load tests
+
+Every engine implements the Repository interface below; modules get the
+configured one from ``get_repository()`` and never talk to a client
+directly.
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+
+STORAGE_BACKEND = os.getenv("DOCAI_STORAGE", "firestore").strip().lower()
+SQLITE_PATH = os.getenv("DOCAI_SQLITE_PATH", "docai.sqlite3")
+
+_repository = None
+_resolved = False
+_repository_lock = threading.Lock()
+
+
+class DocumentExists(ValueError):
+    """A document with this id already exists; new messages are created, never overwritten."""
+
+    def __init__(self, doc_id):
+        super().__init__(f"Document already exists: {doc_id}")
+        self.doc_id = doc_id
+
+
+class MessageRepository(ABC):
+    """Messages and their per-conversation summaries."""
+
+    @abstractmethod
+    def add_message(self, msg):
+        """Store a new message and fold it into its conversation summary;
+        raises DocumentExists if its id is taken."""
+
+    @abstractmethod
+    def add_messages(self, msgs):
+        """Store many new messages; one {"success", "data"[, "error"]} per message, in order.
+
+        An id that is taken fails its message (or the whole call, with
+        DocumentExists); failed results carry "duplicate": True then.
+        """
+
+    @abstractmethod
+    def get_message(self, message_id):
+        """The message with this id, or None."""
+
+    @abstractmethod
+    def get_summary(self, patient_id, doctor_id):
+        """Conversation summary of a thread, or None."""
+
+    @abstractmethod
+    def thread_page(self, patient_id, doctor_id, limit=None, before=None, after=None):
+        """Slice of a thread between (timestamp, id) keys, see messages.get_conversation_page."""
+
+    @abstractmethod
+    def thread_changes(self, patient_id, doctor_id, since):
+        """Messages of a thread sent or updated after ``since`` (updatedAt), oldest first."""
+
+    @abstractmethod
+    def summaries_for(self, role, user_id):
+        """Conversation summaries of a doctor or patient (``role``), unordered."""
+
+    @abstractmethod
+    def mark_read(self, patient_id, doctor_id, read_at, reader=None):
+        """Mark unread messages addressed to ``reader`` (all when None) as read; returns how many changed."""
+
+    @abstractmethod
+    def delete_message(self, message_id):
+        """Delete a message and back it out of its summary; False if it did not exist."""
+
+    def rebuild_conversation_summaries(self):
+        """Recompute every summary from the messages; returns how many were written."""
+        return 0
+
+
+class Repository(MessageRepository):
+    """Everything a storage engine provides: messages, users, health
+    records (symptoms/emergency/emergency_messages) and config documents."""
+
+    # Users
+
+    @abstractmethod
+    def get_user(self, user_id):
+        """The user document with this id, or None."""
+
+    @abstractmethod
+    def find_user_by_email(self, email):
+        """The user registered with this email, or None."""
+
+    @abstractmethod
+    def find_users_by_role(self, role, fields=None):
+        """All users with this role, projected to ``fields`` when given."""
+
+    @abstractmethod
+    def create_user(self, user_data):
+        """Store a new user; returns its data."""
+
+    @abstractmethod
+    def update_user(self, user_id, updates):
+        """Apply updates; returns the updated user, or None if it does not exist."""
+
+    @abstractmethod
+    def rebuild_email_index(self):
+        """Index users missing from the email index; returns (indexed, conflicts)."""
+
+    def watch_users_by_role(self, role, callback, on_error=None):
+        """Call callback(users) whenever the users with ``role`` change, and
+        on_error(exc) if the listener fails; returns an unsubscribe function,
+        or None when the engine has no change feed."""
+        return None
+
+    # Health records
+
+    @abstractmethod
+    def new_record_id(self, collection):
+        """A fresh document id for ``collection``, assigned before the write."""
+
+    @abstractmethod
+    def add_record(self, collection, data, record_id=None):
+        """Write one record; returns its id."""
+
+    @abstractmethod
+    def write_records(self, writes):
+        """Write [(collection, record id, data)] atomically, at most 500 at a time."""
+
+    @abstractmethod
+    def find_records(self, collection, user_id):
+        """All records of a user in ``collection``."""
+
+    # Config documents
+
+    @abstractmethod
+    def get_config(self, name):
+        """Config document ``name``, or None."""
+
+    @abstractmethod
+    def publish_config(self, name, data):
+        """Store ``data`` under the next version of config ``name``; returns what was stored."""
+
+    def watch_config(self, name, callback, on_error=None):
+        """Call callback(data) whenever config ``name`` changes, and
+        on_error(exc) if the listener fails; returns an unsubscribe function,
+        or None when the engine has no change feed."""
+        return None
+
+
+def _open_repository():
+    if STORAGE_BACKEND == "sqlite":
+        from database.sqlite_store import SQLiteStore
+        return SQLiteStore(SQLITE_PATH)
+    if STORAGE_BACKEND == "firestore":
+        try:
+            from firebase_admin import firestore  # type: ignore
+            client = firestore.client()
+        except Exception:
+            # Firebase Admin missing or not initialized (config/firebase.py)
+            return None
+        from database.firestore_store import FirestoreRepository
+        return FirestoreRepository(client)
+    raise ValueError(f"Unknown DOCAI_STORAGE: {STORAGE_BACKEND!r}")
+
+
+def get_repository():
+    """The configured storage engine, or None when Firestore is selected but unavailable."""
+    global _repository, _resolved
+    if _resolved:
+        return _repository
+    with _repository_lock:
+        if not _resolved:
+            _repository = _open_repository()
+            _resolved = True
+        return _repository
+
+
+def set_repository(repository):
+    """Install a storage engine (tests, benchmarks); None means no database."""
+    global _repository, _resolved
+    with _repository_lock:
+        _repository = repository
+        _resolved = True
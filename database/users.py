@@ -1,69 +1,92 @@
-# Firestore-backed user management
-try:
-    from firebase_admin import firestore  # type: ignore
-    db = firestore.client()
-except Exception:
-    db = None
+# User management through the configured storage engine (database/storage.py)
+from database.emails import EmailAlreadyRegistered
+from database.executor import run_blocking
+from database.storage import get_repository
 
-async def find_user_by_email(email):
-    """Find user by email from Firestore."""
-    if not db:
+# Storage clients block; the async functions below run these on the
+# data-access executor so route handlers never stall the event loop.
+
+def _find_user_by_email(email):
+    repo = get_repository()
+    if repo is None:
         return None
     try:
-        docs = db.collection("users").where("email", "==", email).limit(1).stream()
-        for doc in docs:
-            return doc.to_dict()
-        return None
+        return repo.find_user_by_email(email)
     except Exception:
         return None
 
-async def find_user_by_id(user_id):
-    """Find user by ID from Firestore."""
-    if not db:
+def _find_user_by_id(user_id):
+    repo = get_repository()
+    if repo is None:
         return None
     try:
-        doc = db.collection("users").document(user_id).get()
-        return doc.to_dict() if doc.exists else None
+        return repo.get_user(user_id)
     except Exception:
         return None
 
-async def find_all_doctors():
-    """Get all doctors from Firestore."""
-    if not db:
+def _find_users_by_role(role):
+    repo = get_repository()
+    if repo is None:
         return []
     try:
-        docs = db.collection("users").where("role", "==", "doctor").stream()
-        return [d.to_dict() for d in docs]
+        return repo.find_users_by_role(role)
     except Exception:
         return []
 
-async def find_all_patients():
-    """Get all patients from Firestore."""
-    if not db:
-        return []
+def _create_user(user_data):
+    """Store a new user; raises EmailAlreadyRegistered if the email is taken."""
+    repo = get_repository()
+    if repo is None:
+        return None
     try:
-        docs = db.collection("users").where("role", "==", "patient").stream()
-        return [d.to_dict() for d in docs]
+        return repo.create_user(user_data)
+    except EmailAlreadyRegistered:
+        raise
     except Exception:
-        return []
+        return None
 
-async def create_user(user_data):
-    """Create a new user in Firestore."""
-    if not db:
+def _update_user(user_id, updates):
+    """Apply updates; raises EmailAlreadyRegistered if a new email is taken."""
+    repo = get_repository()
+    if repo is None:
         return None
     try:
-        user_id = user_data.get("id") or db.collection("users").document().id
-        db.collection("users").document(user_id).set(user_data)
-        return user_data
+        return repo.update_user(user_id, updates)
+    except EmailAlreadyRegistered:
+        raise
     except Exception:
         return None
 
+def rebuild_email_index():
+    """Register every user's email in the email index; for users created before it.
+
+    When several users share an email the first one keeps it and the rest
+    are reported. Returns (indexed, conflicts) where conflicts is a list of
+    (email, userId) left unindexed.
+    """
+    repo = get_repository()
+    return repo.rebuild_email_index() if repo is not None else (0, [])
+
+async def find_user_by_email(email):
+    """Find user by email from Firestore."""
+    return await run_blocking(_find_user_by_email, email)
+
+async def find_user_by_id(user_id):
+    """Find user by ID from Firestore."""
+    return await run_blocking(_find_user_by_id, user_id)
+
+async def find_all_doctors():
+    """Get all doctors from Firestore."""
+    return await run_blocking(_find_users_by_role, "doctor")
+
+async def find_all_patients():
+    """Get all patients from Firestore."""
+    return await run_blocking(_find_users_by_role, "patient")
+
+async def create_user(user_data):
+    """Create a new user in Firestore; raises EmailAlreadyRegistered if the email is taken."""
+    return await run_blocking(_create_user, user_data)
+
 async def update_user(user_id, updates):
     """Update user in Firestore."""
-    if not db:
-        return None
-    try:
-        db.collection("users").document(user_id).update(updates)
-        return await find_user_by_id(user_id)
-    except Exception:
-        return None
+    return await run_blocking(_update_user, user_id, updates)
@@ -1,9 +1,12 @@
 import { useState, useRef, useEffect } from "react";
 
-export default function useSpeechToText(language = "en-US") {
+export default function useSpeechToText(language = "en-US", { onPartial } = {}) {
   const [listening, setListening] = useState(false);
   const [text, setText] = useState("");
   const recognitionRef = useRef(null);
+  // Kept in a ref so a new callback does not rebuild the recognizer
+  const onPartialRef = useRef(onPartial);
+  onPartialRef.current = onPartial;
 
   useEffect(() => {
     const SpeechRecognition =
@@ -18,7 +21,8 @@ export default function useSpeechToText(language = "en-US") {
     
     // Configure speech recognition
     recognition.continuous = false;
-    recognition.interimResults = false;
+    // Interim results let callers screen the transcript while the user speaks
+    recognition.interimResults = true;
     recognition.lang = language;
 
     // Set up event handlers
@@ -27,9 +31,13 @@ export default function useSpeechToText(language = "en-US") {
     };
 
     recognition.onresult = (event) => {
-      const transcript = event.results[0][0].transcript;
-      setText(transcript);
-      setListening(false);
+      const result = event.results[0];
+      const transcript = result[0].transcript;
+      if (onPartialRef.current) onPartialRef.current(transcript);
+      if (result.isFinal) {
+        setText(transcript);
+        setListening(false);
+      }
     };
 
     recognition.onerror = (event) => {
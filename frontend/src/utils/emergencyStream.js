@@ -0,0 +1,52 @@
+/*
+ Emergency Stream
+ - Streams a growing speech transcript to /api/health/assess/stream
+ - The backend keeps matcher state per socket and answers every update
+ - onEmergency fires once, as soon as the risk score crosses the threshold
+*/
+
+import { API_ORIGIN } from "../config/api.js";
+
+export function openEmergencyStream({ threshold = 70, onAssessment, onEmergency } = {}) {
+  const wsOrigin = API_ORIGIN.replace(/^http/, "ws");
+  let socket;
+  try {
+    socket = new WebSocket(`${wsOrigin}/api/health/assess/stream?threshold=${threshold}`);
+  } catch (err) {
+    console.log("Emergency stream unavailable:", err);
+    return { send: () => {}, close: () => {} };
+  }
+
+  // Only the latest transcript matters; older partials are superseded
+  let pending = null;
+
+  socket.onopen = () => {
+    if (pending !== null) {
+      socket.send(JSON.stringify({ text: pending }));
+      pending = null;
+    }
+  };
+
+  socket.onmessage = (event) => {
+    const report = JSON.parse(event.data);
+    if (onAssessment) onAssessment(report);
+    if (report.type === "emergency" && onEmergency) onEmergency(report);
+  };
+
+  socket.onerror = (event) => {
+    console.log("Emergency stream error:", event);
+  };
+
+  return {
+    send(text) {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ text }));
+      } else {
+        pending = text;
+      }
+    },
+    close() {
+      socket.close();
+    },
+  };
+}
@@ -1,5 +1,6 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import API_BASE from '../config/api'
+import { auth } from '../config/firebase'
 import './ChatView.css'
 
 function ChatView({ goTo }) {
@@ -9,6 +10,10 @@ function ChatView({ goTo }) {
   const [messageInput, setMessageInput] = useState('')
   const [loading, setLoading] = useState(true)
   const [user, setUser] = useState(null)
+  // Per-doctor delta-sync state: ETag and the newest updatedAt held
+  const syncRef = useRef({})
+  // True while the push stream is connected; polling is only the fallback
+  const [streamLive, setStreamLive] = useState(false)
 
   useEffect(() => {
     // Get logged in user
@@ -46,13 +51,65 @@ function ChatView({ goTo }) {
     return () => clearInterval(timer)
   }, [user])
 
+  useEffect(() => {
+    if (!user || !auth || typeof EventSource === 'undefined') return
+    let source = null
+    let retry = null
+    let closed = false
+    const merge = (msgs) => {
+      setConversations(prev => {
+        const next = { ...prev }
+        msgs.forEach(msg => {
+          const existing = next[msg.doctorId] || []
+          if (!existing.some(m => m.id === msg.id)) next[msg.doctorId] = existing.concat(msg)
+        })
+        return next
+      })
+    }
+    const connect = async () => {
+      await auth.authStateReady()
+      if (closed || !auth.currentUser) return // no session: polling only
+      // EventSource cannot send headers, so the ID token goes in the query
+      const token = await auth.currentUser.getIdToken()
+      if (closed) return
+      const params = new URLSearchParams({ userId: user.id, role: 'patient', token })
+      source = new EventSource(`${API_BASE}/messages/stream?${params}`)
+      source.onopen = () => setStreamLive(true)
+      source.onerror = () => {
+        setStreamLive(false)
+        // Dropped connections reconnect on their own; a rejected (expired) token
+        // closes the stream, so reopen it with a fresh one
+        if (source.readyState === EventSource.CLOSED) retry = setTimeout(connect, 3000)
+      }
+      source.addEventListener('message', (e) => merge([JSON.parse(e.data)]))
+      source.addEventListener('messages', (e) => merge(JSON.parse(e.data))) // bulk sends
+      source.addEventListener('read', (e) => {
+        const { doctorId, reader } = JSON.parse(e.data)
+        // Receipts cover messages addressed to the reader (all when no reader)
+        const addressed = m => !reader || (reader === 'doctor') === (m.sender !== 'doctor')
+        setConversations(prev => ({
+          ...prev,
+          [doctorId]: (prev[doctorId] || []).map(m => (m.read || !addressed(m) ? m : { ...m, read: true }))
+        }))
+      })
+    }
+    connect().catch(error => console.error('Error opening message stream:', error))
+    return () => {
+      closed = true
+      clearTimeout(retry)
+      if (source) source.close()
+      setStreamLive(false)
+    }
+  }, [user])
+
   useEffect(() => {
     if (user && selectedDoctor) {
       fetchConversation()
-      const interval = setInterval(fetchConversation, 3000) // Poll every 3 seconds
+      if (streamLive) return
+      const interval = setInterval(fetchConversation, 3000) // Poll every 3 seconds while the stream is down
       return () => clearInterval(interval)
     }
-  }, [user, selectedDoctor])
+  }, [user, selectedDoctor, streamLive])
 
   const fetchDoctors = async () => {
     try {
@@ -74,16 +131,37 @@ function ChatView({ goTo }) {
   const fetchConversation = async () => {
     if (!user || !selectedDoctor) return
 
+    const doctorId = selectedDoctor.id
+    const sync = syncRef.current[doctorId]
     try {
-      const response = await fetch(
-        `${API_BASE}/messages/conversation?patientId=${user.id}&doctorId=${selectedDoctor.id}`
-      )
+      // Ask only for what was sent or read since the last poll; 304 when nothing changed
+      const params = new URLSearchParams({ patientId: user.id, doctorId })
+      if (sync?.since) params.set('since', sync.since)
+      const response = await fetch(`${API_BASE}/messages/conversation?${params}`, {
+        cache: 'no-store',
+        headers: sync?.etag ? { 'If-None-Match': sync.etag } : {}
+      })
+      if (response.status === 304) return
       const data = await response.json()
       if (data.success) {
-        setConversations(prev => ({
-          ...prev,
-          [selectedDoctor.id]: data.messages
-        }))
+        setConversations(prev => {
+          // Deltas hold new messages and updated (read) copies of ones we have
+          const updates = new Map(data.messages.map(msg => [msg.id, msg]))
+          const existing = sync?.since ? prev[doctorId] || [] : []
+          const merged = existing.map(msg => updates.get(msg.id) || msg)
+          const known = new Set(existing.map(msg => msg.id))
+          data.messages.forEach(msg => { if (!known.has(msg.id)) merged.push(msg) })
+          merged.sort((a, b) => (a.timestamp === b.timestamp ? (a.id < b.id ? -1 : 1) : (a.timestamp < b.timestamp ? -1 : 1)))
+          const since = merged.reduce((max, msg) => {
+            const changed = msg.updatedAt || msg.timestamp
+            return changed > max ? changed : max
+          }, sync?.since || '')
+          syncRef.current[doctorId] = {
+            etag: response.headers.get('ETag'),
+            since: since || null
+          }
+          return { ...prev, [doctorId]: merged }
+        })
       }
     } catch (error) {
       console.error('Error fetching conversation:', error)
@@ -1,6 +1,7 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import useSpeechToText from '../hooks/useSpeechToText.js'
 import { assessEmergency } from '../utils/emergencyGovernor.js'
+import { openEmergencyStream } from '../utils/emergencyStream.js'
 
 const LANGUAGE_MAP = {
   en: "en-US",
@@ -23,13 +24,31 @@ const LANGUAGE_LABELS = {
 function HomeView({ goTo }) {
   const [textInput, setTextInput] = useState('')
   const [selectedLang, setSelectedLang] = useState('en')
-  const { listening, text, startListening, stopListening, setText } = useSpeechToText(LANGUAGE_MAP[selectedLang])
+  const streamRef = useRef(null)
+  const { listening, text, startListening, stopListening, setText } = useSpeechToText(LANGUAGE_MAP[selectedLang], {
+    onPartial: (transcript) => streamRef.current?.send(transcript),
+  })
   const [emergencyReport, setEmergencyReport] = useState(null)
 
+  const closeStream = () => {
+    streamRef.current?.close()
+    streamRef.current = null
+  }
+
   const handleSpeak = () => {
     if (listening) {
       stopListening()
+      closeStream()
     } else {
+      // Screen partial transcripts live so cardiac/stroke alerts don't wait for the final result
+      closeStream()
+      streamRef.current = openEmergencyStream({
+        onEmergency: (report) => {
+          setEmergencyReport(report)
+          stopListening()
+          closeStream()
+        },
+      })
       startListening()
     }
     // Clear any previous emergency when user re-engages speech
@@ -51,12 +70,15 @@ function HomeView({ goTo }) {
     goTo('triage')
   }
 
+  // Close any open stream on unmount
+  useEffect(() => closeStream, [])
+
   // Sync speech text to textInput when speech is detected
   useEffect(() => {
     if (text) {
       setTextInput(text)
       // Clear emergency when new speech text arrives
-      if (emergencyReport) setEmergencyReport(null)
+      if (emergencyReport && !assessEmergency(text).isEmergency) setEmergencyReport(null)
     }
   }, [text])
 
@@ -231,6 +231,8 @@ const Appointments = ({ onPatientClick }) => (
 const Messages = () => {
   const [activeConversation, setActiveConversation] = useState(null);
   const [conversations, setConversations] = useState([]);
+  // Bodies of the open thread only; the inbox list carries summaries
+  const [threadMessages, setThreadMessages] = useState([]);
   const [messageInput, setMessageInput] = useState('');
   const [doctor, setDoctor] = useState(null);
 
@@ -245,12 +247,27 @@ const Messages = () => {
 
   useEffect(() => {
     if (doctor && activeConversation) {
+      fetchThread(doctor.id, activeConversation.patientId);
       const interval = setInterval(() => {
         fetchConversations(doctor.id);
+        fetchThread(doctor.id, activeConversation.patientId);
       }, 3000); // Poll every 3 seconds
       return () => clearInterval(interval);
     }
-  }, [doctor, activeConversation]);
+  }, [doctor, activeConversation?.patientId]);
+
+  const fetchThread = async (doctorId, patientId) => {
+    try {
+      const params = new URLSearchParams({ patientId, doctorId });
+      const response = await fetch(`${API_BASE}/messages/conversation?${params}`);
+      const data = await response.json();
+      if (data.success) {
+        setThreadMessages(data.messages);
+      }
+    } catch (error) {
+      console.error('Error fetching conversation:', error);
+    }
+  };
 
   const fetchConversations = async (doctorId) => {
     try {
@@ -293,6 +310,7 @@ const Messages = () => {
       if (response.ok) {
         setMessageInput('');
         fetchConversations(doctor.id);
+        fetchThread(doctor.id, activeConversation.patientId);
       }
     } catch (error) {
       console.error('Error sending message:', error);
@@ -326,11 +344,11 @@ const Messages = () => {
                 <div style={{ display: 'flex', justifyContent: 'space-between', marginBottom: '4px' }}>
                   <div style={{ fontWeight: 600 }}>{conv.patientName}</div>
                   <div style={{ fontSize: '12px', color: 'var(--text-soft)' }}>
-                    {conv.lastMessage ? formatTime(conv.lastMessage.timestamp) : ''}
+                    {conv.lastMessageTime ? formatTime(conv.lastMessageTime) : ''}
                   </div>
                 </div>
                 <div style={{ fontSize: '13px', color: 'var(--text-medium)', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis' }}>
-                  {conv.lastMessage ? conv.lastMessage.message.substring(0, 50) + '...' : 'No messages'}
+                  {conv.lastMessage ? conv.lastMessage.substring(0, 50) + '...' : 'No messages'}
                 </div>
                 {conv.unreadCount > 0 && (
                   <span style={{
@@ -361,12 +379,12 @@ const Messages = () => {
                 <div style={{ fontSize: '13px', color: 'var(--text-soft)' }}>Patient ID: {activeConversation.patientId}</div>
               </div>
               <div className="provider-msg-body">
-                {activeConversation.messages.length === 0 ? (
+                {threadMessages.length === 0 ? (
                   <div style={{ textAlign: 'center', padding: '40px', color: 'var(--text-soft)' }}>
                     No messages in this conversation
                   </div>
                 ) : (
-                  activeConversation.messages.map((msg) => (
+                  threadMessages.map((msg) => (
                     <div key={msg.id} className={`provider-msg-bubble provider-msg-${msg.sender === 'patient' ? 'in' : 'out'}`}>
                       {msg.message}
                       <div style={{ textAlign: 'right', fontSize: '11px', color: msg.sender === 'patient' ? 'var(--text-soft)' : 'rgba(255,255,255,0.8)', marginTop: '8px' }}>